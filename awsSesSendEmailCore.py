@@ -0,0 +1,3347 @@
+#--------------------------------------------------------#
+#                     Spas Kaloferov                     #
+#                   www.kaloferov.com                    #
+# bit.ly/The-Twitter      Social     bit.ly/The-LinkedIn #
+# bit.ly/The-Gitlab        Git         bit.ly/The-Github #
+# bit.ly/The-BSD         License          bit.ly/The-GNU #
+#--------------------------------------------------------#
+
+  #
+  #       VMware Cloud Assembly ABX Code Sample - Shared Core
+  #
+  # [Description]
+  #   - Engine shared by the awsSesSendEmail-py-v1 and awsSesSendEmail-py-v2 actions. The action files are thin entry points that select features:
+  #      - Action inputs: declarative schema, parsed and validated once into an ActionConfig. Memoized while the action inputs are unchanged
+  #      - Payload: one pass index, event topic dispatch (see eventTopics) and runOn rule evaluation
+  #      - Email: templates, rendering, HTML optimization and recipient resolution
+  #      - Sending: pooled SES clients, send rate pacing, retries, bulk templated send, suppression filter, outbox and per recipient digests
+  #      - CSP and blueprint options, AWS Secrets Manager, logging, stage timings and metrics
+  #   - Warm container caches, clients and the thread pool live here, so they are shared by every action of the container
+  # [Usage]
+  #   - Package this file with the action file (ABX ZIP package), next to it
+  #   - def handler(context, inputs): return actionRun(context, inputs, actionFeatures)
+  #      - actionFeatures: names of the action options the action supports (e.g. actionOptionRunOnProperty), or None for all. Other action options are off whatever their input says
+  #   - See awsSesSendEmail-py-v2.py for the action inputs
+  # [Dependency]
+  #   - Requires: boto3. pyyaml and requests only for the options that parse YAML or call CSP (see awsSesSendEmail-py-v2.py). Imported on first use, see actionImport
+  # [Thanks]
+
+
+import sys
+import json
+import html
+import html.parser
+import importlib
+import time
+import random
+import base64
+import hashlib
+import threading
+import collections
+import fnmatch
+import re
+import concurrent.futures
+import contextlib
+import contextvars
+
+
+# ----- Global ----- #  
+
+class ClientError(Exception):    # Placeholder until botocore is imported. awsImportBoto3 rebinds it to botocore.exceptions.ClientError before any AWS call
+    pass
+    # End Class  
+
+class BotoCoreError(Exception):    # Placeholder until botocore is imported. awsImportBoto3 rebinds it to botocore.exceptions.BotoCoreError (e.g. EndpointConnectionError) before any AWS call
+    pass
+    # End Class  
+
+cspBaseApiUrl = "https://api.mgmt.cloud.vmware.com"    # CSP portal base url
+cspTokenCache = {}    # Warm container cache of CSP bearer tokens. Key: sha256 of the refresh token. Value: token and expiry 
+cspTokenCacheLocks = {}   # Per refresh token locks, so concurrent warm invocations do a single CSP login
+cspTokenCacheLock = threading.Lock()    # Guards cspTokenCacheLocks
+cspTokenRefreshSkewSeconds = 300    # Refresh the bearer token this many seconds before it expires
+cspTokenDefaultTtlSeconds = 1500    # Used when the token exp claim can not be read
+awsSmSecretCache = {}   # Warm container cache of AWS Secrets Manager secrets. Key: secret id, region and version stage 
+awsSmSecretCacheLock = threading.Lock()    # Guards awsSmSecretCache
+awsSmSecretCacheStats = {"hits": 0, "misses": 0, "invalidations": 0}    # Secret cache counters, kept for the life of the container
+awsClientRegistry = {}    # Warm container boto3 clients. Key: service name and region 
+awsClientRegistryLock = threading.Lock()    # Guards awsClientRegistry
+awsClientMaxRetries = {"ses": 0}    # botocore retries per service. SES calls are retried by awsSesCallWithRetry only. Other services use httpMaxRetriesIn
+cspHttpSession = None    # Warm container requests session with keep-alive connection pool for CSP calls
+cspHttpSessionLock = threading.Lock()    # Guards cspHttpSession
+blueprintOptionsCache = collections.OrderedDict()    # Warm container LRU of parsed blueprint options. Key: blueprint id. Value: options, ETag and updatedAt 
+blueprintOptionsCacheLock = threading.Lock()    # Guards blueprintOptionsCache
+blueprintOptionsCacheMaxSize = 64    # Max blueprints kept in blueprintOptionsCache
+blueprintOptionsCacheFreshSeconds = 30    # Cached options are used without revalidation for this many seconds
+blueprintYamlLoaders = {}    # YAML loader classes, created on the first blueprint parse. stream: libyaml based loader when available. events: BlueprintYamlEventLoader
+runOnRuleCache = {}    # Warm container cache of compiled runOn rules. Key: rule string 
+runOnRuleCacheMaxSize = 128    # Max rules kept in runOnRuleCache
+payloadPathMissing = object()    # Returned by payloadResolvePath when a path is not a leaf of the payload. Payload values can be None
+awsSesTemplateHashes = {}    # Warm container record of the SES templates known to exist. Key: region and versioned template name. Value: content hash 
+awsSesTemplateNameMaxLength = 64    # SES limit of template names. The content hash suffix is kept whole
+awsSesBulkMaxDestinations = 50    # SES limit of destinations per send_bulk_templated_email call
+awsSesMaxRecipientsPerMessage = 50    # SES limit of TO, CC and BCC recipients per send_email call
+awsSesSuppressionCache = {}    # Warm container cache of suppression list lookups. Key: region and lowercase address 
+awsSesSuppressionLists = {}    # Warm container preloaded suppression lists. Key: region 
+awsSesSuppressionCacheLock = threading.Lock()    # Guards awsSesSuppressionCache and awsSesSuppressionLists
+awsSesSuppressionCacheMaxSize = 100000    # Max addresses kept in awsSesSuppressionCache
+awsSesProjectRecipientsCache = {}    # Warm container cache of parsed awsSesProjectRecipientsIn. Key: the input string 
+awsSesRateBuckets = {}    # Warm container send rate token buckets. Key: region 
+awsSesRateBucketsLock = threading.Lock()    # Guards awsSesRateBuckets
+awsSesQuotaTtlSeconds = 300    # How long the get_send_quota MaxSendRate is reused
+awsSesDefaultMaxSendRate = 1.0    # Used when get_send_quota is not allowed. SES sandbox rate
+awsSesBackoffBaseSeconds = 0.5    # First retry waits up to this long
+awsSesBackoffMaxSeconds = 20    # Upper bound of a single retry wait
+awsSesThrottlingErrorCodes = ("Throttling", "ThrottlingException", "TooManyRequestsException")    # SES error codes that are retried and slow down the pacing
+awsSesTransientErrorCodes = ("ServiceUnavailable", "InternalFailure", "InternalError", "RequestTimeout", "RequestTimeoutException")    # SES error codes of server failures that are retried. Any 5xx response is retried too
+awsConnectionErrorNames = ("ConnectionError", "HTTPClientError")    # botocore exceptions of connection failures that are retried (e.g. EndpointConnectionError, ReadTimeoutError). Subclasses match
+outboxBatchSize = 10    # Messages taken from the outbox per drain batch
+outboxLeaseSeconds = 180    # A taken message is retaken by a later drain when not acked within this time. The action timeoutSeconds, so a lease never outlives the run that took it
+outboxSqliteInitialized = set()    # Spool paths with the outbox table created
+outboxSqliteLock = threading.Lock()    # Serializes spool writes within the container
+digestLeaseSeconds = 180    # Taken notifications are retaken by a later flush when their digest is not sent within this time. The action timeoutSeconds, so a lease never outlives the run that took it
+digestMaxAttempts = 5    # Failed sends of a digest before its notifications are dropped
+digestSqliteInitialized = set()    # Store paths with the digest table created
+digestSqliteLock = threading.Lock()    # Serializes store writes within the container
+actionExecutor = None    # Warm container thread pool used by actionOptionConcurrentPrefetchIn
+actionExecutorLock = threading.Lock()    # Guards actionExecutor
+actionExecutorMaxWorkers = 4    # Thread pool size. Stages are I/O bound
+actionTimeoutSeconds = 180    # timeoutSeconds of the .abx actions. Sets the run deadline when the context has no get_remaining_time_in_millis
+actionDeadlineMarginSeconds = 15    # Kept free before the run deadline. The outbox drain stops here
+actionLogLevels = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "OFF": 100}    # Levels accepted by actionLogLevelIn
+actionLogLevel = actionLogLevels['INFO']    # Records below this level are not formatted nor written. Outside of runs, e.g. offline tests. Runs use actionLogLevelIn
+actionLogFormat = "text"    # text ([ABX] lines) or json (one JSON object per line). Outside of runs. Runs use actionLogFormatIn
+actionLogRedactedKeys = ("cspRefreshToken".lower(), "cspBearerToken".lower(), "cspRequestsHeaders".lower(), "runOnPorpertyMatch".lower(), "runOnBlueprintOptionMatch".lower())    # Values of keys containing these are logged as OMITED
+actionLogLock = threading.Lock()    # Keeps records of concurrent stages on their own lines
+actionRunContext = contextvars.ContextVar("actionRunContext", default=None)    # ActionRunContext of the current run. Each run sets its own, pool threads get it from actionSubmit
+actionTimingsLock = threading.Lock()    # Guards the stage timings of the runs. Concurrent stages record from pool threads
+actionImportLock = threading.Lock()    # Serializes first imports of the optional subsystems
+
+awsSesDefaultTemplateName = "abxDeploymentNotification"    # Used when awsSesTemplateNameIn is not set
+awsSesDefaultMaxSendAttempts = 5    # Used when awsSesMaxSendAttemptsIn is not set
+awsSesSuppressionDefaultCacheTtlSeconds = 3600    # Used when awsSesSuppressionCacheTtlIn is not set
+awsSmSecretCacheDefaultTtlSeconds = 3600    # Used when awsSmSecretCacheTtlIn is not set
+awsSmDefaultVersionStage = "AWSCURRENT"    # Used when awsSmVersionStageIn is not set
+httpDefaultPoolSize = 10    # Used when httpPoolSizeIn is not set
+httpDefaultMaxRetries = 3    # Used when httpMaxRetriesIn is not set
+outboxDefaultBackend = "sqlite"    # Used when outboxBackendIn is not set. sqlite or sqs
+outboxDefaultSpoolPath = "/tmp/awsSesOutbox.sqlite3"    # Used when outboxSpoolPathIn is not set
+outboxDefaultMaxAttempts = 5    # Used when outboxMaxAttemptsIn is not set. Messages are dead-lettered after this many failed sends
+actionDefaultStageTimeoutSeconds = 60    # Used when actionStageTimeoutIn is not set. Keep well below the action timeoutSeconds (180)
+actionMaxStageTimeoutSeconds = 150    # actionStageTimeoutIn is clamped to this. Leaves the send time within the action timeoutSeconds (180)
+actionMetricsDefaultNamespace = "ABX/awsSesSendEmail"    # Used when actionMetricsNamespaceIn is not set
+digestDefaultWindowSeconds = 60    # Used when digestWindowIn is not set
+digestDefaultMaxItems = 20    # Used when digestMaxItemsIn is not set
+digestDefaultStorePath = "/tmp/awsSesDigest.sqlite3"    # Used when digestStorePathIn is not set
+
+actionInputPlaceholders = ("", "<optional>", "optional", "<required>", "empty")    # Whole values, case insensitive and without quotes, that mean the input is not set. A value that only contains one of them (e.g. empty-bucket@mydomain.com) is kept
+actionInputChoices = {    # Accepted values of the choice inputs. Matched case insensitive, returned as listed here
+    "actionLogLevelIn": ("DEBUG", "INFO", "WARNING", "ERROR", "OFF"),
+    "actionLogFormatIn": ("text", "json"),
+    "outboxBackendIn": ("sqlite", "sqs"),
+}
+actionInputSchema = [    # (ActionConfig attribute, action input, type, default, required). Types: bool, string, rule (quotes removed, lowercase), number, timeout (number clamped to actionMaxStageTimeoutSeconds), count (whole number >= 1), integer (whole number >= 0), choice (see actionInputChoices)
+    # AWS SES
+    ("awsSesRegion", "awsSesRegionIn", "string", "", True),
+    ("awsSesSender", "awsSesSenderIn", "string", "", True),
+    ("awsSesToRecipient", "awsSesToRecipientABXIn", "string", "", False),
+    ("awsSesCcRecipient", "awsSesCcRecipientIn", "string", "", False),
+    ("awsSesBccRecipient", "awsSesBccRecipientIn", "string", "", False),
+    ("awsSesConfigurationSet", "awsSesConfigurationSetIn", "string", "", False),
+    ("awsSesProjectRecipients", "awsSesProjectRecipientsIn", "string", "", False),
+    ("awsSesTemplateName", "awsSesTemplateNameIn", "string", awsSesDefaultTemplateName, False),
+    ("awsSesBulkRecipients", "awsSesBulkRecipientsIn", "string", "", False),
+    ("awsSesMaxSendAttempts", "awsSesMaxSendAttemptsIn", "count", awsSesDefaultMaxSendAttempts, False),
+    ("awsSesSuppressionCacheTtl", "awsSesSuppressionCacheTtlIn", "number", awsSesSuppressionDefaultCacheTtlSeconds, False),
+    ("awsSesSuppressionPreload", "awsSesSuppressionPreloadIn", "bool", False, False),
+    ("deploymentId", "deploymentIdABXIn", "string", "", False),
+    ("emailTemplateOverrides", "emailTemplateOverridesIn", "string", "", False),
+    # Action options
+    ("actionOptionAcceptPayloadInput", "actionOptionAcceptPayloadInputIn", "bool", True, False),
+    ("actionOptionRunOnProperty", "actionOptionRunOnPropertyIn", "bool", False, False),
+    ("actionOptionRunOnBlueprintOption", "actionOptionRunOnBlueprintOptionIn", "bool", False, False),
+    ("actionOptionUseAwsSecretsManager", "actionOptionUseAwsSecretsManagerIn", "bool", False, False),
+    ("actionOptionConcurrentPrefetch", "actionOptionConcurrentPrefetchIn", "bool", False, False),
+    ("actionOptionSesBulkSend", "actionOptionSesBulkSendIn", "bool", False, False),
+    ("actionOptionOutbox", "actionOptionOutboxIn", "bool", False, False),
+    ("actionOptionOptimizeHtml", "actionOptionOptimizeHtmlIn", "bool", False, False),
+    ("actionOptionSuppressionFilter", "actionOptionSuppressionFilterIn", "bool", False, False),
+    ("actionOptionEmitMetrics", "actionOptionEmitMetricsIn", "bool", False, False),
+    ("actionOptionDigest", "actionOptionDigestIn", "bool", False, False),
+    ("actionStageTimeout", "actionStageTimeoutIn", "timeout", actionDefaultStageTimeoutSeconds, False),
+    ("actionLogLevel", "actionLogLevelIn", "choice", "INFO", False),
+    ("actionLogFormat", "actionLogFormatIn", "choice", "text", False),
+    ("actionMetricsNamespace", "actionMetricsNamespaceIn", "string", actionMetricsDefaultNamespace, False),
+    # runOn conditions
+    ("runOnProperty", "runOnPropertyIn", "rule", "", False),
+    ("runOnPorpertyMatch", "runOnPorpertyMatchABXIn", "rule", "", False),
+    ("runOnBlueprintOption", "runOnBlueprintOptionIn", "rule", "", False),
+    ("runOnBlueprintOptionMatch", "runOnBlueprintOptionMatchABXIn", "rule", "", False),
+    # Secrets and CSP
+    ("awsSmRegionName", "awsSmRegionNameIn", "string", "", False),
+    ("awsSmCspTokenSecretId", "awsSmCspTokenSecretIdIn", "string", "", False),
+    ("awsSmVersionStage", "awsSmVersionStageIn", "string", awsSmDefaultVersionStage, False),
+    ("awsSmSecretCacheTtl", "awsSmSecretCacheTtlIn", "number", awsSmSecretCacheDefaultTtlSeconds, False),
+    ("cspRefreshToken", "cspRefreshTokenIn", "string", "", False),
+    ("httpPoolSize", "httpPoolSizeIn", "count", httpDefaultPoolSize, False),
+    ("httpMaxRetries", "httpMaxRetriesIn", "integer", httpDefaultMaxRetries, False),
+    # Outbox
+    ("outboxBackend", "outboxBackendIn", "choice", outboxDefaultBackend, False),
+    ("outboxSpoolPath", "outboxSpoolPathIn", "string", outboxDefaultSpoolPath, False),
+    ("outboxMaxAttempts", "outboxMaxAttemptsIn", "count", outboxDefaultMaxAttempts, False),
+    ("outboxSqsQueueUrl", "outboxSqsQueueUrlIn", "string", "", False),
+    ("outboxSqsDeadLetterQueueUrl", "outboxSqsDeadLetterQueueUrlIn", "string", "", False),
+    ("outboxSqsRegion", "outboxSqsRegionIn", "string", "", False),
+    # Digest
+    ("digestWindow", "digestWindowIn", "number", digestDefaultWindowSeconds, False),
+    ("digestMaxItems", "digestMaxItemsIn", "count", digestDefaultMaxItems, False),
+    ("digestStorePath", "digestStorePathIn", "string", digestDefaultStorePath, False),
+]
+actionInputKeys = tuple([inputKey for attribute, inputKey, inputType, default, required in actionInputSchema])    # Action inputs read by actionConfigParse. Payload keys are not part of the memo key
+actionOptions = frozenset([attribute for attribute, inputKey, inputType, default, required in actionInputSchema if attribute.startswith("actionOption")])    # Action options an action can select with actionFeatures
+actionConfigCache = collections.OrderedDict()    # Warm container cache of parsed configs. Key: actionFeatures and the raw values of actionInputKeys
+actionConfigCacheLock = threading.Lock()    # Guards actionConfigCache
+actionConfigCacheMaxSize = 8    # Max configs kept in actionConfigCache. One per distinct set of action inputs, e.g. per ABX action
+
+
+class ActionConfig (object):    # Typed action inputs. Created by actionConfigParse and shared by warm invocations, so do not change it
+    __slots__ = tuple([attribute for attribute, inputKey, inputType, default, required in actionInputSchema]) + ("errors",)
+
+    def __init__ (self, **values):
+        for attribute in self.__slots__:
+            object.__setattr__(self, attribute, values[attribute])
+        # End Loop
+        # End Function
+
+    def __setattr__ (self, attribute, value):
+        raise AttributeError("ActionConfig is read only. Set the action input instead: "+attribute)
+        # End Function
+
+    def asDict (self):  # Returns the parsed values as a dict, e.g. for logging
+        return {attribute: getattr(self, attribute) for attribute in self.__slots__}
+        # End Function
+    # End Class
+
+
+
+class ActionRunContext (object):    # State of one run: log level and format from its ActionConfig, and its stage timings. Held in actionRunContext
+    __slots__ = ("logLevel", "logFormat", "timings")
+
+    def __init__ (self, actionConfig):
+        self.logLevel = actionLogLevels[actionConfig.actionLogLevel]
+        self.logFormat = actionConfig.actionLogFormat
+        self.timings = collections.OrderedDict()    # Milliseconds spent per stage, in first run order
+        # End Function
+    # End Class
+
+
+
+class PayloadIndex (dict):    # Payload index built on first use. See payloadBuildIndex. 'paths' looks up each dotted path on its own. 'match' resolves the keys and paths of runOn rules. 'keys' flattens the whole payload once
+    def __init__ (self, payload):
+        dict.__init__(self)
+        self.payload = payload
+        # End Function
+
+    def __missing__ (self, name):
+        if (name == "paths"):    # Loop. Direct lookups, e.g. deploymentId, do not need the whole payload flattened
+            self[name] = PayloadPaths(self.payload)
+        elif (name == "match"):    # Loop. runOn rules only need the keys and paths they reference
+            self[name] = PayloadMatch(self.payload)
+        elif (name == "keys"):    # Loop. Key lookups anywhere in the payload need every leaf
+            self.update(payloadFlatten(self.payload))
+        else:
+            raise KeyError(name)
+        # End Loop
+        return self[name]
+        # End Function
+    # End Class
+
+
+
+class PayloadPaths (object):    # Dotted path -> leaf value view of a payload. Each path is looked up once, as payloadFlatten would index it
+    __slots__ = ("payload", "resolved")
+
+    def __init__ (self, payload):
+        self.payload = payload
+        self.resolved = {}
+        # End Function
+
+    def lookup (self, path):  # Returns the leaf value at the path, or payloadPathMissing
+        if (path not in self.resolved):
+            self.resolved[path] = payloadResolvePath(self.payload, str(path))
+        # End Loop
+        return self.resolved[path]
+        # End Function
+
+    def get (self, path, default=None):
+        value = self.lookup(path)
+        return default if (value is payloadPathMissing) else value
+        # End Function
+
+    def __contains__ (self, path):
+        return self.lookup(path) is not payloadPathMissing
+        # End Function
+
+    def __getitem__ (self, path):
+        value = self.lookup(path)
+        if (value is payloadPathMissing):
+            raise KeyError(path)
+        # End Loop
+        return value
+        # End Function
+    # End Class
+
+
+
+class PayloadMatch (object):    # Lowercase match view of a payload for runOn rules. Values are formatted as payloadFormatValue, lowercase and without quotes. Only the keys and paths the rules reference are resolved
+    __slots__ = ("payload", "keyValues", "keyValuesComplete", "matchKeys", "matchPaths", "matchGlobKeys", "matchGlobPaths")
+
+    def __init__ (self, payload):
+        self.payload = payload
+        self.keyValues = {}    # Lowercase leaf key -> leaf values, for the keys collected so far
+        self.keyValuesComplete = False    # True once every leaf key is collected
+        self.matchKeys = {}    # Lowercase leaf key -> set of match values
+        self.matchPaths = {}    # Lowercase dotted path -> match value, or payloadPathMissing
+        self.matchGlobKeys = {}    # Lowercase key glob -> match value sets of the matching leaf keys
+        self.matchGlobPaths = {}    # Lowercase path glob -> match values of the matching paths
+        # End Function
+
+    def collect (self, termKeys, termGlobs):  # Collects the leaf values of the keys of a rule in one pass over the payload. Key globs, or a second rule with other keys, collect every key
+        termKeys = [termKey for termKey in termKeys if (termKey not in self.keyValues)]
+        if (self.keyValuesComplete or not (termKeys or termGlobs)):
+            return
+        # End Loop
+        wantedKeys = None if (termGlobs or self.keyValues) else set(termKeys)    # None collects every key
+        if (wantedKeys is None):
+            self.keyValues = {}
+        # End Loop
+        wantIndexes = (wantedKeys is None) or any(termKey.isdigit() for termKey in termKeys)    # List leaves are keyed by their index, as in payloadFlatten
+        
+        payloadStack = [self.payload]
+        while payloadStack:
+            node = payloadStack.pop()
+            if (isinstance(node, dict)):
+                nodeItems = node.items()
+            elif (isinstance(node, (list, tuple)) and wantIndexes):
+                nodeItems = enumerate(node)
+            elif (isinstance(node, (list, tuple))):    # Loop. Only the containers in a list are walked
+                payloadStack.extend(value for value in node if isinstance(value, (dict, list, tuple)))
+                continue
+            else:
+                nodeItems = ()
+            # End Loop
+            for key, value in nodeItems:
+                if (isinstance(value, (dict, list, tuple))):
+                    payloadStack.append(value)
+                    continue
+                # End Loop
+                key = str(key).lower()
+                if ((wantedKeys is None) or (key in wantedKeys)):
+                    self.keyValues.setdefault(key, []).append(value)
+                # End Loop
+            # End Loop
+        # End Loop
+        
+        if (wantedKeys is None):
+            self.keyValuesComplete = True
+        else:
+            for termKey in termKeys:    # Loop. Keys not in the payload are not walked for again
+                self.keyValues.setdefault(termKey, [])
+            # End Loop
+        # End Loop
+        # End Function
+
+    def keyMatchValues (self, termKey):  # Returns the set of match values of a lowercase leaf key. Empty when the key is not in the payload
+        if (termKey not in self.matchKeys):
+            if (termKey not in self.keyValues):
+                self.collect((termKey,), ())
+            # End Loop
+            self.matchKeys[termKey] = set(payloadFormatValue(value).replace('"','').lower() for value in self.keyValues.get(termKey, ()))
+        # End Loop
+        return self.matchKeys[termKey]
+        # End Function
+
+    def globKeyMatchValues (self, termGlob):  # Returns the sets of match values of the leaf keys matching a lowercase glob
+        if (termGlob not in self.matchGlobKeys):
+            self.collect((), (termGlob,))
+            self.matchGlobKeys[termGlob] = [self.keyMatchValues(key) for key in list(self.keyValues) if (self.keyValues[key] and fnmatch.fnmatchcase(key, termGlob))]
+        # End Loop
+        return self.matchGlobKeys[termGlob]
+        # End Function
+
+    def pathMatchValue (self, termPath):  # Returns the match value of a lowercase dotted path, or payloadPathMissing
+        if (termPath not in self.matchPaths):
+            value = payloadResolvePath(self.payload, termPath, ignoreCase=True)
+            self.matchPaths[termPath] = value if (value is payloadPathMissing) else payloadFormatValue(value).replace('"','').lower()
+        # End Loop
+        return self.matchPaths[termPath]
+        # End Function
+
+    def globPathMatchValues (self, termGlob):  # Returns the match values of the leaf paths matching a lowercase glob. Only the subtrees the literal prefix of the glob allows are walked
+        if (termGlob in self.matchGlobPaths):
+            return self.matchGlobPaths[termGlob]
+        # End Loop
+        globPrefix = re.split(r'[*?\[]', termGlob, 1)[0]
+        globValues = []
+        
+        payloadStack = [("", self.payload)]
+        while payloadStack:
+            parentPath, node = payloadStack.pop()
+            if (isinstance(node, dict)):
+                nodeItems = node.items()
+            elif (isinstance(node, (list, tuple))):
+                nodeItems = enumerate(node)
+            else:
+                nodeItems = ()
+            # End Loop
+            for key, value in nodeItems:
+                key = str(key).lower()
+                path = key if (parentPath == "") else parentPath+"."+key
+                if (not (path.startswith(globPrefix) or globPrefix.startswith(path))):    # Loop. No path below can match
+                    continue
+                # End Loop
+                if (isinstance(value, (dict, list, tuple))):
+                    payloadStack.append((path, value))
+                elif (fnmatch.fnmatchcase(path, termGlob)):
+                    globValues.append(payloadFormatValue(value).replace('"','').lower())
+                # End Loop
+            # End Loop
+        # End Loop
+        
+        self.matchGlobPaths[termGlob] = globValues
+        return globValues    # Return values
+        # End Function
+    # End Class
+
+
+
+# ----- Email Templates ----- #  
+
+# Default templates. {{name}} is HTML escaped, {{{name}}} is not, {{#each resources}}...{{/each}} repeats for each resource. Same syntax as SES templates
+emailDefaultTemplateSubject = "Cloud Assembly - Deployment completed"    # The subject line for the email.
+emailDefaultTemplateText = ("Deployment has completed.\r\n"    # The email body for recipients with non-HTML email clients.
+                "Cloud Assembly  \r\n"
+                "VMware Cloud Services \r\n"
+                "Spas is awesome!!!  \r\n"
+                "www.kaloferov.com \r\n"
+                )
+emailDefaultTemplateHtml = """
+    <html>
+    <head>
+    <meta http-equiv=Content-Type content="text/html; charset=windows-1252">
+    <meta name=Generator content="Microsoft Word 15 (filtered)">
+    <style>
+    <!--
+     /* Font Definitions */
+     @font-face
+    	{font-family:"Cambria Math";
+    	panose-1:2 4 5 3 5 4 6 3 2 4;}
+    @font-face
+    	{font-family:Calibri;
+    	panose-1:2 15 5 2 2 2 4 3 2 4;}
+    @font-face
+    	{font-family:Corbel;
+    	panose-1:2 11 5 3 2 2 4 2 2 4;}
+    @font-face
+    	{font-family:"Century Gothic";
+    	panose-1:2 11 5 2 2 2 2 2 2 4;}
+     /* Style Definitions */
+     p.MsoNormal, li.MsoNormal, div.MsoNormal
+    	{margin:0in;
+    	margin-bottom:.0001pt;
+    	font-size:11.0pt;
+    	font-family:"Calibri",sans-serif;}
+    a:link, span.MsoHyperlink
+    	{color:#0563C1;
+    	text-decoration:underline;}
+    .MsoChpDefault
+    	{font-family:"Calibri",sans-serif;}
+    .MsoPapDefault
+    	{margin-bottom:8.0pt;
+    	line-height:107%;}
+    @page WordSection1
+    	{size:8.5in 11.0in;
+    	margin:1.0in 1.0in 1.0in 1.0in;}
+    div.WordSection1
+    	{page:WordSection1;}
+    -->
+    </style>
+    </head>
+    <body lang=EN-US link="#0563C1" vlink="#954F72">
+    <div class=WordSection1>
+    <p class=MsoNormal><span style='font-family:"Century Gothic",sans-serif;
+    color:#1E3871'>Your <a href=" {{deploymentUrl}} ">deployment</a> has completed.</span></p><br>
+    <p class=MsoNormal><b><span style='font-family:"Century Gothic",sans-serif;
+    color:#1E3871'>Cloud Assembly </span></b></p><br>
+    <p class=MsoNormal><b><span style='font-size:9.0pt;font-family:"Corbel",sans-serif;
+    color:#0075BE'>VMware Cloud Services</span></b></p><br>
+    <p class=MsoNormal><b><span style='font-size:9.0pt;font-family:"Corbel",sans-serif;
+    color:#0075BE'>Spas is awesome!!! <br>
+    <a href="http://www.kaloferov.com">www.kaloferov.com</a> </span></b></p>
+    </div>
+    </body>
+    </html>
+
+                """    # The HTML body of the email.
+
+# Event topic templates. Used by the topics of eventTopics other than deploymentCompleted. {{headline}} is the rendered headline template of the topic
+emailTopicTemplateText = ("{{headline}}\r\n"    # The email body for recipients with non-HTML email clients.
+                "{{failureMessage}}\r\n"
+                "{{deploymentUrl}}\r\n"
+                "\r\n"
+                "Cloud Assembly  \r\n"
+                "VMware Cloud Services \r\n"
+                "Spas is awesome!!!  \r\n"
+                "www.kaloferov.com \r\n"
+                )
+emailTopicTemplateHtml = """
+    <html>
+    <head>
+    <meta http-equiv=Content-Type content="text/html; charset=utf-8">
+    <style>
+    <!--
+    p.MsoNormal
+    	{margin:0in;
+    	margin-bottom:.0001pt;
+    	font-size:11.0pt;
+    	font-family:"Century Gothic",sans-serif;
+    	color:#1E3871;}
+    a:link
+    	{color:#0563C1;
+    	text-decoration:underline;}
+    -->
+    </style>
+    </head>
+    <body lang=EN-US link="#0563C1" vlink="#954F72">
+    <div>
+    <p class=MsoNormal><a href="{{deploymentUrl}}">{{headline}}</a></p><br>
+    <p class=MsoNormal>{{failureMessage}}</p><br>
+    <p class=MsoNormal><b>Cloud Assembly </b></p><br>
+    <p class=MsoNormal><b><span style='font-size:9.0pt;font-family:"Corbel",sans-serif;
+    color:#0075BE'>VMware Cloud Services</span></b></p><br>
+    <p class=MsoNormal><b><span style='font-size:9.0pt;font-family:"Corbel",sans-serif;
+    color:#0075BE'>Spas is awesome!!! <br>
+    <a href="http://www.kaloferov.com">www.kaloferov.com</a> </span></b></p>
+    </div>
+    </body>
+    </html>
+
+                """    # The HTML body of the email.
+
+# Event topics. Subscribe the action to any of these topics. Topics not listed here are skipped as unsupported
+eventTopicDeploymentFields = (    # (template variable, payload paths). The first path present in the payload wins
+    ("eventType", ("eventType",)),
+    ("requestType", ("requestType", "eventType")),
+    ("status", ("status",)),
+    ("failureMessage", ("failureMessage", "errorMessage")),
+)
+eventTopicActionFields = eventTopicDeploymentFields + (    # Day-2 action topics
+    ("actionName", ("actionName", "actionId", "eventType")),
+    ("resourceName", ("resourceName", "resourceNames.0")),
+)
+eventTopics = [    # name, requires: template variables that must not be empty, else the run is skipped. keys (eventTopicId, type, outcome) dispatched to the topic, None matches any. fields: see eventTopicDeploymentFields. Missing fields are empty. subject, headline, text and html are templates. Project overrides in emailTemplateOverridesIn apply per project and per project and topic name
+    {"name": "deploymentCompleted", "requires": (), "keys": [("TEST", None, None), ("deployment.request.post", None, None)], "fields": eventTopicDeploymentFields,
+        "subject": emailDefaultTemplateSubject, "headline": "Deployment {{deploymentName}} has completed.", "text": emailDefaultTemplateText, "html": emailDefaultTemplateHtml},
+    {"name": "deploymentUpdated", "requires": ("deploymentId",), "keys": [("deployment.request.post", "UPDATE_DEPLOYMENT", None)], "fields": eventTopicDeploymentFields,
+        "subject": "Cloud Assembly - Deployment {{deploymentName}} updated", "headline": "Deployment {{deploymentName}} has been updated.", "text": emailTopicTemplateText, "html": emailTopicTemplateHtml},
+    {"name": "deploymentDeleted", "requires": ("deploymentId",), "keys": [("deployment.request.post", "DELETE_DEPLOYMENT", None), ("deployment.request.post", "DESTROY_DEPLOYMENT", None), ("deployment.action.post", "Deployment.Delete", None)], "fields": eventTopicActionFields,
+        "subject": "Cloud Assembly - Deployment {{deploymentName}} deleted", "headline": "Deployment {{deploymentName}} has been deleted.", "text": emailTopicTemplateText, "html": emailTopicTemplateHtml},
+    {"name": "deploymentFailed", "requires": ("deploymentId",), "keys": [("deployment.request.post", None, "FAILED")], "fields": eventTopicDeploymentFields,
+        "subject": "Cloud Assembly - Deployment {{deploymentName}} failed", "headline": "Request {{requestType}} of deployment {{deploymentName}} has failed.", "text": emailTopicTemplateText, "html": emailTopicTemplateHtml},
+    {"name": "deploymentActionCompleted", "requires": ("deploymentId", "actionName"), "keys": [("deployment.action.post", None, None)], "fields": eventTopicActionFields,
+        "subject": "Cloud Assembly - {{actionName}} completed on {{deploymentName}}", "headline": "Action {{actionName}} has completed on deployment {{deploymentName}}.", "text": emailTopicTemplateText, "html": emailTopicTemplateHtml},
+    {"name": "deploymentActionFailed", "requires": ("deploymentId", "actionName"), "keys": [("deployment.action.post", None, "FAILED")], "fields": eventTopicActionFields,
+        "subject": "Cloud Assembly - {{actionName}} failed on {{deploymentName}}", "headline": "Action {{actionName}} has failed on deployment {{deploymentName}}.", "text": emailTopicTemplateText, "html": emailTopicTemplateHtml},
+    {"name": "resourceActionCompleted", "requires": ("deploymentId", "actionName", "resourceName"), "keys": [("deployment.resource.action.post", None, None)], "fields": eventTopicActionFields,
+        "subject": "Cloud Assembly - {{actionName}} completed on {{resourceName}}", "headline": "Action {{actionName}} has completed on {{resourceName}} of deployment {{deploymentName}}.", "text": emailTopicTemplateText, "html": emailTopicTemplateHtml},
+    {"name": "resourceActionFailed", "requires": ("deploymentId", "actionName", "resourceName"), "keys": [("deployment.resource.action.post", None, "FAILED")], "fields": eventTopicActionFields,
+        "subject": "Cloud Assembly - {{actionName}} failed on {{resourceName}}", "headline": "Action {{actionName}} has failed on {{resourceName}} of deployment {{deploymentName}}.", "text": emailTopicTemplateText, "html": emailTopicTemplateHtml},
+]
+eventTopicDefault = eventTopics[0]    # Templates of TEST runs and of runs skipped as unsupported
+eventTopicRegistry = {key: eventTopic for eventTopic in eventTopics for key in eventTopic['keys']}    # Topic dispatch table. Key: (eventTopicId, type, outcome). See eventTopicResolve
+eventTopicTypePaths = {    # Payload paths of the type part of the key, per eventTopicId. Others use eventType
+    "deployment.action.post": ("actionName", "actionId", "eventType"),
+    "deployment.resource.action.post": ("actionName", "actionId", "eventType"),
+}
+eventTopicFailedStatuses = ("FAILED", "FAILURE", "ERROR")    # Payload status values dispatched to the FAILED outcome
+
+# Digest templates. One summary email per recipient when actionOptionDigestIn=True. Variables: recipient, count, notifications (headline, deploymentUrl, deploymentId, deploymentName, projectName, eventTopicId, subject)
+emailDigestTemplateSubject = "Cloud Assembly - {{count}} deployment notifications"    # The subject line for the digest.
+emailDigestTemplateText = ("{{count}} deployment notifications.\r\n"    # The digest body for recipients with non-HTML email clients.
+                "\r\n"
+                "{{#each notifications}}{{headline}} {{deploymentId}}\r\n"
+                "{{deploymentUrl}}\r\n"
+                "\r\n"
+                "{{/each}}"
+                "Cloud Assembly  \r\n"
+                "VMware Cloud Services \r\n"
+                "Spas is awesome!!!  \r\n"
+                "www.kaloferov.com \r\n"
+                )
+emailDigestTemplateHtml = """
+    <html>
+    <head>
+    <meta http-equiv=Content-Type content="text/html; charset=utf-8">
+    <style>
+    <!--
+    p.MsoNormal, li.MsoNormal
+    	{margin:0in;
+    	margin-bottom:.0001pt;
+    	font-size:11.0pt;
+    	font-family:"Century Gothic",sans-serif;
+    	color:#1E3871;}
+    a:link
+    	{color:#0563C1;
+    	text-decoration:underline;}
+    -->
+    </style>
+    </head>
+    <body lang=EN-US link="#0563C1" vlink="#954F72">
+    <div>
+    <p class=MsoNormal>{{count}} deployment notifications.</p><br>
+    <ul>
+    {{#each notifications}}<li class=MsoNormal><a href="{{deploymentUrl}}">{{headline}}</a> {{deploymentId}}</li>
+    {{/each}}</ul><br>
+    <p class=MsoNormal><b>Cloud Assembly </b></p><br>
+    <p class=MsoNormal><b><span style='font-size:9.0pt;font-family:"Corbel",sans-serif;
+    color:#0075BE'>VMware Cloud Services</span></b></p><br>
+    <p class=MsoNormal><b><span style='font-size:9.0pt;font-family:"Corbel",sans-serif;
+    color:#0075BE'>Spas is awesome!!! <br>
+    <a href="http://www.kaloferov.com">www.kaloferov.com</a> </span></b></p>
+    </div>
+    </body>
+    </html>
+
+                """    # The HTML body of the digest.
+emailTemplateCache = {}    # Warm container cache of compiled templates. Key: sha256 of the template source 
+emailTemplateCacheMaxSize = 64    # Max templates kept in emailTemplateCache
+emailTemplateOverridesCache = {}    # Warm container cache of parsed emailTemplateOverridesIn. Key: the input string 
+emailOptimizedHtmlCache = {}    # Warm container cache of CSS inlined and minified HTML templates. Key: sha256 of the template source 
+emailTemplateSizeReports = {}    # Size report per optimized template. Key: sha256 of the template source 
+emailHtmlBlockTags = {"html", "head", "body", "meta", "title", "style", "link", "div", "p", "br", "hr", "table", "thead", "tbody", "tr", "td", "th", "ul", "ol", "li", "h1", "h2", "h3", "h4", "h5", "h6"}    # Whitespace around these tags is not rendered
+emailHtmlVoidTags = {"br", "hr", "img", "meta", "link", "input", "col", "area", "base", "wbr"}    # Tags without an end tag
+emailHtmlPreformattedTags = {"pre", "textarea"}    # Whitespace inside these tags is rendered as is
+emailHtmlWhitespacePattern = re.compile(r"[ \t\r\n\f]+")    # HTML whitespace. &nbsp; (\xa0) is text and is kept
+emailCssDroppedProperties = {"page", "size"}    # Print only properties. Dropped when inlining
+emailCssDroppedAtRules = {"page", "charset"}    # Print and encoding at-rules. Dropped. Other at-rules (e.g. @media, @supports, @font-face, @import) are kept as is in the <style> block
+emailTemplateTagPattern = re.compile(r"\{\{\{\s*([\w.]+)\s*\}\}\}|\{\{\s*(#each\s+[\w.]+|/each|[\w.]+)\s*\}\}")    # {{{raw}}}, {{#each list}}, {{/each}} and {{name}} tags
+
+
+# ----- Functions  ----- # 
+
+def actionRun (context, inputs, actionFeatures=None):  # Runs the action. Called by the handler of each action with the action options it supports. None supports all
+    return contextvars.copy_context().run(actionRunStages, context, inputs, actionFeatures)    # Return outputs. The run context is set in a copy, so it ends with the run
+    # End Function
+
+
+
+def actionRunStages (context, inputs, actionFeatures=None):  # Runs the stages of the action. See actionRun
+    fn = "actionRun -"    # Holds the funciton name. 
+    actionStartTime = time.time()    # Reported in the run summary
+    actionDeadline = actionGetDeadline (context, actionStartTime)   # Call function. Stages that send queued emails stop here
+    actionConfig = actionConfigGet (inputs, actionFeatures)   # Call function. Typed action inputs. Parsed once and reused while the action inputs are unchanged
+    actionRunContext.set(ActionRunContext(actionConfig))    # Log level, log format and stage timings of this run. Not shared with concurrent runs
+    actionLog("DEBUG", fn, "Action started.")
+    for actionConfigError in actionConfig.errors:    # Loop. Invalid or missing inputs. Reported on every run, as each run has its own log
+        actionLog("WARNING", fn, "INVALID action input. %s", actionConfigError)
+    # End Loop
+    actionLog("DEBUG", fn, "Function started.")
+    
+
+    # ----- Action Options  ----- # 
+    
+    # General action options. Validated by actionConfigGet. See actionInputSchema
+    runOnPorpertyMatch = actionConfig.runOnPorpertyMatch    # Replaced by the payload index if actionOptionAcceptPayloadInput=True  
+    runOnBlueprintOptionMatch = actionConfig.runOnBlueprintOptionMatch    # Fetched from the blueprint if actionOptionAcceptPayloadInput=True  
+    blueprintId = ""    # Used to get the blueprint options. Required only when runOnBlueprintOption is evaluated against the blueprint
+    projectId = ""    # Used to select project template overrides
+    projectName = ""    # Used to select project template overrides
+    eventTopicId = ""   # Event Topic for which the aciton is running
+    eventTopic = None   # Notification of the event topic. See eventTopics
+
+    # ----- Inputs  ----- # 
+
+    # AWS SES Inputs
+    awsSesToRecipient = actionConfig.awsSesToRecipient    # Replaced by the requester if actionOptionAcceptPayloadInput=True 
+    deploymentId = actionConfig.deploymentId    # Replaced by the payload deploymentId if actionOptionAcceptPayloadInput=True 
+    deploymentUrl = ""  # Deployment base url
+    awsSesSubject = emailDefaultTemplateSubject    # The subject line for the email. Replaced by the rendered subject template below
+
+    with actionTimer("payloadIndex"):
+        payloadIndex = payloadBuildIndex (inputs)    # Index of the payload used for all lookups below. runOn rules resolve only the keys and paths they reference
+    # End Loop
+
+    # eventTopicId, eventTopic 
+    eventTopicId, eventTopic = eventTopicResolve (payloadIndex)   # Call function
+
+    # actionInputs Hashtable 
+    actionInputs = {}  
+    actionInputs['actionOptionAcceptPayloadInput'] = actionConfig.actionOptionAcceptPayloadInput
+    actionInputs['actionOptionRunOnProperty'] = actionConfig.actionOptionRunOnProperty
+    actionInputs['actionOptionRunOnBlueprintOption'] = actionConfig.actionOptionRunOnBlueprintOption
+    actionInputs['actionOptionUseAwsSecretsManager'] = actionConfig.actionOptionUseAwsSecretsManager
+    actionInputs['actionOptionConcurrentPrefetch'] = actionConfig.actionOptionConcurrentPrefetch
+    actionInputs['actionOptionSesBulkSend'] = actionConfig.actionOptionSesBulkSend
+    actionInputs['actionOptionOutbox'] = actionConfig.actionOptionOutbox
+    actionInputs['actionOptionDigest'] = actionConfig.actionOptionDigest
+    actionInputs['awsSmCspTokenSecretId'] = actionConfig.awsSmCspTokenSecretId 
+    actionInputs['awsSmRegionName'] = actionConfig.awsSmRegionName 
+    actionInputs['runOnProperty'] = actionConfig.runOnProperty 
+    actionInputs['runOnBlueprintOption'] = actionConfig.runOnBlueprintOption
+    actionInputs['cspRefreshToken'] = actionConfig.cspRefreshToken
+    actionInputs['eventTopicId'] = eventTopicId
+    actionInputs['eventTopic'] = eventTopic
+    actionInputs['awsSesSender'] = actionConfig.awsSesSender
+    actionInputs['awsSesConfigurationSet'] = actionConfig.awsSesConfigurationSet
+    actionInputs['awsSesRegion'] = actionConfig.awsSesRegion
+    actionInputs['awsSesSubject'] = awsSesSubject
+    actionInputs['awsSesTemplateName'] = actionConfig.awsSesTemplateName if (eventTopic in (None, eventTopicDefault)) else actionConfig.awsSesTemplateName+"-"+eventTopic['name']    # One SES template per topic
+    actionInputs['awsSesBulkRecipients'] = actionConfig.awsSesBulkRecipients
+
+
+    if (actionInputs['actionOptionAcceptPayloadInput']):     # Loop. If Payload exists and Accept Payload input action option is set to True , accept payload inputs . Else except action inputs.
+        actionLog("DEBUG", fn, "Using PAYLOAD inputs based on actionOptionAcceptPayloadInputIn action option")
+
+        # blueprintId 
+        blueprintId = str(payloadIndex['paths'].get('blueprintId', ""))
+        
+        # projectId, projectName 
+        projectId = str(payloadIndex['paths'].get('projectId', ""))
+        projectName = str(payloadIndex['paths'].get('projectName', ""))
+        
+        # deploymentId 
+        if ('deploymentId' in payloadIndex['paths']):
+            deploymentId = payloadIndex['paths']['deploymentId']
+        else:
+            pass    # use action inpuits 
+        # End Loop
+        
+        deploymentUrl = "https://www.mgmt.cloud.vmware.com/automation-ui/#/deployment-ui;ash=%2Fdeployment%2F"+str(deploymentId)
+
+        # awsSesToRecipient
+        if ('__metadata.userName' in payloadIndex['paths']):
+            awsSesToRecipient = payloadIndex['paths']['__metadata.userName']
+        else:
+            pass    # Use Action inputs
+        # End Loop
+        
+        
+        # runOn Condition Inputs
+        if (actionInputs['eventTopicId'] != "TEST"):
+            
+            # runOnPorpertyMatch
+            if (actionInputs['actionOptionRunOnProperty']):    # Loop. Get property to match against. 
+                runOnPorpertyMatch = payloadIndex    # Rules are evaluated against the payload index
+            else:
+                pass    # Get value from action inputs
+            # End Loop
+    
+            # runOnBlueprintOptionMatch
+            if (actionInputs['actionOptionRunOnBlueprintOption']):    # Loop. Get property to match against. 
+                actionLog("DEBUG", fn, "Using BLUEPRINT for blueprintOptions based on actionOptionRunOnBlueprintOptionIn action option")
+                runOnBlueprintOptionMatch = None    # Fetched from the blueprint on demand. See Evals
+            else:
+                pass    # Get value from action inputs
+            # End Loop
+            
+        else:
+            pass    # Get value from action inputs
+        # End Loop
+
+    else:
+        actionLog("DEBUG", fn, "Using ACTION inputs for ABX action based on actionOptionAcceptPayloadInputIn action option")
+        # Get values from action inputs
+    # End Loop
+
+    actionInputs['blueprintId'] = blueprintId
+    actionInputs['projectId'] = projectId
+    actionInputs['projectName'] = projectName
+    actionInputs['deploymentUrl'] = str(deploymentUrl)
+    actionInputs['deploymentId'] = deploymentId
+    actionInputs['awsSesToRecipient'] = awsSesToRecipient
+
+    actionInputs['runOnPorpertyMatch'] = runOnPorpertyMatch    
+    actionInputs['runOnBlueprintOptionMatch'] = runOnBlueprintOptionMatch    
+    
+    actionInputs['awsSesCcRecipient'] = actionConfig.awsSesCcRecipient
+    actionInputs['awsSesBccRecipient'] = actionConfig.awsSesBccRecipient  
+
+    # TO, CC and BCC lists. Normalized, de-duplicated across the fields and split into messages of up to 50 recipients
+    with actionTimer("recipients"):
+        awsSesRecipients = awsSesResolveRecipients (context, inputs, actionConfig, actionInputs)   # Call function
+    # End Loop
+    actionInputs['awsSesRecipientFields'] = awsSesRecipients['recipientFields']
+    actionInputs['awsSesRecipients'] = awsSesRecipients['recipients']
+    actionInputs['awsSesDestinations'] = awsSesRecipients['destinations']
+
+    # Email subject, text and HTML bodies. Rendered from the default or project override templates
+    with actionTimer("templateRender"):
+        emailTemplates = emailGetTemplates (context, inputs, actionConfig, actionInputs)   # Call function
+        if (actionConfig.actionOptionOptimizeHtml):    # Loop. CSS inlined and minified HTML. Done once per template and container
+            emailTemplates['html'] = emailOptimizeHtml (emailTemplates['html'])   # Call function
+        # End Loop
+        emailTemplateData = emailBuildTemplateData (context, inputs, actionInputs, payloadIndex)   # Call function
+        emailTemplateData['headline'] = emailTemplateRender(emailTemplateCompile(emailTemplates['headline']), emailTemplateData, False)
+        actionInputs['eventTopicMissingFields'] = [templateVariable for templateVariable in (eventTopic or eventTopicDefault)['requires'] if (str(emailTemplateData.get(templateVariable, "")) == "")]    # Checked with the runOn conditions
+        actionInputs['emailTemplateData'] = emailTemplateData
+        actionInputs['awsSesSubjectTemplate'] = emailTemplates['subject']    # Templates are also used as the SES template in bulk mode
+        actionInputs['awsSesBodyTextTemplate'] = emailTemplates['text']
+        actionInputs['awsSesBodyHtmlTemplate'] = emailTemplates['html']
+        actionInputs['awsSesSubject'] = emailTemplateRender(emailTemplateCompile(emailTemplates['subject']), emailTemplateData, False)
+        actionInputs['awsSesBodyText'] = emailTemplateRender(emailTemplateCompile(emailTemplates['text']), emailTemplateData, False)    # The email body for recipients with non-HTML email clients.
+        actionInputs['awsSesBodyHtml'] = emailTemplateRender(emailTemplateCompile(emailTemplates['html']), emailTemplateData, True)    # The HTML body of the email.
+    # End Loop
+
+    awsSesCharset = "UTF-8"     # The character encoding for the email.
+    actionInputs['awsSesCharset'] = awsSesCharset
+
+
+    # Log actionInputs. Secrets are OMITED
+    actionLog("DEBUG", fn, "actionInputs.", actionInputs=actionInputs)
+    
+    
+    # ----- Evals ----- # 
+    
+    evals = {}  # Holds evals values
+    
+    # runOnProperty eval
+    if (actionInputs['actionOptionRunOnProperty']):   # Loop. RunOn eval.
+        with actionTimer("runOnPropertyEval"):
+            runOnProperty_eval = str(runOnRuleEvaluate(actionInputs['runOnProperty'], actionInputs['runOnPorpertyMatch']))
+        # End Loop
+    else:
+        runOnProperty_eval = "Not Evaluated"
+    # End Loop
+
+    # Cheap local checks. Remote lookups (secrets, CSP token, blueprint) only run when these pass 
+    if (actionInputs['eventTopic'] is None):
+        skipReason = "Unsupported event topic: "+actionInputs['eventTopicId']
+    elif (actionInputs['eventTopicMissingFields']):
+        skipReason = "Payload fields missing for event topic "+actionInputs['eventTopic']['name']+": "+", ".join(actionInputs['eventTopicMissingFields'])
+    elif (runOnProperty_eval.lower() == "false"):
+        skipReason = "runOnProperty condition not matched."
+    elif (not actionInputs['awsSesRecipients']):
+        skipReason = "No recipient."
+    elif ((actionInputs['actionOptionRunOnBlueprintOption']) and (actionInputs['runOnBlueprintOptionMatch'] is None) and (actionInputs['blueprintId'] == "")):
+        skipReason = "No blueprintId in the payload for runOnBlueprintOption."
+    else:
+        skipReason = ""
+    # End Loop
+
+    # runOnBlueprintOption  eval
+    if ((actionInputs['actionOptionRunOnBlueprintOption']) and (skipReason == "")):     # Loop. RunOn eval.
+        if (actionInputs['runOnBlueprintOptionMatch'] is None):
+            actionLog("DEBUG", fn, "Getting blueprintOptions...")
+            with actionTimer("blueprintOptions"):    # Secrets lookup, CSP login and blueprint fetch are also timed on their own
+                if (actionInputs['actionOptionConcurrentPrefetch']):    # Loop. Overlap SES client creation with the CSP auth and blueprint chain
+                    actionLog("DEBUG", fn, "Prefetching SES client and blueprintOptions concurrently.")
+                    actionStageTimeout = actionConfig.actionStageTimeout
+                    sesClientFuture = actionSubmit(awsGetClient, context, inputs, actionConfig, 'ses', actionInputs['awsSesRegion'])    # Result is picked up from the client registry
+                    blueprintOptionsFuture = actionSubmit(cspPrefetchBlueprintOptions, context, inputs, actionConfig, actionInputs)    # Secrets lookup, CSP login and blueprint fetch
+                    concurrent.futures.wait([sesClientFuture, blueprintOptionsFuture], timeout=actionStageTimeout)    # One deadline for all prefetched stages
+                    if (not blueprintOptionsFuture.done()):
+                        actionLog("WARNING", fn, "blueprintOptions not received within %ss.", actionStageTimeout)
+                        skipReason = "Blueprint options lookup timed out."
+                    elif (not sesClientFuture.done()):    # The send would wait for the client creation without a limit
+                        actionLog("WARNING", fn, "SES client not created within %ss.", actionStageTimeout)
+                        skipReason = "SES client creation timed out."
+                    else:
+                        actionInputs['runOnBlueprintOptionMatch'] = blueprintOptionsFuture.result()    # A failed SES client creation is retried by myActionFunction
+                    # End Loop
+                else:
+                    actionInputs['runOnBlueprintOptionMatch'] = cspPrefetchBlueprintOptions (context, inputs, actionConfig, actionInputs)   # Call function
+                # End Loop
+            # End Loop
+        # End Loop
+        if (actionInputs['runOnBlueprintOptionMatch'] is None):
+            runOnBlueprintOption_eval = "Not Evaluated"
+        else:
+            with actionTimer("runOnBlueprintOptionEval"):
+                runOnBlueprintOption_eval = str(runOnRuleEvaluate(actionInputs['runOnBlueprintOption'], actionInputs['runOnBlueprintOptionMatch']))
+            # End Loop
+        # End Loop
+    else:  
+        runOnBlueprintOption_eval = "Not Evaluated"
+    # End Loop
+
+    evals['runOnProperty_eval'] = runOnProperty_eval.lower()
+    actionLog("DEBUG", fn, "runOnProperty_eval: %s", evals['runOnProperty_eval'])        
+    evals['runOnBlueprintOption_eval'] = runOnBlueprintOption_eval.lower()
+    actionLog("DEBUG", fn, "runOnBlueprintOption_eval: %s", evals['runOnBlueprintOption_eval'])    
+    evals['skipReason'] = skipReason
+
+
+    # ----- Function Calls  ----- # 
+
+    if (evals['runOnProperty_eval'] != 'false' and evals['runOnBlueprintOption_eval'] != 'false' and evals['skipReason'] == ""): 
+        actionLog("DEBUG", fn, "runOnProperty matched or actionOptionRunOnPropertyIn action option disabled.")
+        actionLog("DEBUG", fn, "runOnBlueprintOption matched or actionOptionRunOnBlueprintOptionIn action option disabled.")
+        if (actionConfig.actionOptionSuppressionFilter):    # Loop. Pre-send filter 
+            with actionTimer("suppressionFilter"):
+                awsSesFilterSuppressed (context, inputs, actionConfig, actionInputs)   # Call function
+            # End Loop
+        # End Loop
+        actionLog("DEBUG", fn, "Running myActionFunction...")
+        with actionTimer("myActionFunction"):
+            resp_myActionFunction = myActionFunction (context, inputs, actionConfig, actionInputs, evals)     # Call function
+        # End Loop
+    else:
+        actionLog("INFO", fn, "runOn condition(s) NOT matched. Skipping action run. %s", evals['skipReason'])
+        resp_myActionFunction = ""
+    # End Loop
+
+    if (actionConfig.actionOptionDigest):    # Loop. Send the digests that are due, including those collected by earlier runs. ABX freezes the container once the handler returns
+        with actionTimer("digestFlush"):
+            resp_digest = digestFlush (context, inputs, actionConfig, deadline=actionDeadline)   # Call function. Digests not yet due are sent by the first run after their window ends
+        # End Loop
+    else:
+        resp_digest = ""
+    # End Loop
+
+    if (actionConfig.actionOptionOutbox):    # Loop. Send the queued emails before returning, including those left by earlier runs. ABX freezes the container once the handler returns
+        with actionTimer("outboxDrain"):
+            resp_outbox = outboxDrain (context, inputs, actionConfig, deadline=actionDeadline)   # Call function
+        # End Loop
+    else:
+        resp_outbox = ""
+    # End Loop
+     
+        
+    # ----- Outputs ----- #
+    
+    
+    actionTimingAdd ("total", (time.time() - actionStartTime) * 1000)   # Call function
+    timings = actionTimingsSnapshot ()   # Call function
+    if (actionConfig.actionOptionEmitMetrics):    # Loop. One EMF line per run for latency dashboards
+        actionMetricsEmit (actionConfig, timings, eventTopicId=actionInputs['eventTopicId'])   # Call function
+    # End Loop
+
+    resp_handler = {}   # Set function response 
+    resp_handler = evals
+    outputs = {   # Set action outputs
+       #"actionInputs": actionInputs,
+       "resp_handler": resp_handler,
+       "resp_myActionFunction": resp_myActionFunction,
+       "resp_digest": resp_digest,
+       "resp_outbox": resp_outbox,
+       "timings": timings,
+    }
+    actionLog("DEBUG", fn, "Action return.", outputs=outputs)    # Write action output to console     
+    actionLog("INFO", fn, "Action completed.",    # One summary record per run 
+        eventTopicId=actionInputs['eventTopicId'],
+        eventTopic=(actionInputs['eventTopic'] or {}).get('name', ""),
+        deploymentId=actionInputs['deploymentId'],
+        recipients=len(actionInputs['awsSesRecipients']),
+        messages=len(actionInputs['awsSesDestinations']),
+        runOnProperty_eval=evals['runOnProperty_eval'],
+        runOnBlueprintOption_eval=evals['runOnBlueprintOption_eval'],
+        skipReason=evals['skipReason'],
+        send_resp=(resp_myActionFunction or {}).get('send_resp', "skipped"),
+        durationMs=int(timings['total']))
+    actionLog("DEBUG", fn, "P.S. Spas Is Awesome !!!")
+
+    return outputs    # Return outputs 
+
+    
+    
+def myActionFunction (context, inputs, actionConfig, actionInputs, evals):   # Main Function. 
+    fn = "myActionFunction -"    # Holds the funciton name. 
+    actionLog("DEBUG", fn, "Action started.")
+    actionLog("DEBUG", fn, "Function started.")
+    
+    
+    # ----- Script ----- #
+
+    with actionTimer("sesClient"):
+        awsSesClient = awsGetClient (context, inputs, actionConfig, 'ses', actionInputs['awsSesRegion'])     # Get the SES client for the region. Reused across warm invocations.
+    # End Loop
+    sendStatus = {}
+    
+    #Provide the contents of the email.
+    awsSesMessage = {
+        'Message': {
+            'Body': {
+                'Html': {
+                    'Charset': actionInputs['awsSesCharset'],
+                    'Data': actionInputs['awsSesBodyHtml'],
+                },
+                'Text': {
+                    'Charset': actionInputs['awsSesCharset'],
+                    'Data': actionInputs['awsSesBodyText'],
+                },
+            },
+            'Subject': {
+                'Charset': actionInputs['awsSesCharset'],
+                'Data': actionInputs['awsSesSubject'],
+            },
+        },
+        'Source': actionInputs['awsSesSender'],
+        # 'ConfigurationSetName': actionInputs['awsSesConfigurationSet'], # TODO: Uncomment to use. Must specify via awsSesConfigurationSetIn action input
+    }
+    
+    if (not actionInputs['awsSesRecipients']):    # Loop. e.g. all recipients suppressed
+        actionLog("INFO", fn, "No recipients left. Nothing to send.")
+        sendStatus = "skipped"
+    elif (actionInputs['actionOptionDigest']):    # Loop. Collect the notification. One summary email per recipient is sent when the digest is due
+        sendStatus = digestAdd (context, inputs, actionConfig, actionInputs)   # Call function
+    elif (actionInputs['actionOptionSesBulkSend']):    # Loop. Bulk templated send. 
+        sendStatus = awsSesSendBulk (context, inputs, actionConfig, actionInputs, awsSesClient)   # Call function
+    else:
+        sendStatuses = []
+        for awsSesDestination in actionInputs['awsSesDestinations']:    # Loop. One message per 50 recipients
+            awsSesRecipientCount = sum(len(addresses) for addresses in awsSesDestination.values())
+            if (actionInputs['actionOptionOutbox']):    # Loop. Queue the rendered email. Sent by the outbox drain at the end of the run 
+                sendStatuses.append(outboxEnqueue (context, inputs, actionConfig, actionInputs['awsSesRegion'], awsSesRecipientCount, dict(awsSesMessage, Destination=awsSesDestination)))   # Call function
+            else:
+                # Try to send the email.
+                try:
+                    send_resp = awsSesCallWithRetry (context, inputs, actionConfig, awsSesClient, actionInputs['awsSesRegion'], 'send_email', awsSesRecipientCount, Destination=awsSesDestination, **awsSesMessage)
+                # Display an error if something goes wrong.	
+                except (ClientError, BotoCoreError) as e:
+                    actionLog("ERROR", fn, "%s", awsGetErrorMessage(e))
+                    sendStatuses.append("error")
+                else:
+                    actionLog("INFO", fn, "Email sent! Message ID: %s", send_resp.get('MessageId', ""))
+                    sendStatuses.append("ok")
+            # End Loop
+        # End Loop
+        if (len(set(sendStatuses)) == 1):
+            sendStatus = sendStatuses[0]
+        elif (sendStatuses):
+            sendStatus = "partial"
+        else:
+            sendStatus = "error"
+        # End Loop
+    # End Loop
+
+        
+        
+    # ----- Outputs ----- #
+    
+    resp_myActionFunction = {}
+    resp_myActionFunction = sendStatus
+    
+    response = {    # Set action outputs
+         "send_resp": resp_myActionFunction,
+         "suppressed_recipients": actionInputs.get('awsSesSuppressedRecipients', []),
+    }
+    actionLog("DEBUG", fn, "Function return.", response=response)    # Write function responce to console  
+    actionLog("DEBUG", fn, "Function completed.")   
+    
+    return response    # Return response 
+    # End Function   
+    
+
+
+def awsSesResolveRecipients (context, inputs, actionConfig, actionInputs):  # Resolves TO, CC and BCC lists plus project distribution lists. Returns the unique recipients and the per message destinations
+    fn = "awsSesResolveRecipients -"    # Holds the funciton name. 
+    
+    # Project distribution lists 
+    awsSesProjectRecipientsIn = actionConfig.awsSesProjectRecipients
+    if (awsSesProjectRecipientsIn not in awsSesProjectRecipientsCache):
+        if (awsSesProjectRecipientsIn == ""):    # Loop. Nothing to parse. yaml is not imported
+            awsSesProjectRecipients = None
+        else:
+            yaml = actionImport("yaml")
+            try:
+                awsSesProjectRecipients = yaml.safe_load(awsSesProjectRecipientsIn)
+            except yaml.YAMLError as e:
+                actionLog("WARNING", fn, "Invalid awsSesProjectRecipientsIn. Ignoring it. %s", str(e).splitlines()[0])
+                awsSesProjectRecipients = None
+            # End Loop
+        # End Loop
+        awsSesProjectRecipientsCache.clear()    # Only the current action inputs are kept
+        awsSesProjectRecipientsCache[awsSesProjectRecipientsIn] = awsSesProjectRecipients if isinstance(awsSesProjectRecipients, dict) else {}
+    # End Loop
+    awsSesProjectRecipients = {}
+    for projectKey in (actionInputs.get('projectId', ""), actionInputs.get('projectName', "")):    # Loop. Project id first, then name
+        if (projectKey and isinstance(awsSesProjectRecipientsCache[awsSesProjectRecipientsIn].get(projectKey), dict)):
+            awsSesProjectRecipients = awsSesProjectRecipientsCache[awsSesProjectRecipientsIn][projectKey]
+            break
+        # End Loop
+    # End Loop
+    
+    # Normalize and de-duplicate. A recipient is kept in the first of TO, CC, BCC it appears in
+    awsSesRecipientFields = [("ToAddresses", actionInputs['awsSesToRecipient'], "to"), ("CcAddresses", actionInputs['awsSesCcRecipient'], "cc"), ("BccAddresses", actionInputs['awsSesBccRecipient'], "bcc")]
+    if (actionInputs.get('actionOptionSesBulkSend')):    # Loop. Bulk recipients are last. Each bulk destination is sent TO one recipient
+        awsSesRecipientFields.append(("ToAddresses", actionInputs['awsSesBulkRecipients'], ""))
+    # End Loop
+    awsSesRecipientsSeen = set()
+    awsSesRecipients = []
+    for fieldName, fieldValue, projectField in awsSesRecipientFields:
+        projectValue = (awsSesProjectRecipients.get(projectField) or []) if projectField else []
+        fieldRecipients = re.split(r'[,;]', str(fieldValue or "")) + (projectValue if isinstance(projectValue, list) else re.split(r'[,;]', str(projectValue)))
+        for recipient in fieldRecipients:
+            recipient = str(recipient).strip().strip('<>').strip()
+            localPart, separator, domain = recipient.rpartition("@")
+            if ((separator == "") or (localPart == "") or ("." not in domain) or (" " in recipient)):
+                continue
+            # End Loop
+            recipient = localPart+"@"+domain.lower()    # Domains are case insensitive
+            if (recipient.lower() in awsSesRecipientsSeen):
+                continue
+            # End Loop
+            awsSesRecipientsSeen.add(recipient.lower())
+            awsSesRecipients.append((fieldName, recipient))
+        # End Loop
+    # End Loop
+    
+    awsSesDestinations = awsSesBuildDestinations (awsSesRecipients)   # Call function
+    actionLog("DEBUG", fn, "Recipients: %s in %s message(s).", len(awsSesRecipients), len(awsSesDestinations))
+    
+    response = {
+        "recipientFields": awsSesRecipients,
+        "recipients": [recipient for fieldName, recipient in awsSesRecipients],
+        "destinations": awsSesDestinations,
+    }
+    
+    return response    # Return response 
+    # End Function  
+
+
+
+def awsSesBuildDestinations (awsSesRecipientFields):  # Splits (field, recipient) pairs into send_email destinations of up to 50 recipients
+    awsSesDestinations = []
+    for batchStart in range(0, len(awsSesRecipientFields), awsSesMaxRecipientsPerMessage):
+        awsSesDestination = {}
+        for fieldName, recipient in awsSesRecipientFields[batchStart:batchStart+awsSesMaxRecipientsPerMessage]:
+            awsSesDestination.setdefault(fieldName, []).append(recipient)
+        # End Loop
+        awsSesDestinations.append(awsSesDestination)
+    # End Loop
+    
+    return awsSesDestinations    # Return destinations 
+    # End Function  
+
+
+
+def awsSesFilterSuppressed (context, inputs, actionConfig, actionInputs):  # Drops recipients on the SES account suppression list (bounces, complaints). Returns the suppressed recipients
+    # Ref: https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/sesv2.html#SESV2.Client.get_suppressed_destination
+    fn = "awsSesFilterSuppressed -"    # Holds the funciton name. 
+    actionLog("DEBUG", fn, "Function started.")
+    
+    
+    # ----- Script ----- #
+    
+    awsSesRegion = actionInputs['awsSesRegion']
+    awsSesSuppressionCacheTtl = actionConfig.awsSesSuppressionCacheTtl
+    sesv2Client = awsGetClient (context, inputs, actionConfig, 'sesv2', awsSesRegion)   # Call function
+    
+    # Optional preload of the whole suppression list. One paginated call per TTL instead of one call per new recipient
+    if (actionConfig.awsSesSuppressionPreload):
+        with awsSesSuppressionCacheLock:
+            suppressionList = awsSesSuppressionLists.get(awsSesRegion)
+        # End Loop
+        if ((suppressionList is None) or (suppressionList['expiresAt'] <= time.time())):
+            suppressedAddresses = set()
+            try:
+                listArgs = {}
+                while True:
+                    list_resp = sesv2Client.list_suppressed_destinations(PageSize=1000, **listArgs)
+                    suppressedAddresses.update(summary['EmailAddress'].lower() for summary in list_resp.get('SuppressedDestinationSummaries', []))
+                    if (not list_resp.get('NextToken')):
+                        break
+                    # End Loop
+                    listArgs = {'NextToken': list_resp['NextToken']}
+                # End Loop
+            except ClientError as e:
+                actionLog("WARNING", fn, "list_suppressed_destinations failed. Checking recipients one by one. %s", e.response['Error']['Message'])
+                suppressedAddresses = None
+            # End Loop
+            if (suppressedAddresses is not None):
+                with awsSesSuppressionCacheLock:
+                    awsSesSuppressionLists[awsSesRegion] = {"addresses": suppressedAddresses, "expiresAt": time.time() + awsSesSuppressionCacheTtl}
+                # End Loop
+            # End Loop
+        # End Loop
+    # End Loop
+    
+    awsSesSuppressed = []
+    awsSesRecipientFields = []
+    for fieldName, recipient in actionInputs['awsSesRecipientFields']:
+        cacheKey = (awsSesRegion, recipient.lower())
+        with awsSesSuppressionCacheLock:
+            suppressionList = awsSesSuppressionLists.get(awsSesRegion)
+            cacheEntry = awsSesSuppressionCache.get(cacheKey)
+        # End Loop
+        if ((suppressionList is not None) and (suppressionList['expiresAt'] > time.time())):
+            isSuppressed = recipient.lower() in suppressionList['addresses']
+        elif ((cacheEntry is not None) and (cacheEntry['expiresAt'] > time.time())):
+            isSuppressed = cacheEntry['suppressed']
+        else:
+            try:
+                sesv2Client.get_suppressed_destination(EmailAddress=recipient)
+                isSuppressed = True
+            except ClientError as e:
+                if (e.response['Error']['Code'] == 'NotFoundException'):
+                    isSuppressed = False
+                else:    # Fail open. Do not cache
+                    actionLog("WARNING", fn, "get_suppressed_destination failed. Sending anyway. %s", e.response['Error']['Message'])
+                    isSuppressed = None
+                # End Loop
+            # End Loop
+            if (isSuppressed is not None):
+                with awsSesSuppressionCacheLock:
+                    if (len(awsSesSuppressionCache) >= awsSesSuppressionCacheMaxSize):
+                        awsSesSuppressionCache.clear()
+                    # End Loop
+                    awsSesSuppressionCache[cacheKey] = {"suppressed": isSuppressed, "expiresAt": time.time() + awsSesSuppressionCacheTtl}
+                # End Loop
+            # End Loop
+        # End Loop
+        if (isSuppressed):
+            awsSesSuppressed.append(recipient)
+        else:
+            awsSesRecipientFields.append((fieldName, recipient))
+        # End Loop
+    # End Loop
+    
+    actionInputs['awsSesRecipientFields'] = awsSesRecipientFields
+    actionInputs['awsSesRecipients'] = [recipient for fieldName, recipient in awsSesRecipientFields]
+    actionInputs['awsSesDestinations'] = awsSesBuildDestinations (awsSesRecipientFields)   # Call function
+    actionInputs['awsSesSuppressedRecipients'] = awsSesSuppressed
+    actionLog("INFO", fn, "Suppressed recipients skipped: %s", len(awsSesSuppressed))
+    
+    
+    # ----- Outputs ----- #
+    
+    actionLog("DEBUG", fn, "Function completed.")  
+    
+    return awsSesSuppressed    # Return suppressed recipients 
+    # End Function  
+
+
+
+def awsSesSendBulk (context, inputs, actionConfig, actionInputs, awsSesClient):  # Sends the notification with send_bulk_templated_email. Up to 50 destinations per call, each with its own template data
+    # Ref: https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/ses.html#SES.Client.send_bulk_templated_email
+    fn = "awsSesSendBulk -"    # Holds the funciton name. 
+    actionLog("DEBUG", fn, "Function started.")
+    
+    
+    # ----- Script ----- #
+    
+    awsSesTemplateName = awsSesEnsureTemplate (context, inputs, actionConfig, awsSesClient, actionInputs['awsSesRegion'], actionInputs['awsSesTemplateName'], actionInputs['awsSesSubjectTemplate'], actionInputs['awsSesBodyHtmlTemplate'], actionInputs['awsSesBodyTextTemplate'])   # Call function. One SES template per content, so concurrent runs of other projects or topics never send this content
+    
+    # One destination per unique recipient. Bulk recipients are resolved and suppression filtered with the TO, CC and BCC lists
+    awsSesRecipients = actionInputs['awsSesRecipients']
+    
+    templateData = actionInputs['emailTemplateData']
+    sendOk = 0
+    sendFailed = 0
+    for batchStart in range(0, len(awsSesRecipients), awsSesBulkMaxDestinations):
+        awsSesDestinations = []
+        for recipient in awsSesRecipients[batchStart:batchStart+awsSesBulkMaxDestinations]:
+            awsSesDestinations.append({
+                'Destination': {
+                    'ToAddresses': [recipient],
+                },
+                'ReplacementTemplateData': json.dumps(dict(templateData, recipient=recipient), default=str),
+            })
+        # End Loop
+        try:
+            send_resp = awsSesCallWithRetry (context, inputs, actionConfig, awsSesClient, actionInputs['awsSesRegion'], 'send_bulk_templated_email', len(awsSesDestinations),
+                Source=actionInputs['awsSesSender'],
+                Template=awsSesTemplateName,
+                DefaultTemplateData=json.dumps(dict(templateData, recipient=""), default=str),
+                Destinations=awsSesDestinations,
+            )
+        except (ClientError, BotoCoreError) as e:
+            actionLog("ERROR", fn, "%s", awsGetErrorMessage(e))
+            sendFailed += len(awsSesDestinations)
+        else:
+            for destinationStatus in send_resp.get('Status', []):
+                if (destinationStatus.get('Status') == "Success"):
+                    sendOk += 1
+                else:
+                    actionLog("WARNING", fn, "Destination failed: %s %s", destinationStatus.get('Status'), destinationStatus.get('Error', ""))
+                    sendFailed += 1
+                # End Loop
+            # End Loop
+        # End Loop
+    # End Loop
+    
+    actionLog("INFO", fn, "Bulk send. Destinations ok: %s, failed: %s", sendOk, sendFailed)
+    if (sendFailed == 0 and sendOk > 0):
+        sendStatus = "ok"
+    elif (sendOk > 0):
+        sendStatus = "partial"
+    else:
+        sendStatus = "error"
+    # End Loop
+    
+    
+    # ----- Outputs ----- #
+    
+    actionLog("DEBUG", fn, "Function completed.")  
+    
+    return sendStatus    # Return status 
+    # End Function  
+
+
+
+def awsSesEnsureTemplate (context, inputs, actionConfig, awsSesClient, awsSesRegion, awsSesTemplateName, awsSesSubject, awsSesBodyHtml, awsSesBodyText):  # Creates the SES template of this content unless it exists. Returns its name: awsSesTemplateName and the content hash. Templates are never updated in place
+    fn = "awsSesEnsureTemplate -"    # Holds the funciton name. 
+    
+    awsSesTemplateContent = {
+        'SubjectPart': awsSesSubject,
+        'HtmlPart': awsSesBodyHtml,
+        'TextPart': awsSesBodyText,
+    }
+    templateHash = hashlib.sha256(json.dumps(awsSesTemplateContent, sort_keys=True).encode('utf-8')).hexdigest()
+    awsSesTemplateName = awsSesTemplateName[:awsSesTemplateNameMaxLength - 13]+"-"+templateHash[:12]
+    cacheKey = (awsSesRegion, awsSesTemplateName)
+    if (awsSesTemplateHashes.get(cacheKey) == templateHash):    # Loop. Created or found by an earlier run of this container
+        return awsSesTemplateName
+    # End Loop
+    
+    try:
+        awsSesCallWithRetry (context, inputs, actionConfig, awsSesClient, awsSesRegion, 'create_template', None, Template=dict(awsSesTemplateContent, TemplateName=awsSesTemplateName))   # Call function
+    except ClientError as e:
+        if (e.response['Error']['Code'] != 'AlreadyExists'):    # Created by another run or container. Same name, same content
+            raise
+        # End Loop
+    else:
+        actionLog("INFO", fn, "Created SES template %s.", awsSesTemplateName)
+    # End Loop
+    awsSesTemplateHashes[cacheKey] = templateHash
+    
+    return awsSesTemplateName    # Return template name 
+    # End Function  
+
+
+
+def awsSesCallWithRetry (context, inputs, actionConfig, awsSesClient, awsSesRegion, awsSesOperation, awsSesRecipientCount, **kwargs):  # Calls an SES operation. Sends are paced by the region token bucket, other calls pass None as awsSesRecipientCount. Retries throttling, server and connection failures with jittered exponential backoff
+    fn = "awsSesCallWithRetry -"    # Holds the funciton name. 
+    
+    awsSesMaxSendAttempts = actionConfig.awsSesMaxSendAttempts
+    for attempt in range(awsSesMaxSendAttempts):
+        if (awsSesRecipientCount is not None):    # Loop. Sends only
+            waited = awsSesAcquireSendTokens (context, inputs, actionConfig, awsSesClient, awsSesRegion, awsSesRecipientCount)   # Call function
+            if (waited > 0):
+                actionLog("DEBUG", fn, "Paced %s by %ss.", awsSesOperation, round(waited, 3))
+                actionTimingAdd ("sesPacing", waited * 1000)   # Call function
+            # End Loop
+        # End Loop
+        try:
+            with actionTimer("sesSend" if (awsSesRecipientCount is not None) else "sesCall"):
+                send_resp = getattr(awsSesClient, awsSesOperation)(**kwargs)
+            # End Loop
+        except (ClientError, BotoCoreError) as e:
+            retryReason = awsSesGetRetryReason (e)   # Call function
+            if ((retryReason is None) or (attempt == awsSesMaxSendAttempts - 1)):
+                raise
+            # End Loop
+            if ((retryReason == "throttled") and (awsSesRecipientCount is not None)):
+                awsSesAdjustSendRate (awsSesRegion, throttled=True)
+            # End Loop
+            backoff = random.uniform(0, min(awsSesBackoffMaxSeconds, awsSesBackoffBaseSeconds * (2 ** attempt)))    # Full jitter
+            actionLog("WARNING", fn, "%s %s. Retry %s in %ss. %s", awsSesOperation, retryReason, attempt+1, round(backoff, 3), awsGetErrorMessage(e))
+            time.sleep(backoff)
+            actionTimingAdd ("sesBackoff", backoff * 1000)   # Call function
+        else:
+            if (awsSesRecipientCount is not None):
+                awsSesAdjustSendRate (awsSesRegion, throttled=False)
+            # End Loop
+            return send_resp
+        # End Loop
+    # End Loop
+    # End Function  
+
+
+
+def awsSesGetRetryReason (error):  # Returns "throttled" or "transient" when a failed SES call is retried, else None. Transient: server errors and connection failures
+    if (isinstance(error, ClientError)):
+        errorCode = error.response.get('Error', {}).get('Code', "")
+        if (errorCode in awsSesThrottlingErrorCodes):
+            return "throttled"
+        elif ((errorCode in awsSesTransientErrorCodes) or (error.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0) >= 500)):
+            return "transient"
+        # End Loop
+    elif (any([errorClass.__name__ in awsConnectionErrorNames for errorClass in type(error).__mro__])):
+        return "transient"
+    # End Loop
+    
+    return None    # Return reason 
+    # End Function  
+
+
+
+def awsSesAcquireSendTokens (context, inputs, actionConfig, awsSesClient, awsSesRegion, tokenCount):  # Blocks until the region token bucket allows tokenCount recipients. Returns the seconds waited
+    fn = "awsSesAcquireSendTokens -"    # Holds the funciton name. 
+    
+    with awsSesRateBucketsLock:
+        rateBucket = awsSesRateBuckets.get(awsSesRegion)
+        quotaExpired = (rateBucket is None) or (rateBucket['quotaCheckedAt'] + awsSesQuotaTtlSeconds <= time.time())
+    # End Loop
+    
+    if (quotaExpired):    # Loop. Read the account MaxSendRate outside of the lock
+        try:
+            awsSesMaxSendRate = float(awsSesCallWithRetry (context, inputs, actionConfig, awsSesClient, awsSesRegion, 'get_send_quota', None)['MaxSendRate'])   # Call function
+        except (ClientError, BotoCoreError, KeyError, TypeError, ValueError) as e:
+            actionLog("WARNING", fn, "get_send_quota failed. Using %s/s. %s", awsSesDefaultMaxSendRate, e)
+            awsSesMaxSendRate = awsSesDefaultMaxSendRate
+        # End Loop
+        if (not (awsSesMaxSendRate > 0)):    # Loop. e.g. 0 for a paused account, or NaN. Pacing divides by the rate
+            actionLog("WARNING", fn, "get_send_quota returned MaxSendRate %s. Using %s/s.", awsSesMaxSendRate, awsSesDefaultMaxSendRate)
+            awsSesMaxSendRate = awsSesDefaultMaxSendRate
+        # End Loop
+        with awsSesRateBucketsLock:
+            rateBucket = awsSesRateBuckets.setdefault(awsSesRegion, {
+                "tokens": awsSesMaxSendRate,
+                "updatedAt": time.time(),
+                "rate": awsSesMaxSendRate,
+            })
+            rateBucket['maxRate'] = awsSesMaxSendRate
+            rateBucket['rate'] = min(rateBucket['rate'], awsSesMaxSendRate)
+            rateBucket['quotaCheckedAt'] = time.time()
+        # End Loop
+    # End Loop
+    
+    waited = 0.0
+    while True:
+        with awsSesRateBucketsLock:
+            now = time.time()
+            capacity = max(1.0, rateBucket['maxRate'])    # One second of burst
+            rateBucket['tokens'] = min(capacity, rateBucket['tokens'] + (now - rateBucket['updatedAt']) * rateBucket['rate'])
+            rateBucket['updatedAt'] = now
+            if (rateBucket['tokens'] >= min(tokenCount, capacity)):
+                rateBucket['tokens'] -= tokenCount    # Large batches go into debt and slow down the next sends
+                return waited
+            # End Loop
+            wait = (min(tokenCount, capacity) - rateBucket['tokens']) / rateBucket['rate']
+        # End Loop
+        time.sleep(wait)
+        waited += wait
+    # End Loop
+    # End Function  
+
+
+
+def awsSesAdjustSendRate (awsSesRegion, throttled):  # Adaptive pacing. Halves the bucket rate on throttling and recovers by 10% of the quota per successful send
+    with awsSesRateBucketsLock:
+        rateBucket = awsSesRateBuckets.get(awsSesRegion)
+        if (rateBucket is None):
+            return
+        # End Loop
+        if (throttled):
+            rateBucket['rate'] = max(rateBucket['maxRate'] * 0.1, rateBucket['rate'] * 0.5)
+        else:
+            rateBucket['rate'] = min(rateBucket['maxRate'], rateBucket['rate'] + rateBucket['maxRate'] * 0.1)
+        # End Loop
+    # End Loop
+    # End Function  
+
+
+
+def outboxGetBackend (actionConfig):  # Returns the outbox backend functions selected by outboxBackendIn
+    outboxBackends = {
+        "sqlite": {
+            "enqueue": outboxSqliteEnqueue,
+            "fetch": outboxSqliteFetch,
+            "ack": outboxSqliteAck,
+            "nack": outboxSqliteNack,
+        },
+        "sqs": {
+            "enqueue": outboxSqsEnqueue,
+            "fetch": outboxSqsFetch,
+            "ack": outboxSqsAck,
+            "nack": outboxSqsNack,
+        },
+    }
+    
+    return outboxBackends[actionConfig.outboxBackend]
+    # End Function  
+
+
+
+def outboxEnqueue (context, inputs, actionConfig, awsSesRegion, awsSesRecipientCount, awsSesMessage):  # Stores a fully rendered email in the outbox. Returns "queued"
+    fn = "outboxEnqueue -"    # Holds the funciton name. 
+    
+    outboxMessage = {
+        "awsSesRegion": awsSesRegion,
+        "awsSesRecipientCount": awsSesRecipientCount,
+        "awsSesMessage": awsSesMessage,
+    }
+    outboxMessageId = outboxGetBackend(actionConfig)['enqueue'](context, inputs, actionConfig, outboxMessage)
+    actionLog("INFO", fn, "Email queued. Id: %s", outboxMessageId)
+    
+    return "queued"    # Return status 
+    # End Function  
+
+
+
+def outboxDrain (context, inputs, actionConfig, maxMessages=None, deadline=None):  # Sends the due queued emails in batches until the outbox is empty or the deadline. Failed sends are retried by a later drain and dead-lettered after outboxMaxAttemptsIn attempts
+    fn = "outboxDrain -"    # Holds the funciton name. 
+    
+    outboxBackend = outboxGetBackend(actionConfig)
+    drainStatus = {"sent": 0, "retry": 0, "dead": 0}
+    while ((maxMessages is None) or (drainStatus['sent'] + drainStatus['retry'] + drainStatus['dead'] < maxMessages)):
+        if ((deadline is not None) and (time.time() >= deadline)):
+            actionLog("WARNING", fn, "Run deadline reached. The queued emails left are sent by a later run.")
+            break
+        # End Loop
+        outboxBatch = outboxBackend['fetch'](context, inputs, actionConfig, outboxBatchSize)
+        if (not outboxBatch):
+            break
+        # End Loop
+        for outboxRecord in outboxBatch:
+            if ((deadline is not None) and (time.time() >= deadline)):    # Loop. The rest of the batch is retaken after outboxLeaseSeconds
+                break
+            # End Loop
+            outboxMessage = outboxRecord['message']
+            try:
+                awsSesClient = awsGetClient (context, inputs, actionConfig, 'ses', outboxMessage['awsSesRegion'])   # Call function
+                awsSesCallWithRetry (context, inputs, actionConfig, awsSesClient, outboxMessage['awsSesRegion'], 'send_email', outboxMessage['awsSesRecipientCount'], **outboxMessage['awsSesMessage'])
+            except Exception as e:    # Loop. ClientError, BotoCoreError (e.g. EndpointConnectionError) or a bad message. Retried by a later drain, then dead-lettered. The other messages are still sent
+                sendError = awsGetErrorMessage (e)   # Call function
+                actionLog("WARNING", fn, "Send failed. Id: %s. %s", outboxRecord['id'], sendError)
+                try:
+                    drainStatus[outboxBackend['nack'](context, inputs, actionConfig, outboxRecord, sendError)] += 1
+                except Exception as e:    # Loop. e.g. the queue is not reachable either. The message is retaken after outboxLeaseSeconds and the lost attempt is counted then
+                    actionLog("ERROR", fn, "Retry scheduling failed. Id: %s. %s", outboxRecord['id'], awsGetErrorMessage(e))
+                    drainStatus['retry'] += 1
+                # End Loop
+            else:
+                outboxBackend['ack'](context, inputs, actionConfig, outboxRecord)
+                drainStatus['sent'] += 1
+            # End Loop
+        # End Loop
+    # End Loop
+    actionLog("INFO", fn, "Outbox drained.", **drainStatus)
+    
+    return drainStatus    # Return status 
+    # End Function  
+
+
+
+def outboxSqliteConnect (actionConfig):  # Opens the local spool. Creates the outbox table on first use
+    outboxSpoolPath = actionConfig.outboxSpoolPath
+    connection = actionImport("sqlite3").connect(outboxSpoolPath, timeout=30, isolation_level=None)
+    if (outboxSpoolPath not in outboxSqliteInitialized):
+        connection.execute("CREATE TABLE IF NOT EXISTS outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, message TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, nextAttemptAt REAL NOT NULL, lastError TEXT, createdAt REAL NOT NULL)")
+        connection.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, nextAttemptAt)")
+        outboxSqliteInitialized.add(outboxSpoolPath)
+    # End Loop
+    
+    return connection    # Return connection 
+    # End Function  
+
+
+
+def outboxSqliteEnqueue (context, inputs, actionConfig, outboxMessage):  # SQLite backend. Adds a message to the spool
+    with outboxSqliteLock:
+        connection = outboxSqliteConnect(actionConfig)
+        try:
+            cursor = connection.execute("INSERT INTO outbox (message, nextAttemptAt, createdAt) VALUES (?, ?, ?)", (json.dumps(outboxMessage), time.time(), time.time()))
+            return cursor.lastrowid
+        finally:
+            connection.close()
+        # End Loop
+    # End Loop
+    # End Function  
+
+
+
+def outboxSqliteFetch (context, inputs, actionConfig, batchSize):  # SQLite backend. Takes due messages and leases them for outboxLeaseSeconds. An expired lease counts as a failed attempt: the run that took the message did not ack nor nack it
+    fn = "outboxSqliteFetch -"    # Holds the funciton name. 
+    
+    with outboxSqliteLock:
+        connection = outboxSqliteConnect(actionConfig)
+        try:
+            connection.execute("BEGIN IMMEDIATE")    # Also excludes other processes sharing the spool
+            now = time.time()
+            rows = connection.execute("SELECT id, message, attempts + (status = 'inflight') FROM outbox WHERE status IN ('pending', 'inflight') AND nextAttemptAt <= ? ORDER BY id LIMIT ?", (now, batchSize)).fetchall()
+            deadRows = [row for row in rows if (row[2] >= actionConfig.outboxMaxAttempts)]
+            rows = [row for row in rows if (row[2] < actionConfig.outboxMaxAttempts)]
+            connection.executemany("UPDATE outbox SET status = 'dead', attempts = ?, lastError = 'Lease expired' WHERE id = ?", [(row[2], row[0]) for row in deadRows])
+            connection.executemany("UPDATE outbox SET status = 'inflight', attempts = ?, nextAttemptAt = ? WHERE id = ?", [(row[2], now + outboxLeaseSeconds, row[0]) for row in rows])
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+        # End Loop
+    # End Loop
+    for row in deadRows:    # Loop. The runs that took it ended without a result outboxMaxAttemptsIn times
+        actionLog("ERROR", fn, "Message dead-lettered after %s expired leases or failed sends. Id: %s", row[2], row[0])
+    # End Loop
+    
+    return [{"id": row[0], "message": json.loads(row[1]), "attempts": row[2]} for row in rows]
+    # End Function  
+
+
+
+def outboxSqliteAck (context, inputs, actionConfig, outboxRecord):  # SQLite backend. Removes a sent message
+    with outboxSqliteLock:
+        connection = outboxSqliteConnect(actionConfig)
+        try:
+            connection.execute("DELETE FROM outbox WHERE id = ?", (outboxRecord['id'],))
+        finally:
+            connection.close()
+        # End Loop
+    # End Loop
+    # End Function  
+
+
+
+def outboxSqliteNack (context, inputs, actionConfig, outboxRecord, error):  # SQLite backend. Schedules a retry with exponential backoff or dead-letters the message. Returns "retry" or "dead"
+    attempts = outboxRecord['attempts'] + 1
+    if (attempts >= actionConfig.outboxMaxAttempts):
+        outboxStatus = "dead"
+        nextAttemptAt = time.time()
+    else:
+        outboxStatus = "retry"
+        nextAttemptAt = time.time() + min(awsSesBackoffMaxSeconds * 15, awsSesBackoffBaseSeconds * (2 ** attempts) * 10)
+    # End Loop
+    with outboxSqliteLock:
+        connection = outboxSqliteConnect(actionConfig)
+        try:
+            connection.execute("UPDATE outbox SET status = ?, attempts = ?, nextAttemptAt = ?, lastError = ? WHERE id = ?", ("dead" if outboxStatus == "dead" else "pending", attempts, nextAttemptAt, str(error), outboxRecord['id']))
+        finally:
+            connection.close()
+        # End Loop
+    # End Loop
+    
+    return outboxStatus    # Return status 
+    # End Function  
+
+
+
+def outboxSqsGetClient (context, inputs, actionConfig):  # SQS backend. Returns the SQS client for the queue region
+    return awsGetClient (context, inputs, actionConfig, 'sqs', actionConfig.outboxSqsRegion or actionConfig.awsSesRegion)
+    # End Function  
+
+
+
+def outboxSqsEnqueue (context, inputs, actionConfig, outboxMessage):  # SQS backend. Sends a message to outboxSqsQueueUrlIn
+    send_resp = outboxSqsGetClient(context, inputs, actionConfig).send_message(QueueUrl=actionConfig.outboxSqsQueueUrl, MessageBody=json.dumps(outboxMessage))
+    
+    return send_resp.get('MessageId', "")
+    # End Function  
+
+
+
+def outboxSqsFetch (context, inputs, actionConfig, batchSize):  # SQS backend. Receives up to 10 messages, hidden from other consumers for outboxLeaseSeconds
+    receive_resp = outboxSqsGetClient(context, inputs, actionConfig).receive_message(
+        QueueUrl=actionConfig.outboxSqsQueueUrl,
+        MaxNumberOfMessages=min(10, batchSize),
+        VisibilityTimeout=outboxLeaseSeconds,
+        WaitTimeSeconds=0,    # Short poll. Every run drains, so an empty queue must not hold the run
+        AttributeNames=['ApproximateReceiveCount'],
+    )
+    
+    return [{"id": sqsMessage['MessageId'], "receiptHandle": sqsMessage['ReceiptHandle'], "body": sqsMessage['Body'], "message": json.loads(sqsMessage['Body']), "attempts": int(sqsMessage.get('Attributes', {}).get('ApproximateReceiveCount', 1)) - 1} for sqsMessage in receive_resp.get('Messages', [])]
+    # End Function  
+
+
+
+def outboxSqsAck (context, inputs, actionConfig, outboxRecord):  # SQS backend. Deletes a sent message
+    outboxSqsGetClient(context, inputs, actionConfig).delete_message(QueueUrl=actionConfig.outboxSqsQueueUrl, ReceiptHandle=outboxRecord['receiptHandle'])
+    # End Function  
+
+
+
+def outboxSqsNack (context, inputs, actionConfig, outboxRecord, error):  # SQS backend. Makes the message visible again after a backoff, or moves it to outboxSqsDeadLetterQueueUrlIn. Returns "retry" or "dead"
+    fn = "outboxSqsNack -"    # Holds the funciton name. 
+    
+    sqsClient = outboxSqsGetClient(context, inputs, actionConfig)
+    attempts = outboxRecord['attempts'] + 1
+    outboxSqsDeadLetterQueueUrl = actionConfig.outboxSqsDeadLetterQueueUrl
+    if (attempts < actionConfig.outboxMaxAttempts):
+        sqsClient.change_message_visibility(QueueUrl=actionConfig.outboxSqsQueueUrl, ReceiptHandle=outboxRecord['receiptHandle'], VisibilityTimeout=int(min(awsSesBackoffMaxSeconds * 15, awsSesBackoffBaseSeconds * (2 ** attempts) * 10)))
+        return "retry"
+    elif (outboxSqsDeadLetterQueueUrl.startswith("https://")):
+        sqsClient.send_message(QueueUrl=outboxSqsDeadLetterQueueUrl, MessageBody=outboxRecord['body'], MessageAttributes={'lastError': {'DataType': 'String', 'StringValue': str(error)[:256] or "error"}})
+        sqsClient.delete_message(QueueUrl=actionConfig.outboxSqsQueueUrl, ReceiptHandle=outboxRecord['receiptHandle'])
+        return "dead"
+    else:
+        actionLog("WARNING", fn, "No outboxSqsDeadLetterQueueUrlIn. Leaving the message to the queue redrive policy.")
+        return "dead"
+    # End Loop
+    # End Function  
+
+
+
+def digestAdd (context, inputs, actionConfig, actionInputs):  # Stores the rendered notification in the digest of each recipient. Returns "digested"
+    fn = "digestAdd -"    # Holds the funciton name. 
+    
+    emailTemplateData = actionInputs['emailTemplateData']
+    digestNotification = {
+        "subject": actionInputs['awsSesSubject'],
+        "headline": emailTemplateData['headline'],
+        "deploymentUrl": emailTemplateData['deploymentUrl'],
+        "deploymentId": emailTemplateData['deploymentId'],
+        "deploymentName": emailTemplateData['deploymentName'],
+        "projectName": emailTemplateData['projectName'],
+        "eventTopicId": actionInputs['eventTopicId'],
+    }
+    digestSqliteAdd (context, inputs, actionConfig, actionInputs['awsSesRecipients'], digestNotification)   # Call function
+    actionLog("INFO", fn, "Notification added to the digest of %s recipient(s).", len(actionInputs['awsSesRecipients']))
+    
+    return "digested"    # Return status 
+    # End Function  
+
+
+
+def digestFlush (context, inputs, actionConfig, force=False, deadline=None):  # Sends the due digests until the deadline. Due: digestMaxItemsIn notifications, or the oldest one is digestWindowIn seconds old. force sends all. Returns the counts
+    fn = "digestFlush -"    # Holds the funciton name. 
+    
+    flushStatus = {"sent": 0, "queued": 0, "retry": 0, "dropped": 0}
+    if ((deadline is not None) and (time.time() >= deadline)):
+        actionLog("WARNING", fn, "Run deadline reached. The due digests are sent by a later run.")
+        return flushStatus
+    # End Loop
+    digests = digestSqliteTake (context, inputs, actionConfig, actionConfig.digestWindow, 1 if force else actionConfig.digestMaxItems, force)   # Call function
+    for recipient, digestRecords in digests.items():    # Loop. One summary email per recipient
+        if ((deadline is not None) and (time.time() >= deadline)):    # Loop. The other digests are retaken after digestLeaseSeconds
+            actionLog("WARNING", fn, "Run deadline reached. The due digests left are sent by a later run.")
+            break
+        # End Loop
+        try:
+            awsSesMessage = digestBuildMessage (context, inputs, actionConfig, recipient, [digestRecord['notification'] for digestRecord in digestRecords])   # Call function
+            if (actionConfig.actionOptionOutbox):    # Loop. Sent by the outbox drain at the end of the run 
+                outboxEnqueue (context, inputs, actionConfig, actionConfig.awsSesRegion, 1, awsSesMessage)   # Call function
+                flushStatus['queued'] += 1
+            else:
+                awsSesClient = awsGetClient (context, inputs, actionConfig, 'ses', actionConfig.awsSesRegion)   # Call function
+                awsSesCallWithRetry (context, inputs, actionConfig, awsSesClient, actionConfig.awsSesRegion, 'send_email', 1, **awsSesMessage)
+                flushStatus['sent'] += 1
+            # End Loop
+        except Exception as e:    # Loop. ClientError, BotoCoreError (e.g. EndpointConnectionError) or a failed render. Retried by a later flush, then dropped. The other digests are still sent
+            actionLog("WARNING", fn, "Digest send failed. Recipient: %s. %s", recipient, awsGetErrorMessage(e))
+            flushStatus[digestSqliteNack (context, inputs, actionConfig, digestRecords)] += 1   # Call function
+        else:
+            digestSqliteAck (context, inputs, actionConfig, digestRecords)   # Call function
+        # End Loop
+    # End Loop
+    if (digests):
+        actionLog("INFO", fn, "Digests flushed.", **flushStatus)
+    # End Loop
+    
+    return flushStatus    # Return status 
+    # End Function  
+
+
+
+def digestBuildMessage (context, inputs, actionConfig, recipient, digestNotifications):  # Renders the summary email of a recipient's notifications. Returns the send_email arguments
+    awsSesCharset = "UTF-8"     # The character encoding for the email.
+    emailDigestHtml = emailOptimizeHtml(emailDigestTemplateHtml) if actionConfig.actionOptionOptimizeHtml else emailDigestTemplateHtml
+    templateData = {
+        "recipient": recipient,
+        "count": len(digestNotifications),
+        "notifications": digestNotifications,
+    }
+    
+    awsSesMessage = {
+        'Destination': {
+            'ToAddresses': [recipient],
+        },
+        'Message': {
+            'Body': {
+                'Html': {
+                    'Charset': awsSesCharset,
+                    'Data': emailTemplateRender(emailTemplateCompile(emailDigestHtml), templateData, True),
+                },
+                'Text': {
+                    'Charset': awsSesCharset,
+                    'Data': emailTemplateRender(emailTemplateCompile(emailDigestTemplateText), templateData, False),
+                },
+            },
+            'Subject': {
+                'Charset': awsSesCharset,
+                'Data': emailTemplateRender(emailTemplateCompile(emailDigestTemplateSubject), templateData, False),
+            },
+        },
+        'Source': actionConfig.awsSesSender,
+    }
+    
+    return awsSesMessage    # Return message 
+    # End Function  
+
+
+
+def digestSqliteConnect (actionConfig):  # Opens the local digest store. Creates the digest table on first use
+    digestStorePath = actionConfig.digestStorePath
+    connection = actionImport("sqlite3").connect(digestStorePath, timeout=30, isolation_level=None)
+    if (digestStorePath not in digestSqliteInitialized):
+        connection.execute("CREATE TABLE IF NOT EXISTS digest (id INTEGER PRIMARY KEY AUTOINCREMENT, recipient TEXT NOT NULL, notification TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, leaseUntil REAL NOT NULL DEFAULT 0, createdAt REAL NOT NULL)")
+        connection.execute("CREATE INDEX IF NOT EXISTS digest_recipient ON digest (recipient, leaseUntil)")
+        digestSqliteInitialized.add(digestStorePath)
+    # End Loop
+    
+    return connection    # Return connection 
+    # End Function  
+
+
+
+def digestSqliteAdd (context, inputs, actionConfig, recipients, digestNotification):  # Adds a notification once per recipient. Recipients are matched lowercase
+    with digestSqliteLock:
+        connection = digestSqliteConnect(actionConfig)
+        try:
+            now = time.time()
+            connection.executemany("INSERT INTO digest (recipient, notification, createdAt) VALUES (?, ?, ?)", [(str(recipient).lower(), json.dumps(digestNotification, default=str), now) for recipient in recipients])
+        finally:
+            connection.close()
+        # End Loop
+    # End Loop
+    # End Function  
+
+
+
+def digestSqliteTake (context, inputs, actionConfig, windowSeconds, maxItems, force=False):  # Takes the notifications of the due digests and leases them for digestLeaseSeconds. Returns recipient -> records, oldest first
+    with digestSqliteLock:
+        connection = digestSqliteConnect(actionConfig)
+        try:
+            connection.execute("BEGIN IMMEDIATE")    # Also excludes other processes sharing the store
+            now = time.time()
+            rows = connection.execute("SELECT id, recipient, notification, attempts FROM digest WHERE leaseUntil <= ? AND recipient IN (SELECT recipient FROM digest WHERE leaseUntil <= ? GROUP BY recipient HAVING COUNT(*) >= ? OR MIN(createdAt) <= ?) ORDER BY id", (now, now, maxItems, now if force else now - windowSeconds)).fetchall()
+            connection.executemany("UPDATE digest SET leaseUntil = ? WHERE id = ?", [(now + digestLeaseSeconds, row[0]) for row in rows])
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+        # End Loop
+    # End Loop
+    
+    digests = collections.OrderedDict()
+    for row in rows:
+        digests.setdefault(row[1], []).append({"id": row[0], "notification": json.loads(row[2]), "attempts": row[3]})
+    # End Loop
+    
+    return digests    # Return digests 
+    # End Function  
+
+
+
+def digestSqliteAck (context, inputs, actionConfig, digestRecords):  # Removes the notifications of a sent digest
+    with digestSqliteLock:
+        connection = digestSqliteConnect(actionConfig)
+        try:
+            connection.executemany("DELETE FROM digest WHERE id = ?", [(digestRecord['id'],) for digestRecord in digestRecords])
+        finally:
+            connection.close()
+        # End Loop
+    # End Loop
+    # End Function  
+
+
+
+def digestSqliteNack (context, inputs, actionConfig, digestRecords):  # Schedules a retry of a digest with exponential backoff, or drops its notifications after digestMaxAttempts. Returns "retry" or "dropped"
+    fn = "digestSqliteNack -"    # Holds the funciton name. 
+    
+    attempts = max([digestRecord['attempts'] for digestRecord in digestRecords]) + 1
+    with digestSqliteLock:
+        connection = digestSqliteConnect(actionConfig)
+        try:
+            if (attempts >= digestMaxAttempts):
+                connection.executemany("DELETE FROM digest WHERE id = ?", [(digestRecord['id'],) for digestRecord in digestRecords])
+                digestStatus = "dropped"
+            else:
+                leaseUntil = time.time() + min(awsSesBackoffMaxSeconds * 15, awsSesBackoffBaseSeconds * (2 ** attempts) * 10)
+                connection.executemany("UPDATE digest SET attempts = ?, leaseUntil = ? WHERE id = ?", [(attempts, leaseUntil, digestRecord['id']) for digestRecord in digestRecords])
+                digestStatus = "retry"
+            # End Loop
+        finally:
+            connection.close()
+        # End Loop
+    # End Loop
+    if (digestStatus == "dropped"):
+        actionLog("ERROR", fn, "Digest dropped after %s attempts.", attempts, deploymentIds=[digestRecord['notification'].get('deploymentId', "") for digestRecord in digestRecords])
+    # End Loop
+    
+    return digestStatus    # Return status 
+    # End Function  
+
+
+
+def emailGetTemplates (context, inputs, actionConfig, actionInputs):  # Returns the subject, headline, text and HTML template sources of the event topic. Project overrides from emailTemplateOverridesIn win over the topic templates
+    fn = "emailGetTemplates -"    # Holds the funciton name. 
+    
+    eventTopic = actionInputs.get('eventTopic') or eventTopicDefault
+    emailTemplates = {
+        "subject": eventTopic['subject'],
+        "headline": eventTopic['headline'],
+        "text": eventTopic['text'],
+        "html": eventTopic['html'],
+    }
+    
+    emailTemplateOverridesIn = actionConfig.emailTemplateOverrides
+    if (emailTemplateOverridesIn not in emailTemplateOverridesCache):
+        if (emailTemplateOverridesIn == ""):    # Loop. Nothing to parse. yaml is not imported
+            emailTemplateOverrides = None
+        else:
+            yaml = actionImport("yaml")
+            try:
+                emailTemplateOverrides = yaml.safe_load(emailTemplateOverridesIn)
+            except yaml.YAMLError as e:
+                actionLog("WARNING", fn, "Invalid emailTemplateOverridesIn. Using default templates. %s", str(e).splitlines()[0])
+                emailTemplateOverrides = None
+            # End Loop
+        # End Loop
+        emailTemplateOverridesCache.clear()    # Only the current action inputs are kept
+        emailTemplateOverridesCache[emailTemplateOverridesIn] = emailTemplateOverrides if isinstance(emailTemplateOverrides, dict) else {}
+    # End Loop
+    emailTemplateOverrides = emailTemplateOverridesCache[emailTemplateOverridesIn]
+    
+    for projectKey in (actionInputs.get('projectId', ""), actionInputs.get('projectName', "")):    # Loop. Project id first, then name
+        projectTemplates = emailTemplateOverrides.get(projectKey) if projectKey else None
+        if (isinstance(projectTemplates, dict)):
+            actionLog("DEBUG", fn, "Using template override for project %s", projectKey)
+            projectTopicTemplates = projectTemplates.get(eventTopic['name'])    # Per topic overrides of the project, e.g. {"my-project": {"deploymentFailed": {"subject": "..."}}}
+            for templateOverrides in (projectTemplates, projectTopicTemplates if isinstance(projectTopicTemplates, dict) else {}):
+                for templateKey in emailTemplates:
+                    if (templateOverrides.get(templateKey)):
+                        emailTemplates[templateKey] = str(templateOverrides[templateKey])
+                    # End Loop
+                # End Loop
+            # End Loop
+            break
+        # End Loop
+    # End Loop
+    
+    return emailTemplates    # Return templates 
+    # End Function  
+
+
+
+def emailBuildTemplateData (context, inputs, actionInputs, payloadIndex):  # Returns the variables available to the email templates
+    payloadPaths = payloadIndex['paths']
+    
+    resources = []
+    for resource in (inputs.get('resources') or []):    # Loop. Resource list, as objects or names
+        if (isinstance(resource, dict)):
+            resources.append({"name": resource.get('name', ""), "type": resource.get('type', "")})
+        else:
+            resources.append({"name": str(resource), "type": ""})
+        # End Loop
+    # End Loop
+    if (not resources):
+        resources = [{"name": str(resourceName), "type": ""} for resourceName in (inputs.get('resourceNames') or [])]
+    # End Loop
+    
+    emailTemplateData = {
+        "deploymentUrl": actionInputs['deploymentUrl'],
+        "deploymentId": actionInputs['deploymentId'],
+        "deploymentName": payloadPaths.get('deploymentName', ""),
+        "userName": payloadPaths.get('__metadata.userName', actionInputs['awsSesToRecipient']),
+        "projectId": actionInputs.get('projectId', ""),
+        "projectName": actionInputs.get('projectName', ""),
+        "blueprintId": actionInputs['blueprintId'],
+        "blueprintName": payloadPaths.get('blueprintName', ""),
+        "resources": resources,
+    }
+    emailTemplateData.update(eventTopicExtract(actionInputs.get('eventTopic') or eventTopicDefault, payloadIndex))    # Topic fields, e.g. actionName, status, failureMessage
+    
+    return emailTemplateData    # Return data 
+    # End Function  
+
+
+
+def emailTemplateCompile (templateSource):  # Compiles a template into a node tree. Compiled templates are cached by content hash
+    templateHash = hashlib.sha256(templateSource.encode('utf-8')).hexdigest()
+    compiledTemplate = emailTemplateCache.get(templateHash)
+    if (compiledTemplate is not None):
+        return compiledTemplate
+    # End Loop
+    
+    compiledTemplate = []    # Nodes: ("text", value), ("var", name, raw), ("each", name, nodes)
+    nodeStack = [compiledTemplate]
+    position = 0
+    for tag in emailTemplateTagPattern.finditer(templateSource):
+        if (tag.start() > position):
+            nodeStack[-1].append(("text", templateSource[position:tag.start()]))
+        # End Loop
+        position = tag.end()
+        if (tag.group(1) is not None):
+            nodeStack[-1].append(("var", tag.group(1), True))
+        elif (tag.group(2).startswith('#each')):
+            eachNodes = []
+            nodeStack[-1].append(("each", tag.group(2).split()[1], eachNodes))
+            nodeStack.append(eachNodes)
+        elif (tag.group(2) == '/each'):
+            if (len(nodeStack) > 1):
+                nodeStack.pop()
+            # End Loop
+        else:
+            nodeStack[-1].append(("var", tag.group(2), False))
+        # End Loop
+    # End Loop
+    if (position < len(templateSource)):
+        compiledTemplate.append(("text", templateSource[position:]))
+    # End Loop
+    
+    if (len(emailTemplateCache) >= emailTemplateCacheMaxSize):
+        emailTemplateCache.clear()
+    # End Loop
+    emailTemplateCache[templateHash] = compiledTemplate
+    
+    return compiledTemplate    # Return compiled template 
+    # End Function  
+
+
+
+def emailTemplateRender (compiledTemplate, templateData, escapeHtml, outerScopes=()):  # Renders a compiled template. Variables are HTML escaped when escapeHtml is set, except {{{raw}}}
+    scopes = (templateData,) + tuple(outerScopes)
+    rendered = []
+    for node in compiledTemplate:
+        if (node[0] == "text"):
+            rendered.append(node[1])
+        elif (node[0] == "var"):
+            value = emailTemplateLookup(scopes, node[1])
+            value = "" if (value is None) else str(value)
+            rendered.append(value if (node[2] or not escapeHtml) else html.escape(value, quote=True))
+        else:
+            for item in (emailTemplateLookup(scopes, node[1]) or []):
+                rendered.append(emailTemplateRender(node[2], item if isinstance(item, dict) else {"this": item}, escapeHtml, scopes))
+            # End Loop
+        # End Loop
+    # End Loop
+    
+    return "".join(rendered)
+    # End Function  
+
+
+
+def emailTemplateLookup (scopes, name):  # Resolves a dotted template variable, innermost scope first
+    for scope in scopes:
+        value = scope
+        for part in name.split('.'):
+            if (isinstance(value, dict) and (part in value)):
+                value = value[part]
+            else:
+                value = None
+                break
+            # End Loop
+        # End Loop
+        if (value is not None):
+            return value
+        # End Loop
+    # End Loop
+    return None
+    # End Function  
+
+
+
+def awsSessionManagerGetSecret (context, inputs, actionConfig, awsSecretId_csp, awsRegionName):  # Retrieves AWS Secrets Manager Secrets. Reuses cached secrets in warm containers.
+    # Ref: https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/secretsmanager.html
+    # Ref: https://github.com/aws/aws-secretsmanager-caching-python
+    fn = "awsSessionManagerGetSecret -"    # Holds the funciton name. 
+    actionLog("DEBUG", fn, "Function started.")
+    
+    
+    # ----- Script ----- #
+    
+    awsSmVersionStage = actionConfig.awsSmVersionStage    # Secret version stage to retrieve 
+    awsSmSecretCacheTtl = actionConfig.awsSmSecretCacheTtl    # 0 disables the cache
+    
+    cacheKey = (awsSecretId_csp, awsRegionName, awsSmVersionStage)
+    with awsSmSecretCacheLock:
+        cacheEntry = awsSmSecretCache.get(cacheKey)
+        if ((cacheEntry is not None) and (cacheEntry['expiresAt'] > time.time())):
+            awsSmSecretCacheStats['hits'] += 1
+            cacheStatus = "hit"
+        else:
+            awsSmSecretCacheStats['misses'] += 1
+            cacheEntry = None
+            cacheStatus = "miss"
+        # End Loop
+    # End Loop
+    
+    if (cacheEntry is None):
+        # Get a Secrets Manager client
+        actionLog("DEBUG", fn, "AWS Secrets Manager - Getting client...")
+        with actionTimer("secretsClient"):
+            sm_client = awsGetClient (context, inputs, actionConfig, 'secretsmanager', awsRegionName)   # Call function
+        # End Loop
+
+        # Get Secrets
+        actionLog("DEBUG", fn, "AWS Secrets Manager - Getting secret(s)...")
+        with actionTimer("secretsLookup"):
+            resp_awsSecret_csp = sm_client.get_secret_value(
+                    SecretId=awsSecretId_csp,
+                    VersionStage=awsSmVersionStage
+                )
+        # End Loop
+
+        awsSecret_csp = json.dumps(resp_awsSecret_csp['SecretString']).replace(awsSecretId_csp,'').replace("\\",'').replace('"{"','').replace('"}"','').replace('":"','')   # Cleanup the response to get just the secret
+        cacheEntry = {
+            "secret": str(awsSecret_csp),
+            "versionId": resp_awsSecret_csp.get('VersionId', ""),
+            "expiresAt": time.time() + awsSmSecretCacheTtl,
+        }
+        if (awsSmSecretCacheTtl > 0):
+            with awsSmSecretCacheLock:
+                awsSmSecretCache[cacheKey] = cacheEntry
+            # End Loop
+        # End Loop
+    # End Loop
+    
+    actionLog("DEBUG", fn, "AWS Secrets Manager - Secret cache %s.", cacheStatus, stats=awsSmSecretCacheStats)
+    
+    
+    # ----- Outputs ----- #
+    
+    response = {   # Set action outputs
+        "awsSecret_csp" : cacheEntry['secret'],
+        "cacheStatus" : cacheStatus,
+        }
+    actionLog("DEBUG", fn, "Function completed.")  
+    
+    return response    # Return response 
+    # End Function  
+
+
+
+def awsSessionManagerInvalidateSecret (context, inputs, awsSecretId_csp, awsRegionName):  # Drops all cached version stages of a secret, e.g. after an auth failure
+    fn = "awsSessionManagerInvalidateSecret -"    # Holds the funciton name. 
+    
+    with awsSmSecretCacheLock:
+        for cacheKey in [key for key in awsSmSecretCache if (key[0] == awsSecretId_csp and key[1] == awsRegionName)]:
+            del awsSmSecretCache[cacheKey]
+            awsSmSecretCacheStats['invalidations'] += 1
+        # End Loop
+    # End Loop
+    actionLog("INFO", fn, "AWS Secrets Manager - Secret cache invalidated.")
+    # End Function  
+
+
+
+def cspGetRequestsHeaders (context, inputs, actionConfig, actionInputs):  # Gets the CSP refresh token (AWS SM or action inputs) and bearer token. Runs once per invocation and only when a CSP call is needed
+    fn = "cspGetRequestsHeaders -"    # Holds the funciton name. 
+    actionLog("DEBUG", fn, "Function started.")
+    
+    if ('cspRequestsHeaders' in actionInputs):
+        return actionInputs['cspRequestsHeaders']
+    # End Loop
+    
+    
+    # ----- Script ----- #
+    
+    # ----- AWS Secrets Manager  ----- #     
+    
+    # Get AWS Secrets Manager Secrets
+    if (actionInputs['actionOptionUseAwsSecretsManager']):
+        actionLog("DEBUG", fn, "Auth/Secrets source: AWS Secrets Manager")
+        awsRegionName = actionInputs['awsSmRegionName']
+        awsSecretId_csp = actionInputs['awsSmCspTokenSecretId']
+        awsSecrets = awsSessionManagerGetSecret (context, inputs, actionConfig, awsSecretId_csp, awsRegionName)  # Call function
+        cspRefreshToken = awsSecrets['awsSecret_csp']
+        actionInputs['cspRefreshToken'] = cspRefreshToken
+    else:
+        # use action inputs
+        actionLog("DEBUG", fn, "Auth/Secrets source: Action Inputs")
+
+    # ----- CSP Token  ----- #     
+    
+    # Get Token
+    actionLog("DEBUG", fn, "Getting CSP Bearer Token.")
+    cspToken = cspGetBearerToken (context, inputs, actionConfig, actionInputs['cspRefreshToken'])   # Call function
+    if ((cspToken['cacheStatus'] == "error") and (actionInputs['actionOptionUseAwsSecretsManager'])):   # Loop. Cached secret may be stale after a rotation 
+        actionLog("WARNING", fn, "CSP login failed. Invalidating cached secret and retrying.")
+        awsSessionManagerInvalidateSecret (context, inputs, awsSecretId_csp, awsRegionName)  # Call function
+        awsSecrets = awsSessionManagerGetSecret (context, inputs, actionConfig, awsSecretId_csp, awsRegionName)  # Call function
+        cspRefreshToken = awsSecrets['awsSecret_csp']
+        actionInputs['cspRefreshToken'] = cspRefreshToken
+        cspToken = cspGetBearerToken (context, inputs, actionConfig, actionInputs['cspRefreshToken'])   # Call function
+    # End Loop
+    bearerToken = cspToken['cspBearerToken']   # Set response
+    requestsHeaders= {
+        'Accept':'application/json',
+        'Content-Type':'application/json',
+        'Authorization': 'Bearer {}'.format(bearerToken),
+        # 'encoding': 'utf-8'
+    }
+    
+    actionInputs['cspBearerToken'] = bearerToken
+    actionInputs['cspRequestsHeaders'] = requestsHeaders
+    
+    actionLog("DEBUG", fn, "Function completed.")  
+    
+    return requestsHeaders    # Return headers 
+    # End Function  
+
+
+
+def cspPrefetchBlueprintOptions (context, inputs, actionConfig, actionInputs):  # Authenticates to CSP when needed and returns the blueprint options index. One chain, as each step needs the previous one
+    cspGetRequestsHeaders (context, inputs, actionConfig, actionInputs)   # Call function
+    blueprintOptions = cspGetBlueprintOptions (context, inputs, actionConfig, actionInputs, actionInputs['blueprintId'])   # Call function
+    
+    return payloadBuildIndex (blueprintOptions['blueprintOptions'])    # Rules are evaluated against the blueprint options index
+    # End Function  
+
+
+
+def cspGetBearerToken (context, inputs, actionConfig, cspRefreshToken):  # Exchanges the CSP refresh token for a bearer token. Reuses cached tokens in warm containers.
+    fn = "cspGetBearerToken -"    # Holds the funciton name. 
+    actionLog("DEBUG", fn, "Function started.")
+    
+    
+    # ----- Script ----- #
+    
+    cacheKey = hashlib.sha256(str(cspRefreshToken).encode('utf-8')).hexdigest()   # Never keep the refresh token itself as key
+    cacheStatus = "hit"
+    
+    cacheEntry = cspTokenCache.get(cacheKey)
+    if ((cacheEntry is None) or (cacheEntry['expiresAt'] - cspTokenRefreshSkewSeconds <= time.time())):
+        with cspTokenCacheLock:
+            keyLock = cspTokenCacheLocks.setdefault(cacheKey, threading.Lock())
+        # End Loop
+        with keyLock:   # Single flight. Only one invocation logs in, the others wait and reuse its token
+            cacheEntry = cspTokenCache.get(cacheKey)
+            if ((cacheEntry is None) or (cacheEntry['expiresAt'] - cspTokenRefreshSkewSeconds <= time.time())):
+                actionLog("DEBUG", fn, "CSP token cache miss. Logging in...")
+                getRefreshToken_apiUrl = cspBaseApiUrl + "/iaas/api/login"  # Set API URL
+                body = {    # Set call body
+                    "refreshToken": cspRefreshToken
+                }
+                with actionTimer("cspLogin"):
+                    getRefreshToken_postCall = cspGetHttpSession(context, inputs, actionConfig).post(url = getRefreshToken_apiUrl, data=json.dumps(body))   # Call 
+                # End Loop
+                getRefreshToken_responseJson = json.loads(getRefreshToken_postCall.text)    # Get call response
+                if ("token" in getRefreshToken_responseJson):
+                    bearerToken = getRefreshToken_responseJson["token"]   # Set response
+                    cacheEntry = {
+                        "token": bearerToken,
+                        "expiresAt": cspGetTokenExpiry(bearerToken),
+                    }
+                    cspTokenCache[cacheKey] = cacheEntry
+                    cacheStatus = "miss"
+                else:
+                    actionLog("ERROR", fn, "CSP login failed. Status code: %s", getRefreshToken_postCall.status_code)
+                    cspTokenCache.pop(cacheKey, None)
+                    cacheEntry = {
+                        "token": "",
+                        "expiresAt": time.time(),
+                    }
+                    cacheStatus = "error"
+                # End Loop
+            # End Loop
+        # End Loop
+    # End Loop
+    
+    actionLog("DEBUG", fn, "CSP token cache %s. Expires in %ss.", cacheStatus, int(cacheEntry['expiresAt'] - time.time()))
+    
+    
+    # ----- Outputs ----- #
+    
+    response = {   # Set action outputs
+        "cspBearerToken" : cacheEntry['token'],
+        "cacheStatus" : cacheStatus,
+        }
+    actionLog("DEBUG", fn, "Function completed.")  
+    
+    return response    # Return response 
+    # End Function  
+
+
+
+def cspGetTokenExpiry (bearerToken):  # Returns the epoch expiry of a CSP JWT bearer token from its exp claim
+    try:
+        jwtPayload = bearerToken.split('.')[1]
+        jwtPayload += '=' * (-len(jwtPayload) % 4)    # Restore base64 padding
+        jwtClaims = json.loads(base64.urlsafe_b64decode(jwtPayload.encode('utf-8')))
+        return float(jwtClaims['exp'])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return time.time() + cspTokenDefaultTtlSeconds
+    # End Function  
+
+
+
+def awsGetClient (context, inputs, actionConfig, awsServiceName, awsRegionName):  # Returns a boto3 client for the service and region. Created once per container and reused.
+    fn = "awsGetClient -"    # Holds the funciton name. 
+    
+    boto3 = awsImportBoto3 ()   # Call function. Also binds ClientError and BotoCoreError for the callers
+    cacheKey = (awsServiceName, awsRegionName)
+    awsClient = awsClientRegistry.get(cacheKey)
+    if (awsClient is None):
+        with awsClientRegistryLock:
+            awsClient = awsClientRegistry.get(cacheKey)
+            if (awsClient is None):
+                actionLog("DEBUG", fn, "Creating %s client for region %s.", awsServiceName, awsRegionName)
+                awsClientConfig = actionImport("botocore.config").Config(
+                    region_name=awsRegionName,
+                    max_pool_connections=actionConfig.httpPoolSize,
+                    retries={
+                        'max_attempts': awsClientMaxRetries.get(awsServiceName, actionConfig.httpMaxRetries),
+                        'mode': 'standard',
+                    },
+                )
+                awsClient = boto3.session.Session().client(awsServiceName, config=awsClientConfig)   # Sessions are not thread safe, clients are
+                awsClientRegistry[cacheKey] = awsClient
+            # End Loop
+        # End Loop
+    # End Loop
+    
+    return awsClient    # Return client 
+    # End Function  
+
+
+
+def awsGetErrorMessage (error):  # Returns the message of a failed AWS call. The SES or SQS error message of a ClientError, else the exception text
+    if (isinstance(error, ClientError) and hasattr(error, 'response')):
+        return error.response['Error'].get('Message') or error.response['Error'].get('Code', "")
+    # End Loop
+    
+    return "%s: %s" % (type(error).__name__, error)
+    # End Function  
+
+
+
+def cspGetHttpSession (context, inputs, actionConfig):  # Returns the pooled keep-alive requests session used for CSP calls. Created once per container and reused.
+    global cspHttpSession
+    fn = "cspGetHttpSession -"    # Holds the funciton name. 
+    
+    if (cspHttpSession is None):
+        with cspHttpSessionLock:
+            if (cspHttpSession is None):
+                actionLog("DEBUG", fn, "Creating CSP HTTP session.")
+                requests = actionImport("requests")
+                urllib3 = actionImport("urllib3")
+                urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)   # Warned when making an unverified HTTPS request.
+                urllib3.disable_warnings(urllib3.exceptions.DependencyWarning)   # Warned when an attempt is made to import a module with missing optional dependencies. 
+                httpPoolSize = actionConfig.httpPoolSize
+                httpRetry = actionImport("urllib3.util.retry").Retry(
+                    total=actionConfig.httpMaxRetries,
+                    backoff_factor=0.5,
+                    status_forcelist=[429, 500, 502, 503, 504],
+                    allowed_methods=False,    # Also retry the login POST. It has no side effects
+                )
+                httpAdapter = actionImport("requests.adapters").HTTPAdapter(pool_connections=httpPoolSize, pool_maxsize=httpPoolSize, max_retries=httpRetry)
+                httpSession = requests.Session()
+                httpSession.mount('https://', httpAdapter)
+                httpSession.mount('http://', httpAdapter)
+                cspHttpSession = httpSession
+            # End Loop
+        # End Loop
+    # End Loop
+    
+    return cspHttpSession    # Return session 
+    # End Function  
+
+
+
+def cspGetBlueprintOptions (context, inputs, actionConfig, actionInputs, blueprintId):  # Returns the blueprint options. Reuses cached options while the blueprint ETag or updatedAt is unchanged.
+    fn = "cspGetBlueprintOptions -"    # Holds the funciton name. 
+    actionLog("DEBUG", fn, "Function started.")
+    
+    
+    # ----- Script ----- #
+    
+    body = {}
+    blueprint_callUrl = cspBaseApiUrl + '/blueprint/api/blueprints/'+blueprintId+'?$select=content,updatedAt&apiVersion=2019-09-12'    # Only what is needed for the options
+    blueprintVersion_callUrl = cspBaseApiUrl + '/blueprint/api/blueprints/'+blueprintId+'?$select=id,updatedAt&apiVersion=2019-09-12'
+    requestsHeaders = dict(actionInputs['cspRequestsHeaders'])
+    
+    with blueprintOptionsCacheLock:
+        cacheEntry = blueprintOptionsCache.get(blueprintId)
+    # End Loop
+    
+    resp_blueprint_call = None
+    if (cacheEntry is None):
+        cacheStatus = "miss"
+    elif (cacheEntry['checkedAt'] + blueprintOptionsCacheFreshSeconds > time.time()):
+        cacheStatus = "hit"
+    elif (cacheEntry['etag'] != ""):    # Conditional GET. 304 means the cached options are still valid
+        requestsHeaders['If-None-Match'] = cacheEntry['etag']
+        with actionTimer("blueprintFetch"):
+            resp_blueprint_call = cspGetHttpSession(context, inputs, actionConfig).get(blueprint_callUrl, data=json.dumps(body), verify=False, headers=requestsHeaders)
+        # End Loop
+        cacheStatus = "revalidated" if (resp_blueprint_call.status_code == 304) else "miss"
+    else:    # No ETag. Compare updatedAt from a minimal select
+        with actionTimer("blueprintFetch"):
+            resp_blueprintVersion_call = cspGetHttpSession(context, inputs, actionConfig).get(blueprintVersion_callUrl, data=json.dumps(body), verify=False, headers=requestsHeaders)
+        # End Loop
+        blueprintUpdatedAt = json.loads(resp_blueprintVersion_call.text).get('updatedAt', "")
+        cacheStatus = "revalidated" if (blueprintUpdatedAt != "" and blueprintUpdatedAt == cacheEntry['updatedAt']) else "miss"
+    # End Loop
+    
+    if (cacheStatus == "miss"):
+        if (resp_blueprint_call is None):
+            with actionTimer("blueprintFetch"):
+                resp_blueprint_call = cspGetHttpSession(context, inputs, actionConfig).get(blueprint_callUrl, data=json.dumps(body), verify=False, headers=(actionInputs['cspRequestsHeaders']))
+            # End Loop
+        # End Loop
+        with actionTimer("blueprintYamlParse"):
+            blueprintJson = json.loads(resp_blueprint_call.text)
+            blueprintOptions = blueprintYamlGetOptions(blueprintJson['content'])    # Get the options from the BP Yaml in the Content
+        # End Loop
+        cacheEntry = {
+            "options": blueprintOptions,
+            "etag": resp_blueprint_call.headers.get('ETag', ""),
+            "updatedAt": blueprintJson.get('updatedAt', ""),
+            "checkedAt": time.time(),
+        }
+    else:
+        cacheEntry = dict(cacheEntry)
+        if (cacheStatus == "revalidated"):
+            cacheEntry['checkedAt'] = time.time()
+        # End Loop
+    # End Loop
+    
+    with blueprintOptionsCacheLock:
+        blueprintOptionsCache[blueprintId] = cacheEntry
+        blueprintOptionsCache.move_to_end(blueprintId)
+        while (len(blueprintOptionsCache) > blueprintOptionsCacheMaxSize):
+            blueprintOptionsCache.popitem(last=False)   # Evict least recently used
+        # End Loop
+    # End Loop
+    
+    actionLog("DEBUG", fn, "Blueprint options cache %s.", cacheStatus)
+    
+    
+    # ----- Outputs ----- #
+    
+    response = {   # Set action outputs
+        "blueprintOptions" : cacheEntry['options'],
+        "cacheStatus" : cacheStatus,
+        }
+    actionLog("DEBUG", fn, "Function completed.")  
+    
+    return response    # Return response 
+    # End Function  
+
+
+
+class EmailHtmlOptimizer(html.parser.HTMLParser):  # Inlines simple <style> rules into style attributes, drops unused rules, comments and whitespace
+    def __init__(self, cssRules, keepClasses=False):
+        html.parser.HTMLParser.__init__(self, convert_charrefs=True)
+        self.cssRules = cssRules    # (specificity, order, tag, cssClass, declarations)
+        self.keepClasses = keepClasses    # Class attributes are still used by the rules kept in the <style> block
+        self.cssRulesUsed = set()
+        self.output = []
+        self.pendingWhitespace = False
+        self.lastTag = ""
+        self.inStyle = False
+        self.preformattedDepth = 0
+
+    def emitTag(self, tagName, markup):
+        if (self.pendingWhitespace and (tagName not in emailHtmlBlockTags) and (self.lastTag not in emailHtmlBlockTags)):
+            self.output.append(" ")
+        # End Loop
+        self.pendingWhitespace = False
+        self.lastTag = tagName
+        self.output.append(markup)
+
+    def handle_starttag(self, tag, attrs):
+        self.handle_startendtag(tag, attrs, False)
+        if (tag in emailHtmlPreformattedTags):
+            self.preformattedDepth += 1
+        # End Loop
+
+    def handle_startendtag(self, tag, attrs, selfClosing=True):
+        if (tag == "style"):
+            self.inStyle = True
+            return
+        # End Loop
+        attrs = [(name, value) for name, value in attrs if not (tag == "meta" and name == "name" and str(value).lower() == "generator")]
+        if ((tag == "meta") and not any(name == "http-equiv" or name == "charset" for name, value in attrs)):
+            return    # e.g. the Word generator meta
+        # End Loop
+        cssClasses = set()
+        inlineStyle = ""
+        keptAttrs = []
+        for name, value in attrs:
+            if (name == "class"):
+                cssClasses = set(str(value).split())
+                if (self.keepClasses):
+                    keptAttrs.append((name, value))
+                # End Loop
+            elif (name == "style"):
+                inlineStyle = value or ""
+            else:
+                keptAttrs.append((name, value))
+            # End Loop
+        # End Loop
+        declarations = collections.OrderedDict()
+        for specificity, order, ruleTag, ruleClass, ruleDeclarations in self.cssRules:    # Rules are sorted by specificity and source order
+            if (((ruleTag == "") or (ruleTag == tag)) and ((ruleClass == "") or (ruleClass in cssClasses))):
+                self.cssRulesUsed.add(order)
+                declarations.update(ruleDeclarations)
+            # End Loop
+        # End Loop
+        declarations.update(emailCssParseDeclarations(inlineStyle))    # Inline style wins
+        if (declarations):
+            keptAttrs.append(("style", ";".join(key+":"+value for key, value in declarations.items())))
+        # End Loop
+        markup = "<"+tag
+        for name, value in keptAttrs:
+            if (value is None):
+                markup += " "+name
+            elif (('"' in value) and ("'" not in value)):
+                markup += " "+name+"='"+value.replace("&", "&amp;")+"'"
+            else:
+                markup += " "+name+'="'+value.replace("&", "&amp;").replace('"', "&quot;")+'"'
+            # End Loop
+        # End Loop
+        self.emitTag(tag, markup+("/>" if (selfClosing and tag not in emailHtmlVoidTags) else ">"))
+
+    def handle_endtag(self, tag):
+        if (tag == "style"):
+            self.inStyle = False
+            return
+        # End Loop
+        if ((tag in emailHtmlPreformattedTags) and (self.preformattedDepth > 0)):
+            self.preformattedDepth -= 1
+        # End Loop
+        if (tag not in emailHtmlVoidTags):
+            self.emitTag(tag, "</"+tag+">")
+        # End Loop
+
+    def handle_data(self, data):
+        if (self.inStyle):
+            return
+        # End Loop
+        if (self.preformattedDepth > 0):    # Kept as is
+            self.pendingWhitespace = False
+            self.output.append(html.escape(data, quote=False).replace("\xa0", "&nbsp;"))
+            self.lastTag = ""
+            return
+        # End Loop
+        text = emailHtmlWhitespacePattern.sub(" ", data)
+        if (text.strip(" ") == ""):
+            self.pendingWhitespace = self.pendingWhitespace or (text != "")
+            return
+        # End Loop
+        if (text.startswith(" ")):
+            self.pendingWhitespace = True
+            text = text[1:]
+        # End Loop
+        if (self.pendingWhitespace and (self.lastTag not in emailHtmlBlockTags)):
+            self.output.append(" ")
+        # End Loop
+        self.pendingWhitespace = text.endswith(" ")
+        self.output.append(html.escape(text.rstrip(" "), quote=False).replace("\xa0", "&nbsp;"))    # Written back as &nbsp;
+        self.lastTag = ""
+
+    def handle_comment(self, data):
+        if (data.strip().startswith("[if")):    # Keep Outlook conditional comments
+            self.output.append("<!--"+data+"-->")
+        # End Loop
+
+    def handle_decl(self, decl):
+        self.output.append("<!"+decl+">")
+    # End Class  
+
+
+
+def emailCssParseDeclarations (cssDeclarations):  # Parses "prop:value;prop:value" into an ordered dict. Print only properties are dropped
+    declarations = collections.OrderedDict()
+    for declaration in cssDeclarations.split(';'):
+        key, separator, value = declaration.partition(':')
+        key = key.strip().lower()
+        value = re.sub(r"\s+", " ", value).strip()
+        if (separator and key and value and (key not in emailCssDroppedProperties)):
+            declarations[key] = value
+        # End Loop
+    # End Loop
+    
+    return declarations    # Return declarations 
+    # End Function  
+
+
+
+def emailCssSplitRules (cssSource):  # Splits a style sheet into its top level rules. Returns (prelude, body) pairs. The body of a nested at-rule (e.g. @media) holds its inner rules as is. At-rule statements (e.g. @import) have None as body
+    cssRules = []
+    depth = 0
+    start = 0
+    for position, char in enumerate(cssSource):
+        if (char == '{'):
+            if (depth == 0):
+                prelude = cssSource[start:position].strip()
+                start = position + 1
+            # End Loop
+            depth += 1
+        elif ((char == '}') and (depth > 0)):
+            depth -= 1
+            if (depth == 0):
+                cssRules.append((prelude, cssSource[start:position]))
+                start = position + 1
+            # End Loop
+        elif ((char == ';') and (depth == 0)):
+            if (cssSource[start:position].strip()):
+                cssRules.append((cssSource[start:position].strip(), None))
+            # End Loop
+            start = position + 1
+        # End Loop
+    # End Loop
+    
+    return cssRules    # Return rules 
+    # End Function  
+
+
+
+def emailOptimizeHtml (templateSource):  # Returns the template with CSS inlined, unused rules dropped and HTML minified. Cached by content hash, with a size report per template
+    fn = "emailOptimizeHtml -"    # Holds the funciton name. 
+    
+    templateHash = hashlib.sha256(templateSource.encode('utf-8')).hexdigest()
+    if (templateHash in emailOptimizedHtmlCache):
+        return emailOptimizedHtmlCache[templateHash]
+    # End Loop
+    
+    # CSS rules. Only tag, .class, tag.class and a:link selectors are inlined. Others and the at-rules are kept in a <style> block
+    cssSource = "".join(re.findall(r"<style[^>]*>(.*?)</style>", templateSource, re.IGNORECASE | re.DOTALL))
+    cssSource = re.sub(r"/\*.*?\*/|<!--|-->", "", cssSource, flags=re.DOTALL)
+    cssRules = []
+    cssKeptRules = []
+    for order, (selectors, cssDeclarations) in enumerate(emailCssSplitRules(cssSource)):
+        if (selectors.startswith('@')):    # Loop. e.g. @media rules apply only to some clients, so they are never inlined
+            if (re.match(r"@([\w-]*)", selectors).group(1).lower() not in emailCssDroppedAtRules):
+                cssKeptRules.append(selectors+(";" if (cssDeclarations is None) else "{"+cssDeclarations.strip()+"}"))
+            # End Loop
+            continue
+        elif (cssDeclarations is None):    # Stray text between rules
+            continue
+        # End Loop
+        declarations = emailCssParseDeclarations(cssDeclarations)
+        for selector in selectors.split(','):
+            selectorMatch = re.match(r"^([a-z0-9]*)(?:\.([\w-]+))?(:link)?$", selector.strip(), re.IGNORECASE)
+            if (selectorMatch is None or not (selectorMatch.group(1) or selectorMatch.group(2))):
+                cssKeptRules.append(selector.strip()+"{"+";".join(key+":"+value for key, value in declarations.items())+"}")
+            elif (declarations):
+                specificity = (1 if selectorMatch.group(2) else 0, 1 if selectorMatch.group(1) else 0)
+                cssRules.append((specificity, order, selectorMatch.group(1).lower(), selectorMatch.group(2) or "", declarations))
+            # End Loop
+        # End Loop
+    # End Loop
+    cssRules.sort(key=lambda rule: (rule[0], rule[1]))
+    
+    htmlOptimizer = EmailHtmlOptimizer(cssRules, keepClasses=bool(cssKeptRules))
+    htmlOptimizer.feed(templateSource)
+    htmlOptimizer.close()
+    optimizedHtml = "".join(htmlOptimizer.output).strip(" \t\r\n\f")
+    if (cssKeptRules and ("</head>" in optimizedHtml)):
+        optimizedHtml = optimizedHtml.replace("</head>", "<style>"+"".join(cssKeptRules)+"</style></head>", 1)
+    elif (cssKeptRules):    # Template without a head
+        optimizedHtml = "<style>"+"".join(cssKeptRules)+"</style>"+optimizedHtml
+    # End Loop
+    
+    emailTemplateSizeReports[templateHash] = {
+        "originalBytes": len(templateSource.encode('utf-8')),
+        "optimizedBytes": len(optimizedHtml.encode('utf-8')),
+        "cssRulesInlined": len(set(rule[1] for rule in cssRules) & htmlOptimizer.cssRulesUsed),
+        "cssRulesDropped": len(set(rule[1] for rule in cssRules) - htmlOptimizer.cssRulesUsed),
+    }
+    actionLog("INFO", fn, "Template %s size report.", templateHash[:12], **emailTemplateSizeReports[templateHash])
+    emailOptimizedHtmlCache[templateHash] = optimizedHtml
+    
+    return optimizedHtml    # Return optimized template 
+    # End Function  
+
+
+
+def blueprintYamlGetLoaders ():  # Returns the blueprint YAML loader classes. Created on first use, as yaml is only imported when a blueprint is parsed
+    if (blueprintYamlLoaders):
+        return blueprintYamlLoaders
+    # End Loop
+    yaml = actionImport("yaml")
+    
+    class BlueprintYamlEventLoader(yaml.composer.Composer, yaml.constructor.SafeConstructor, yaml.resolver.Resolver):  # Safe loader fed from an already collected list of YAML events
+        def __init__(self, yamlEvents):
+            self.yamlEvents = collections.deque(yamlEvents)
+            yaml.composer.Composer.__init__(self)
+            yaml.constructor.SafeConstructor.__init__(self)
+            yaml.resolver.Resolver.__init__(self)
+
+        def check_event(self, *choices):
+            if (not self.yamlEvents):
+                return False
+            return ((not choices) or isinstance(self.yamlEvents[0], choices))
+
+        def peek_event(self):
+            return self.yamlEvents[0]
+
+        def get_event(self):
+            return self.yamlEvents.popleft()
+        # End Class  
+    
+    blueprintYamlLoaders.update({
+        "stream": getattr(yaml, 'CSafeLoader', yaml.SafeLoader),    # libyaml based loader when available
+        "events": BlueprintYamlEventLoader,
+    })
+    
+    return blueprintYamlLoaders    # Return loaders 
+    # End Function  
+
+
+
+def blueprintYamlTakeNode (yamlParser, keepEvents):  # Consumes the events of the next YAML node. Returns them when keepEvents is set
+    yaml = actionImport("yaml")
+    yamlEvents = []
+    depth = 0
+    while True:
+        yamlEvent = yamlParser.get_event()
+        if (keepEvents):
+            yamlEvents.append(yamlEvent)
+        # End Loop
+        if (isinstance(yamlEvent, (yaml.MappingStartEvent, yaml.SequenceStartEvent))):
+            depth += 1
+        elif (isinstance(yamlEvent, (yaml.MappingEndEvent, yaml.SequenceEndEvent))):
+            depth -= 1
+        # End Loop
+        if (depth == 0):
+            return yamlEvents
+        # End Loop
+    # End Loop
+    # End Function  
+
+
+
+def blueprintYamlGetOptions (blueprintContent):  # Returns the top level options of a blueprint. Streams YAML events and stops after the options block
+    fn = "blueprintYamlGetOptions -"    # Holds the funciton name. 
+    yaml = actionImport("yaml")
+    blueprintYamlLoader = blueprintYamlGetLoaders()['stream']
+    
+    try:
+        yamlParser = blueprintYamlLoader(blueprintContent)
+        try:
+            yamlParser.get_event()    # StreamStart
+            if (not yamlParser.check_event(yaml.DocumentStartEvent)):    # Empty content
+                return {}
+            # End Loop
+            yamlParser.get_event()    # DocumentStart
+            if (not yamlParser.check_event(yaml.MappingStartEvent)):    # No top level keys, so no options
+                return {}
+            # End Loop
+            yamlParser.get_event()
+            while (not yamlParser.check_event(yaml.MappingEndEvent)):
+                keyEvent = yamlParser.get_event()
+                if (not isinstance(keyEvent, yaml.ScalarEvent)):
+                    raise yaml.YAMLError("Blueprint top level key is not a scalar")
+                # End Loop
+                if (keyEvent.value == 'options'):
+                    optionsEvents = blueprintYamlTakeNode(yamlParser, True)
+                    optionsLoader = blueprintYamlGetLoaders()['events']([yaml.StreamStartEvent(), yaml.DocumentStartEvent()] + optionsEvents + [yaml.DocumentEndEvent(), yaml.StreamEndEvent()])
+                    return optionsLoader.get_single_data() or {}
+                # End Loop
+                blueprintYamlTakeNode(yamlParser, False)    # Skip the value
+            # End Loop
+            return {}
+        finally:
+            yamlParser.dispose()
+        # End Loop
+    except yaml.YAMLError as e:    # e.g. options using an alias anchored outside of the options block
+        actionLog("WARNING", fn, "Streaming options extraction failed. Using full parse. %s", str(e).splitlines()[0])
+        blueprintContent = yaml.load(blueprintContent, Loader=blueprintYamlLoader)
+        if (not isinstance(blueprintContent, dict)):
+            return {}
+        # End Loop
+        return blueprintContent.get('options') or {}
+    # End Function  
+
+
+
+def payloadBuildIndex (inputs):  # Returns the index of the payload: dotted path -> value, key -> values and the lowercase match view of runOn rules. Built on first use, see PayloadIndex
+    return PayloadIndex(inputs)    # Return index 
+    # End Function  
+
+
+
+def payloadFlatten (inputs):  # Flattens the payload in one pass. Returns the paths and keys of the index
+    payloadPaths = {}
+    payloadKeys = {}
+    
+    payloadStack = [("", inputs)]
+    while payloadStack:
+        parentPath, node = payloadStack.pop()
+        if (isinstance(node, dict)):
+            nodeItems = node.items()
+        elif (isinstance(node, (list, tuple))):
+            nodeItems = enumerate(node)
+        else:
+            nodeItems = ()
+        # End Loop
+        for key, value in nodeItems:
+            key = str(key)
+            path = key if (parentPath == "") else parentPath+"."+key
+            if (isinstance(value, (dict, list, tuple))):
+                payloadStack.append((path, value))
+            else:
+                payloadPaths[path] = value
+                payloadKeys.setdefault(key, []).append(value)
+            # End Loop
+        # End Loop
+    # End Loop
+    
+    payloadIndex = {
+        "paths": payloadPaths,
+        "keys": payloadKeys,
+    }
+    
+    return payloadIndex    # Return index 
+    # End Function  
+
+
+
+def payloadResolvePath (node, path, ignoreCase=False):  # Returns the leaf value at a dotted path, or payloadPathMissing. Keys may contain dots, e.g. customProperties.cas.cloud.zone. With ignoreCase the path must be lowercase
+    keyEnd = -1
+    while True:    # Loop. Shortest key first
+        keyEnd = path.find('.', keyEnd + 1)
+        key = path if (keyEnd == -1) else path[:keyEnd]
+        if (isinstance(node, dict) and ignoreCase):
+            child = next((value for nodeKey, value in node.items() if (str(nodeKey).lower() == key)), payloadPathMissing)
+        elif (isinstance(node, dict)):
+            child = node.get(key, payloadPathMissing)
+        elif (isinstance(node, (list, tuple)) and key.isdigit() and (int(key) < len(node))):
+            child = node[int(key)]
+        else:
+            child = payloadPathMissing
+        # End Loop
+        if (child is not payloadPathMissing):
+            if (keyEnd == -1):
+                return payloadPathMissing if isinstance(child, (dict, list, tuple)) else child    # Only leaves are indexed
+            # End Loop
+            value = payloadResolvePath(child, path[keyEnd+1:], ignoreCase)
+            if (value is not payloadPathMissing):
+                return value
+            # End Loop
+        # End Loop
+        if (keyEnd == -1):
+            return payloadPathMissing
+        # End Loop
+    # End Loop
+    # End Function  
+
+
+
+def eventTopicResolve (payloadIndex):  # Returns the event topic id of the payload, TEST when it has none, and its topic from eventTopicRegistry, or None when not supported. At most four lookups
+    payloadPaths = payloadIndex['paths']
+    eventTopicId = payloadPaths.get('__metadata.eventTopicId')
+    if (eventTopicId is None):
+        eventTopicId = (payloadIndex['keys'].get('eventTopicId') or ["TEST"])[0]
+    # End Loop
+    eventTopicId = str(eventTopicId)
+    
+    eventTopicType = None
+    for typePath in eventTopicTypePaths.get(eventTopicId, ("eventType",)):    # Loop. First type path present
+        if (typePath in payloadPaths):
+            eventTopicType = str(payloadPaths[typePath])
+            break
+        # End Loop
+    # End Loop
+    eventTopicOutcome = "FAILED" if (str(payloadPaths.get('status', "")).upper() in eventTopicFailedStatuses) else None
+    
+    for registryKey in ((eventTopicId, eventTopicType, eventTopicOutcome), (eventTopicId, None, eventTopicOutcome), (eventTopicId, eventTopicType, None), (eventTopicId, None, None)):    # Loop. Most specific first. A failure wins over a type without a failure topic
+        eventTopic = eventTopicRegistry.get(registryKey)
+        if (eventTopic is not None):
+            return eventTopicId, eventTopic
+        # End Loop
+    # End Loop
+    
+    return eventTopicId, None
+    # End Function  
+
+
+
+def eventTopicExtract (eventTopic, payloadIndex):  # Returns the template variables of the topic fields. Missing fields are empty
+    payloadPaths = payloadIndex['paths']
+    
+    eventTopicData = {}
+    for templateVariable, fieldPaths in eventTopic['fields']:
+        eventTopicData[templateVariable] = ""
+        for fieldPath in fieldPaths:    # Loop. First path present
+            if (fieldPath in payloadPaths):
+                eventTopicData[templateVariable] = payloadFormatValue(payloadPaths[fieldPath])
+                break
+            # End Loop
+        # End Loop
+    # End Loop
+    
+    return eventTopicData    # Return data 
+    # End Function  
+
+
+
+def payloadFormatValue (value):  # Formats a payload leaf value the way json.dumps does, without the quotes
+    if (isinstance(value, bool)):
+        return "true" if value else "false"
+    elif (value is None):
+        return "null"
+    else:
+        return str(value)
+    # End Loop
+    # End Function  
+
+
+
+def runOnRuleCompile (runOnRule):  # Compiles a runOn rule string into a predicate over a payload index. Compiled rules are cached per rule string
+    # Syntax: terms joined by && (and) and || (or), && binds tighter. A term is one of:
+    #   key: value    - key (leaf key or dotted path) has exactly this value
+    #   key: va*ue    - glob value, also allowed in the key
+    #   key: re:^v.+  - regex value
+    #   key           - key is present
+    #   !term         - negation
+    runOnPredicate = runOnRuleCache.get(runOnRule)
+    if (runOnPredicate is not None):
+        return runOnPredicate
+    # End Loop
+    
+    orGroups = []
+    runOnKeys = set()    # Keys of the terms, collected in one pass before the terms are evaluated
+    runOnGlobs = set()
+    for orPart in runOnRule.split('||'):
+        andTerms = []
+        for term in orPart.split('&&'):
+            term = term.strip()
+            if (term == ""):
+                continue
+            # End Loop
+            termKey, termPredicate = runOnRuleCompileTerm(term)
+            (runOnGlobs if runOnRuleIsGlob(termKey) else runOnKeys).add(termKey)
+            andTerms.append(termPredicate)
+        # End Loop
+        if (andTerms):
+            orGroups.append(andTerms)
+        # End Loop
+    # End Loop
+    
+    def runOnPredicate (payloadIndex):
+        if (not orGroups):    # Empty rule always matches
+            return True
+        # End Loop
+        payloadIndex['match'].collect(runOnKeys, runOnGlobs)
+        return any(all(termPredicate(payloadIndex) for termPredicate in andTerms) for andTerms in orGroups)
+    # End Function  
+    
+    if (len(runOnRuleCache) >= runOnRuleCacheMaxSize):
+        runOnRuleCache.clear()
+    # End Loop
+    runOnRuleCache[runOnRule] = runOnPredicate
+    
+    return runOnPredicate    # Return predicate 
+    # End Function  
+
+
+
+def runOnRuleCompileTerm (term):  # Compiles a single runOn rule term. Returns its lowercase key and its predicate. See runOnRuleCompile for the syntax
+    fn = "runOnRuleCompileTerm -"    # Holds the funciton name.
+    negate = term.startswith('!')
+    if (negate):
+        term = term[1:].strip()
+    # End Loop
+    
+    termKey, separator, termValue = term.partition(':')
+    termKey = termKey.strip().lower()
+    termValue = termValue.strip().lower()
+    
+    # Value matcher
+    if (separator == ""):
+        valueMatches = lambda values: True    # Key presence only 
+    elif (termValue.startswith('re:')):
+        try:
+            termValueRegex = re.compile(termValue[3:].strip(), re.IGNORECASE)
+        except re.error as e:    # Never matches, also when negated. The rule is cached, so this is logged once per container
+            actionLog("WARNING", fn, "INVALID action input. runOn term %s has an invalid regex. Treated as not matched. %s", term, e)
+            return termKey, lambda payloadIndex: False
+        # End Loop
+        valueMatches = lambda values: any(termValueRegex.search(value) for value in values)
+    elif (any(char in termValue for char in '*?[')):
+        valueMatches = lambda values: any(fnmatch.fnmatchcase(value, termValue) for value in values)
+    else:
+        valueMatches = lambda values: termValue in values
+    # End Loop
+    
+    # Key matcher. Leaf keys anywhere in the payload, then dotted paths
+    if (runOnRuleIsGlob(termKey)):
+        def termPredicate (payloadIndex):
+            if (any(valueMatches(values) for values in payloadIndex['match'].globKeyMatchValues(termKey))):
+                return True
+            return any(valueMatches((value,)) for value in payloadIndex['match'].globPathMatchValues(termKey))
+        # End Function  
+    else:
+        def termPredicate (payloadIndex):
+            keyValues = payloadIndex['match'].keyMatchValues(termKey)
+            if (keyValues and valueMatches(keyValues)):
+                return True
+            pathValue = payloadIndex['match'].pathMatchValue(termKey)
+            return ((pathValue is not payloadPathMissing) and valueMatches((pathValue,)))
+        # End Function  
+    # End Loop
+    
+    if (negate):
+        return termKey, lambda payloadIndex: not termPredicate(payloadIndex)
+    # End Loop
+    return termKey, termPredicate    # Return key and predicate 
+    # End Function  
+
+
+
+def runOnRuleIsGlob (termKey):  # Returns True when a runOn term key is a glob
+    return any(char in termKey for char in '*?[')    # Return bool 
+    # End Function  
+
+
+
+def runOnRuleEvaluate (runOnRule, runOnMatch):  # Evaluates a runOn rule against a payload index, or against a "key: value" action input string used for ABX testing
+    if (isinstance(runOnMatch, str)):
+        runOnMatch = payloadBuildIndex(runOnRuleParseMatch(runOnMatch))
+    # End Loop
+    
+    return runOnRuleCompile(runOnRule)(runOnMatch)
+    # End Function  
+
+
+
+def runOnRuleParseMatch (runOnMatch):  # Returns the payload of a "key: value" action input string. YAML when pyyaml is installed, else one "key: value" per line, so actions without pyyaml can be tested
+    try:
+        yaml = actionImport("yaml")
+    except ImportError:
+        runOnMatchPayload = {}
+        for line in runOnMatch.splitlines():    # Loop. The value is everything after the first colon (e.g. cloudZoneProp: cas.cloud.zone.type:aws)
+            key, separator, value = line.partition(':')
+            if (separator and key.strip()):
+                runOnMatchPayload[key.strip().strip('"\'')] = value.strip().strip('"\'')
+            # End Loop
+        # End Loop
+        return runOnMatchPayload
+    # End Loop
+    
+    try:
+        runOnMatchYaml = yaml.safe_load(runOnMatch)
+    except yaml.YAMLError:
+        runOnMatchYaml = None
+    # End Loop
+    
+    return runOnMatchYaml if isinstance(runOnMatchYaml, (dict, list)) else {}    # Return payload
+    # End Function  
+
+
+
+def actionGetExecutor ():  # Returns the thread pool used for concurrent stages. Created once per container and reused
+    global actionExecutor
+    
+    if (actionExecutor is None):
+        with actionExecutorLock:
+            if (actionExecutor is None):
+                actionExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=actionExecutorMaxWorkers, thread_name_prefix="abx")
+            # End Loop
+        # End Loop
+    # End Loop
+    
+    return actionExecutor    # Return executor 
+    # End Function  
+
+
+
+def actionSubmit (function, *args):  # Runs a function in the thread pool with the run context of the caller, so its log records and stage timings belong to the run. Returns the future
+    return actionGetExecutor().submit(contextvars.copy_context().run, function, *args)    # Return future 
+    # End Function  
+
+
+
+def actionGetDeadline (context, actionStartTime):  # Returns the epoch time the run stages must be done by. From the context remaining time when it has one, else from actionTimeoutSeconds
+    getRemainingTimeInMillis = getattr(context, 'get_remaining_time_in_millis', None)    # e.g. the Lambda context of ABX on AWS
+    if (callable(getRemainingTimeInMillis)):
+        return time.time() + getRemainingTimeInMillis() / 1000.0 - actionDeadlineMarginSeconds
+    # End Loop
+    return actionStartTime + actionTimeoutSeconds - actionDeadlineMarginSeconds
+    # End Function  
+
+
+
+def actionLogConfigure (actionConfig):  # Sets the log level and format used outside of runs, e.g. by offline tests calling the stages directly. Runs use their own, see ActionRunContext
+    global actionLogLevel, actionLogFormat
+    
+    actionLogLevel = actionLogLevels[actionConfig.actionLogLevel]
+    actionLogFormat = actionConfig.actionLogFormat
+    # End Function  
+
+
+
+def actionLog (level, fn, message, *args, **fields):  # Writes one log record. The message is %-formatted with args and the fields serialized only when the level is enabled for the run
+    runContext = actionRunContext.get()
+    logLevel, logFormat = (actionLogLevel, actionLogFormat) if (runContext is None) else (runContext.logLevel, runContext.logFormat)
+    if (actionLogLevels[level] < logLevel):
+        return
+    # End Loop
+    
+    if (args):
+        message = message % args
+    # End Loop
+    fields = actionLogRedact(fields)
+    if (logFormat == "json"):
+        record = {"ts": round(time.time(), 3), "level": level, "fn": fn.rstrip(" -"), "msg": message}
+        record.update(fields)
+        logLine = json.dumps(record, default=str)
+    elif (fields):
+        logLine = "[ABX] "+fn+" "+message+" "+json.dumps(fields, default=str)
+    else:
+        logLine = "[ABX] "+fn+" "+message
+    # End Loop
+    with actionLogLock:
+        print(logLine)
+    # End Loop
+    # End Function  
+
+
+
+def actionLogRedact (values):  # Returns a copy of a dict with secret values replaced by OMITED, nested dicts included
+    redacted = {}
+    for key, value in values.items():
+        if (any(redactedKey in str(key).lower() for redactedKey in actionLogRedactedKeys)):
+            redacted[key] = "OMITED"
+        elif (isinstance(value, dict)):
+            redacted[key] = actionLogRedact(value)
+        else:
+            redacted[key] = value
+        # End Loop
+    # End Loop
+    
+    return redacted    # Return redacted copy 
+    # End Function  
+
+
+
+@contextlib.contextmanager
+def actionTimer (stage):  # Times the with block and adds the milliseconds to the stage of the current run
+    stageStartTime = time.perf_counter()
+    try:
+        yield
+    finally:
+        actionTimingAdd (stage, (time.perf_counter() - stageStartTime) * 1000)   # Call function
+    # End Loop
+    # End Function  
+
+
+
+def actionTimingAdd (stage, elapsedMs):  # Adds milliseconds to a stage of the current run. Repeated stages, e.g. one SES call per 50 recipients, are summed. Not recorded outside of runs
+    runContext = actionRunContext.get()
+    if (runContext is None):
+        return
+    # End Loop
+    with actionTimingsLock:
+        runContext.timings[stage] = runContext.timings.get(stage, 0.0) + elapsedMs
+    # End Loop
+    # End Function  
+
+
+
+def actionTimingsSnapshot ():  # Returns the stage timings of the current run in milliseconds, rounded for the action outputs
+    runContext = actionRunContext.get()
+    if (runContext is None):
+        return collections.OrderedDict()
+    # End Loop
+    with actionTimingsLock:
+        return collections.OrderedDict((stage, round(elapsedMs, 3)) for stage, elapsedMs in runContext.timings.items())
+    # End Loop
+    # End Function  
+
+
+
+def actionMetricsEmit (actionConfig, timings, **dimensions):  # Prints the stage timings as one CloudWatch Embedded Metric Format line. CloudWatch Logs turns it into metrics
+    # Ref: https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/CloudWatch_Embedded_Metric_Format_Specification.html
+    actionMetricsNamespace = actionConfig.actionMetricsNamespace
+    
+    metricsRecord = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": actionMetricsNamespace,
+                "Dimensions": [sorted(dimensions)],
+                "Metrics": [{"Name": stage+"Ms", "Unit": "Milliseconds"} for stage in timings],
+            }],
+        },
+    }
+    metricsRecord.update({key: str(value) for key, value in dimensions.items()})
+    metricsRecord.update({stage+"Ms": elapsedMs for stage, elapsedMs in timings.items()})
+    with actionLogLock:
+        print(json.dumps(metricsRecord))    # Not through actionLog. EMF lines must be plain JSON and are written at any log level
+    # End Loop
+    # End Function  
+
+
+
+def actionImport (moduleName):  # Imports a module on first use. Runs that never need a subsystem (CSP, blueprints, AWS, outbox) do not pay for its import
+    actionModule = sys.modules.get(moduleName)
+    if ((actionModule is None) or actionImportIsInitializing(actionModule)):
+        with actionImportLock:
+            actionModule = sys.modules.get(moduleName)
+            if ((actionModule is None) or actionImportIsInitializing(actionModule)):    # import_module waits for the thread importing it, e.g. a prefetch in the thread pool
+                with actionTimer("import."+moduleName):
+                    actionModule = importlib.import_module(moduleName)
+                # End Loop
+            # End Loop
+        # End Loop
+    # End Loop
+    
+    return actionModule    # Return module 
+    # End Function  
+
+
+
+def actionImportIsInitializing (actionModule):  # True while another thread still runs the module code. sys.modules holds a module from the start of its import
+    return getattr(getattr(actionModule, '__spec__', None), '_initializing', False)
+    # End Function  
+
+
+
+def awsImportBoto3 ():  # Imports boto3 on first use and binds the real botocore ClientError and BotoCoreError for the except clauses of this module
+    global ClientError, BotoCoreError
+    
+    boto3 = actionImport("boto3")
+    ClientError = actionImport("botocore.exceptions").ClientError
+    BotoCoreError = actionImport("botocore.exceptions").BotoCoreError
+    
+    return boto3    # Return module 
+    # End Function  
+
+
+
+def actionConfigGet (inputs, actionFeatures=None):  # Returns the ActionConfig of the action inputs. Parsed on the first run and reused while the action inputs are unchanged
+    if (actionFeatures is not None):
+        actionFeatures = frozenset(actionFeatures)
+    # End Loop
+    try:
+        cacheKey = (actionFeatures, tuple([inputs.get(inputKey) for inputKey in actionInputKeys]))
+        hash(cacheKey)
+    except TypeError:    # Unhashable input value, e.g. a list. Parse without caching
+        return actionConfigParse(inputs, actionFeatures)
+    # End Loop
+
+    with actionConfigCacheLock:
+        actionConfig = actionConfigCache.get(cacheKey)
+        if (actionConfig is not None):
+            actionConfigCache.move_to_end(cacheKey)
+            return actionConfig
+        # End Loop
+    # End Loop
+
+    actionConfig = actionConfigParse (inputs, actionFeatures)   # Call function
+    with actionConfigCacheLock:
+        actionConfigCache[cacheKey] = actionConfig
+        while (len(actionConfigCache) > actionConfigCacheMaxSize):
+            actionConfigCache.popitem(last=False)
+        # End Loop
+    # End Loop
+
+    return actionConfig    # Return config
+    # End Function
+
+
+
+def actionConfigParse (inputs, actionFeatures=None):  # Parses and validates the action inputs of actionInputSchema. Invalid or missing required inputs get the default and an entry in errors. Action options not in actionFeatures are off
+    actionInputParsers = {
+        "bool": actionInputParseBool,
+        "string": actionInputParseString,
+        "rule": actionInputParseRule,
+        "number": actionInputParseNumber,
+        "timeout": actionInputParseTimeout,
+        "count": actionInputParseCount,
+        "integer": actionInputParseInteger,
+        "choice": actionInputParseChoice,
+    }
+    values = {}
+    errors = []
+    for attribute, inputKey, inputType, default, required in actionInputSchema:
+        if ((actionFeatures is not None) and (attribute in actionOptions) and (attribute not in actionFeatures)):    # Loop. Not supported by the calling action
+            values[attribute] = False
+            continue
+        # End Loop
+        value = inputs.get(inputKey)
+        if (actionInputIsUnset(value)):
+            if (required):
+                errors.append(inputKey+" is required.")
+            # End Loop
+            values[attribute] = default
+            continue
+        # End Loop
+        try:
+            values[attribute] = actionInputParsers[inputType](inputKey, value)
+        except ValueError as e:
+            errors.append("%s: %s Using %r." % (inputKey, e, default))
+            values[attribute] = default
+        # End Loop
+    # End Loop
+    values['errors'] = tuple(errors)
+
+    return ActionConfig(**values)    # Return config
+    # End Function
+
+
+
+def actionInputIsUnset (value):  # True for missing, empty, "<Optional>", "<Required>", "empty", "" and '' action inputs. The whole value must match
+    if (value is None):
+        return True
+    # End Loop
+    return (str(value).replace('"','').replace("'",'').strip().lower() in actionInputPlaceholders)
+    # End Function
+
+
+
+def actionInputUnquote (value):  # Returns the input as a string without surrounding whitespace and quotes
+    value = str(value).strip()
+    if ((len(value) >= 2) and (value[0] == value[-1]) and (value[0] in ('"', "'"))):
+        value = value[1:-1].strip()
+    # End Loop
+    return value
+    # End Function
+
+
+
+def actionInputParseBool (inputKey, value):  # bool inputs. True or False, any case
+    value = actionInputUnquote(value).lower()
+    if (value not in ("true", "false")):
+        raise ValueError("expected True or False, got %r." % value)
+    # End Loop
+    return (value == "true")
+    # End Function
+
+
+
+def actionInputParseString (inputKey, value):  # string inputs
+    return actionInputUnquote(value)
+    # End Function
+
+
+
+def actionInputParseRule (inputKey, value):  # runOn rule inputs. Quotes are removed and the rule is matched lowercase
+    return str(value).replace('"','').strip().lower()
+    # End Function
+
+
+
+def actionInputParseNumber (inputKey, value):  # number inputs. 0 or more
+    try:
+        number = float(actionInputUnquote(value))
+    except ValueError:
+        raise ValueError("expected a number, got %r." % value)
+    # End Loop
+    if (not (number >= 0)):    # Also rejects nan
+        raise ValueError("expected 0 or more, got %r." % value)
+    # End Loop
+    return number
+    # End Function
+
+
+
+def actionInputParseTimeout (inputKey, value):  # timeout inputs. Seconds, 0 or more. Clamped to actionMaxStageTimeoutSeconds
+    return min(actionInputParseNumber(inputKey, value), actionMaxStageTimeoutSeconds)
+    # End Function
+
+
+
+def actionInputParseInteger (inputKey, value):  # integer inputs. Whole number, 0 or more
+    number = actionInputParseNumber(inputKey, value)
+    if (not number.is_integer()):
+        raise ValueError("expected a whole number, got %r." % value)
+    # End Loop
+    return int(number)
+    # End Function
+
+
+
+def actionInputParseCount (inputKey, value):  # count inputs. Whole number, 1 or more
+    number = actionInputParseInteger(inputKey, value)
+    if (number < 1):
+        raise ValueError("expected 1 or more, got %r." % value)
+    # End Loop
+    return number
+    # End Function
+
+
+
+def actionInputParseChoice (inputKey, value):  # choice inputs. One of actionInputChoices, any case
+    value = actionInputUnquote(value)
+    for choice in actionInputChoices[inputKey]:
+        if (choice.lower() == value.lower()):
+            return choice
+        # End Loop
+    # End Loop
+    raise ValueError("expected one of %s, got %r." % (", ".join(actionInputChoices[inputKey]), value))
+    # End Function
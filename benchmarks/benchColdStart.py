@@ -0,0 +1,180 @@
+#--------------------------------------------------------#
+#                     Spas Kaloferov                     #
+#                   www.kaloferov.com                    #
+# bit.ly/The-Twitter      Social     bit.ly/The-LinkedIn #
+# bit.ly/The-Gitlab        Git         bit.ly/The-Github #
+# bit.ly/The-BSD         License          bit.ly/The-GNU #
+#--------------------------------------------------------#
+
+  #
+  #       VMware Cloud Assembly ABX Code Sample - Benchmarks
+  #
+  # [Description]
+  #   - Cold start benchmark. Each sample is a new Python process, like a new ABX container:
+  #      - importMs: loading the action module and the shared awsSesSendEmailCore engine
+  #      - firstRunMs: first handler() call, including the imports and clients it needs
+  #      - secondRunMs: the next call in the same process, i.e. a warm container
+  #      - loaded: heavy modules in sys.modules after the first call
+  #   - Scenarios:
+  #      - eager: imports requests, urllib3, yaml and boto3 up front. What every run paid before the imports were deferred. Reference only
+  #      - skip: deployment.request.post payload, runOnProperty not matched. Nothing remote is needed
+  #      - send: TEST topic from action inputs, one email through a stubbed SES client
+  # [Usage]
+  #   - python benchmarks/benchColdStart.py --samples 20
+  # [Dependency]
+  #   - Requires: pyyaml, boto3, requests
+  # [Thanks]
+
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import benchCommon
+
+
+# ----- Global ----- #
+
+benchHeavyModules = ["requests", "urllib3", "yaml", "boto3", "botocore", "sqlite3"]    # Reported when loaded
+benchScenarios = ["eager", "skip", "send"]    # Scenarios run when --scenarios is not given
+benchChildEnvironment = {    # boto3 needs credentials and a region to create the stubbed client. Nothing is sent
+    "AWS_ACCESS_KEY_ID": "bench",
+    "AWS_SECRET_ACCESS_KEY": "bench",
+    "AWS_DEFAULT_REGION": "us-west-2",
+    "AWS_EC2_METADATA_DISABLED": "true",
+}
+
+# Runs in the child process. Reads its settings as JSON on stdin and prints its measurements as JSON
+benchChildSource = r'''
+import json, sys, time, threading
+settings = json.loads(sys.stdin.read())
+sys.path.insert(0, settings['benchDir'])
+heavyModules = settings['heavyModules']
+results = {}
+
+if (settings['scenario'] == "eager"):
+    startTime = time.perf_counter()
+    import requests, urllib3, yaml, boto3, botocore.config, botocore.exceptions, requests.adapters, urllib3.util.retry
+    results['importMs'] = (time.perf_counter() - startTime) * 1000
+else:
+    import benchCommon
+    startTime = time.perf_counter()
+    actionModule = benchCommon.benchLoadAction(settings['actionFile'])
+    results['importMs'] = (time.perf_counter() - startTime) * 1000
+
+    engineModule = sys.modules['awsSesSendEmailCore']    # Loaded by the action. Its functions call awsGetClient through the engine globals
+    awsGetClient = engineModule.awsGetClient
+    stubLock = threading.Lock()
+    def stubbedAwsGetClient (context, inputs, actionConfig, awsServiceName, awsRegionName):    # Real import and client creation, then a Stubber so nothing is sent
+        awsClient = awsGetClient(context, inputs, actionConfig, awsServiceName, awsRegionName)
+        with stubLock:
+            if (not hasattr(awsClient, 'benchStubber')):
+                from botocore.stub import Stubber
+                awsClient.benchStubber = Stubber(awsClient)
+                if (awsServiceName == "ses"):
+                    awsClient.benchStubber.add_response('get_send_quota', {"Max24HourSend": 1000000.0, "MaxSendRate": 100000.0, "SentLast24Hours": 0.0})
+                    for messageIndex in range(settings['invocations']):
+                        awsClient.benchStubber.add_response('send_email', {"MessageId": "bench-%d" % messageIndex})
+                    # End Loop
+                # End Loop
+                awsClient.benchStubber.activate()
+            # End Loop
+        # End Loop
+        return awsClient
+    # End Function
+    engineModule.awsGetClient = stubbedAwsGetClient
+
+    for invocation in range(settings['invocations']):
+        startTime = time.perf_counter()
+        outputs = actionModule.handler(None, dict(settings['inputs']))
+        elapsedMs = (time.perf_counter() - startTime) * 1000
+        results['firstRunMs' if (invocation == 0) else 'secondRunMs'] = elapsedMs
+        results['sendResp' if (invocation == 0) else 'secondSendResp'] = (outputs['resp_myActionFunction'] or {}).get('send_resp', "skipped")
+        if (invocation == 0):
+            results['loaded'] = [moduleName for moduleName in heavyModules if moduleName in sys.modules]
+        # End Loop
+    # End Loop
+# End Loop
+
+print(json.dumps(results))
+'''
+
+
+# ----- Functions  ----- #
+
+def benchScenarioInputs (actionFile, scenario):  # Returns the action inputs of a scenario
+    inputs = benchCommon.benchActionInputs(actionFile,
+        awsSesRegionIn="us-west-2",
+        awsSesSenderIn="no-reply@mydomain.com",
+        actionOptionRunOnBlueprintOptionIn="False",
+        actionLogLevelIn="OFF",
+    )
+    if (scenario == "skip"):
+        inputs.update(actionOptionRunOnPropertyIn="True", runOnPropertyIn="cloudZoneProp: cas.cloud.zone.type:azure")
+        inputs.update(benchCommon.benchMakePayload(10))
+    else:
+        inputs.update(actionOptionAcceptPayloadInputIn="False", awsSesToRecipientABXIn="requester@mydomain.com", deploymentIdABXIn="bench-deployment")
+    # End Loop
+
+    return inputs    # Return inputs
+    # End Function
+
+
+
+def benchRunSample (actionFile, scenario):  # Runs one scenario in a new Python process. Returns its measurements
+    settings = {
+        "benchDir": os.path.dirname(os.path.abspath(__file__)),
+        "actionFile": actionFile,
+        "scenario": scenario,
+        "heavyModules": benchHeavyModules,
+        "invocations": 2,
+        "inputs": {} if (scenario == "eager") else benchScenarioInputs(actionFile, scenario),
+    }
+    childEnvironment = dict(os.environ)
+    childEnvironment.update(benchChildEnvironment)
+    childProcess = subprocess.run([sys.executable, "-c", benchChildSource], input=json.dumps(settings), capture_output=True, text=True, env=childEnvironment)
+    if (childProcess.returncode != 0):
+        raise RuntimeError("Cold start sample failed:\n"+childProcess.stderr)
+    # End Loop
+
+    return json.loads(childProcess.stdout.strip().splitlines()[-1])
+    # End Function
+
+
+
+def main ():  # Runs the samples of each scenario and prints the report
+    argumentParser = argparse.ArgumentParser(description="Cold start benchmark of the awsSesSendEmail ABX action")
+    argumentParser.add_argument("--action", default=benchCommon.benchDefaultActionFile, help="ABX action file (default: %(default)s)")
+    argumentParser.add_argument("--samples", type=int, default=10, help="New processes per scenario (default: %(default)s)")
+    argumentParser.add_argument("--scenarios", default=",".join(benchScenarios), help="Comma separated scenarios (default: %(default)s)")
+    argumentParser.add_argument("--json", default="", help="Also write the results to this JSON file")
+    arguments = argumentParser.parse_args()
+
+    rows = []
+    allResults = {}
+    for scenario in [scenario.strip() for scenario in arguments.scenarios.split(',') if scenario.strip()]:
+        samples = [benchRunSample(arguments.action, scenario) for sample in range(arguments.samples)]
+        allResults[scenario] = samples
+        row = {"scenario": scenario, "loaded": ",".join(samples[0].get('loaded', [])) or "-", "send": samples[0].get('sendResp', "-")}
+        for measurement in ("importMs", "firstRunMs", "secondRunMs"):
+            values = [sample[measurement] for sample in samples if measurement in sample]
+            if (values):
+                summary = benchCommon.benchSummarize(values)
+                row[measurement+" p50"] = summary['p50']
+                row[measurement+" p99"] = summary['p99']
+            # End Loop
+        # End Loop
+        rows.append(row)
+    # End Loop
+
+    benchCommon.benchPrintTable("Cold start (ms), %d new processes per scenario" % arguments.samples, ["scenario", "importMs p50", "importMs p99", "firstRunMs p50", "firstRunMs p99", "secondRunMs p50", "send", "loaded"], rows)
+    if (arguments.json):
+        benchCommon.benchWriteJson(arguments.json, allResults)
+    # End Loop
+    # End Function
+
+
+
+if __name__ == "__main__":
+    main()
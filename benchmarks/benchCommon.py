@@ -0,0 +1,233 @@
+#--------------------------------------------------------#
+#                     Spas Kaloferov                     #
+#                   www.kaloferov.com                    #
+# bit.ly/The-Twitter      Social     bit.ly/The-LinkedIn #
+# bit.ly/The-Gitlab        Git         bit.ly/The-Github #
+# bit.ly/The-BSD         License          bit.ly/The-GNU #
+#--------------------------------------------------------#
+
+  #
+  #       VMware Cloud Assembly ABX Code Sample - Benchmarks
+  #
+  # [Description]
+  #   - Helpers shared by the offline benchmarks in this folder:
+  #      - Loads an ABX action file as a module. Action file names are not importable module names
+  #      - Loads awsSesSendEmailCore, the engine shared by the actions, whose caches, clients and functions the benchmarks use
+  #      - Builds the action inputs from the .abx export defaults
+  #      - Generates synthetic deployment.request.post payloads of any size
+  #      - Percentiles, allocation tracking, host details and table output
+  # [Dependency]
+  #   - Requires: pyyaml, plus the action dependencies for the benchmarks that load an action
+  # [Thanks]
+
+
+import os
+import sys
+import json
+import time
+import platform
+import importlib
+import importlib.util
+import tracemalloc
+
+
+# ----- Global ----- #
+
+benchRepoDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))    # Folder of the ABX action files
+benchDefaultActionFile = "awsSesSendEmail-py-v2.py"    # Action benchmarked when none is given
+benchLoadedActions = {}    # Loaded action modules. Key: action file name
+
+
+# ----- Functions  ----- #
+
+def benchLoadAction (actionFile=benchDefaultActionFile, reload=False):  # Loads an ABX action file as a module. Loaded once per process unless reload is set
+    if ((actionFile in benchLoadedActions) and (not reload)):
+        return benchLoadedActions[actionFile]
+    # End Loop
+
+    benchLoadEngine()    # Actions import awsSesSendEmailCore from their own folder, as in the ABX package
+    moduleName = "bench_"+os.path.splitext(actionFile)[0].replace('-', '_')
+    moduleSpec = importlib.util.spec_from_file_location(moduleName, os.path.join(benchRepoDir, actionFile))
+    actionModule = importlib.util.module_from_spec(moduleSpec)
+    sys.modules[moduleName] = actionModule
+    moduleSpec.loader.exec_module(actionModule)
+    benchLoadedActions[actionFile] = actionModule
+
+    return actionModule    # Return module
+    # End Function
+
+
+
+def benchLoadEngine ():  # Returns the awsSesSendEmailCore engine module. Imported from the repository folder, once per process
+    if (benchRepoDir not in sys.path):
+        sys.path.insert(0, benchRepoDir)
+    # End Loop
+
+    return importlib.import_module("awsSesSendEmailCore")    # Return module
+    # End Function
+
+
+
+def benchActionInputs (actionFile=benchDefaultActionFile, **overrides):  # Returns the action inputs of the .abx export next to the action file, with overrides applied
+    import yaml    # Not at module level, so the cold start benchmark children start without yaml loaded
+    with open(os.path.join(benchRepoDir, os.path.splitext(actionFile)[0]+".abx")) as abxFile:
+        abxExport = yaml.safe_load(abxFile)
+    # End Loop
+
+    actionInputs = {key: str(value) for key, value in (abxExport.get('inputs') or {}).items()}
+    actionInputs.update(overrides)
+
+    return actionInputs    # Return inputs
+    # End Function
+
+
+
+def benchMakePayload (resourceCount, propertyCount=10, metadataDepth=2, eventTopicId="deployment.request.post", eventType="CREATE_DEPLOYMENT", userName="requester@mydomain.com", blueprintId="bench-blueprint", seed=0):  # Returns a synthetic payload shaped like a recorded deployment.request.post event
+    deploymentId = "bench-deployment-%08d" % seed
+
+    def makeMetadata (depth, prefix):
+        metadata = {prefix+"Key%d" % index: prefix+"Value%d" % index for index in range(3)}
+        if (depth > 0):
+            metadata[prefix+"Nested"] = makeMetadata(depth - 1, prefix+"n")
+        # End Loop
+        return metadata
+    # End Function
+
+    resources = []
+    for index in range(resourceCount):
+        resources.append({
+            "id": "/resources/compute/%s-%d" % (deploymentId, index),
+            "name": "Cloud_Machine_%d" % index,
+            "type": "Cloud.vSphere.Machine" if (index % 2 == 0) else "Cloud.AWS.EC2.Instance",
+            "properties": {
+                "cpuCount": 2,
+                "totalMemoryMB": 4096,
+                "image": "ubuntu",
+                "customProperties": {"resourceProp%d" % prop: "resourceValue%d" % prop for prop in range(propertyCount)},
+                "metadata": makeMetadata(metadataDepth, "m"),
+            },
+        })
+    # End Loop
+
+    customProperties = {"customProp%d" % index: "customValue%d" % index for index in range(propertyCount)}
+    customProperties['cloudZoneProp'] = "cas.cloud.zone.type:aws"
+
+    payload = {
+        "id": "bench-request-%08d" % seed,
+        "requestType": "CREATE_DEPLOYMENT",
+        "eventType": eventType,
+        "deploymentId": deploymentId,
+        "deploymentName": "bench-deployment",
+        "blueprintId": blueprintId,
+        "blueprintName": "bench-blueprint",
+        "blueprintVersion": "1",
+        "projectId": "bench-project-id",
+        "projectName": "bench-project",
+        "status": "FINISHED",
+        "requestInputs": {"size": "small", "count": resourceCount},
+        "customProperties": customProperties,
+        "resourceNames": [resource['name'] for resource in resources],
+        "resources": resources,
+        "__metadata": {
+            "eventTopicId": eventTopicId,
+            "userName": userName,
+            "orgId": "bench-org",
+            "targetId": deploymentId,
+            "targetType": "Deployment",
+            "sourceType": "ABX",
+            "headers": {"blocking": "false", "tenant": "bench-org"},
+        },
+    }
+
+    return payload    # Return payload
+    # End Function
+
+
+
+def benchPercentile (values, percentile):  # Nearest rank percentile of a list of numbers
+    if (not values):
+        return 0.0
+    # End Loop
+    orderedValues = sorted(values)
+    rank = max(0, min(len(orderedValues) - 1, int(round(percentile / 100.0 * len(orderedValues) + 0.5)) - 1))
+
+    return orderedValues[rank]
+    # End Function
+
+
+
+def benchSummarize (values):  # Returns p50, p99, mean, min and max of a list of numbers
+    return {
+        "p50": benchPercentile(values, 50),
+        "p99": benchPercentile(values, 99),
+        "mean": (sum(values) / len(values)) if values else 0.0,
+        "min": min(values) if values else 0.0,
+        "max": max(values) if values else 0.0,
+    }
+    # End Function
+
+
+
+def benchMeasureAllocations (function, *args, **kwargs):  # Runs the function under tracemalloc. Returns its result, the peak and the retained bytes
+    tracemalloc.start()
+    try:
+        startBytes = tracemalloc.get_traced_memory()[0]
+        result = function(*args, **kwargs)
+        currentBytes, peakBytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # End Loop
+
+    return result, peakBytes - startBytes, currentBytes - startBytes
+    # End Function
+
+
+
+def benchTime (function, *args, **kwargs):  # Runs the function. Returns its result and the milliseconds it took
+    startTime = time.perf_counter()
+    result = function(*args, **kwargs)
+
+    return result, (time.perf_counter() - startTime) * 1000
+    # End Function
+
+
+
+def benchHostInfo ():  # Returns the host the benchmarks ran on, stored with the results. Numbers from different hosts compare poorly, even normalized
+    return {
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpuCount": os.cpu_count(),
+        "python": platform.python_implementation()+" "+platform.python_version(),
+    }
+    # End Function
+
+
+
+def benchPrintTable (title, columns, rows):  # Prints rows of dicts as an aligned text table
+    print("")
+    print(title)
+    widths = [max([len(column)] + [len(benchFormatCell(row.get(column, ""))) for row in rows]) for column in columns]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    print("  ".join("-" * width for width in widths))
+    for row in rows:
+        print("  ".join(benchFormatCell(row.get(column, "")).ljust(width) for column, width in zip(columns, widths)))
+    # End Loop
+    # End Function
+
+
+
+def benchFormatCell (value):  # Formats a table cell. Floats get 3 decimals
+    if (isinstance(value, float)):
+        return "%.3f" % value
+    # End Loop
+    return str(value)
+    # End Function
+
+
+
+def benchWriteJson (path, results):  # Writes the results as JSON, e.g. to keep a run for comparison
+    with open(path, "w") as resultsFile:
+        json.dump(results, resultsFile, indent=2, sort_keys=True, default=str)
+    # End Loop
+    # End Function
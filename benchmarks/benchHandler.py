@@ -0,0 +1,312 @@
+#--------------------------------------------------------#
+#                     Spas Kaloferov                     #
+#                   www.kaloferov.com                    #
+# bit.ly/The-Twitter      Social     bit.ly/The-LinkedIn #
+# bit.ly/The-Gitlab        Git         bit.ly/The-Github #
+# bit.ly/The-BSD         License          bit.ly/The-GNU #
+#--------------------------------------------------------#
+
+  #
+  #       VMware Cloud Assembly ABX Code Sample - Benchmarks
+  #
+  # [Description]
+  #   - Offline benchmark of the ABX handler() for deployment.request.post payloads of 1 to 1000 resources, and for the ABX TEST payload:
+  #      - Each action (v1 and v2 by default) runs on the shared awsSesSendEmailCore engine with its own action options
+  #      - SES and Secrets Manager clients are botocore Stubber stubs, placed in the engine client registry
+  #      - /iaas/api/login and /blueprint/api/blueprints are served by a local HTTP server. No network is used
+  #      - TEST payload (resources: test): action inputs only, as sent by the ABX console test with actionOptionAcceptPayloadInputIn=True. No blueprintId, deploymentId nor __metadata
+  #      - Reports p50/p99 per stage from the action timings output, and allocations from tracemalloc
+  #   - Scenarios:
+  #      - warm: container caches are kept across invocations, as in a warm ABX container
+  #      - cold: secret, CSP token, blueprint, rule and template caches are cleared before each invocation
+  # [Usage]
+  #   - python benchmarks/benchHandler.py
+  #   - python benchmarks/benchHandler.py --sizes 1,100,1000 --iterations 200 --scenario cold --json bench_output.json
+  #   - python benchmarks/benchHandler.py --actions awsSesSendEmail-py-v2.py
+  # [Dependency]
+  #   - Requires: pyyaml, boto3, requests
+  # [Thanks]
+
+
+import argparse
+import base64
+import json
+import os
+import threading
+import time
+import http.server
+import boto3
+from botocore.stub import Stubber
+import benchCommon
+
+
+# ----- Global ----- #
+
+benchRegion = "us-west-2"    # Region of the stubbed SES and Secrets Manager clients
+benchSecretId = "bench/csp-refresh-token"    # Stubbed Secrets Manager secret
+benchBlueprintId = "bench-blueprint"    # Blueprint served by the local CSP server
+benchBlueprintEtag = '"bench-etag-1"'    # ETag of the served blueprint. Conditional GETs with it get a 304
+benchDefaultSizes = "1,10,100,1000"    # Resource counts benchmarked when --sizes is not given
+benchDefaultActions = "awsSesSendEmail-py-v1.py,awsSesSendEmail-py-v2.py"    # Actions benchmarked when --actions is not given
+benchStageColumns = ["payloadIndex", "recipients", "templateRender", "runOnPropertyEval", "blueprintOptions", "secretsLookup", "cspLogin", "blueprintFetch", "blueprintYamlParse", "runOnBlueprintOptionEval", "myActionFunction", "total"]    # Stages reported, in pipeline order
+
+
+# ----- Local CSP ----- #
+
+class BenchCspRequestHandler(http.server.BaseHTTPRequestHandler):  # Serves the CSP login and blueprint endpoints used by the action
+    protocol_version = "HTTP/1.1"    # Keep-alive, like the real endpoint
+    disable_nagle_algorithm = True    # Else delayed ACKs add ~40ms to each keep-alive response on loopback
+    requestCounts = {}    # Requests served. Key: endpoint
+    requestCountsLock = threading.Lock()
+
+    def countRequest(self, endpoint):
+        with self.requestCountsLock:
+            self.requestCounts[endpoint] = self.requestCounts.get(endpoint, 0) + 1
+        # End Loop
+
+    def sendJson(self, status, body, headers=None):
+        bodyBytes = json.dumps(body).encode('utf-8') if (body is not None) else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(bodyBytes)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        # End Loop
+        self.end_headers()
+        self.wfile.write(bodyBytes)
+
+    def readBody(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def do_POST(self):
+        self.readBody()
+        if (self.path.startswith("/iaas/api/login")):
+            self.countRequest("login")
+            self.sendJson(200, {"token": benchMakeBearerToken(time.time() + 1800)})
+        else:
+            self.sendJson(404, {"message": "Not found"})
+        # End Loop
+
+    def do_GET(self):
+        self.readBody()
+        if (self.path.startswith("/blueprint/api/blueprints/")):
+            if (self.headers.get("If-None-Match") == benchBlueprintEtag):
+                self.countRequest("blueprintNotModified")
+                self.sendJson(304, None, {"ETag": benchBlueprintEtag})
+            else:
+                self.countRequest("blueprint")
+                self.sendJson(200, {"id": benchBlueprintId, "content": self.server.blueprintContent, "updatedAt": "2020-05-29T00:00:00.000Z"}, {"ETag": benchBlueprintEtag})
+            # End Loop
+        else:
+            self.sendJson(404, {"message": "Not found"})
+        # End Loop
+
+    def log_message(self, format, *args):    # Keep the benchmark output readable
+        pass
+    # End Class
+
+
+
+def benchMakeBearerToken (expiresAt):  # Returns an unsigned JWT with an exp claim. The action only reads exp
+    def encode (value):
+        return base64.urlsafe_b64encode(json.dumps(value).encode('utf-8')).decode('ascii').rstrip("=")
+    # End Function
+
+    return encode({"alg": "none"})+"."+encode({"exp": int(expiresAt), "sub": "bench"})+".bench"
+    # End Function
+
+
+
+def benchMakeBlueprintContent (resourceCount):  # Returns blueprint YAML with the awsSesEmailEnable option and resourceCount resources after it
+    blueprintLines = ["formatVersion: 1", "options:", "  awsSesEmailEnable: true", "inputs:", "  size:", "    type: string", "resources:"]
+    for index in range(resourceCount):
+        blueprintLines += ["  Cloud_Machine_%d:" % index, "    type: Cloud.vSphere.Machine", "    properties:", "      image: ubuntu", "      cpuCount: 2"]
+    # End Loop
+
+    return "\n".join(blueprintLines)+"\n"
+    # End Function
+
+
+
+def benchStartCspServer (resourceCount):  # Starts the local CSP server on a free port. Returns the server
+    cspServer = http.server.ThreadingHTTPServer(("127.0.0.1", 0), BenchCspRequestHandler)
+    cspServer.daemon_threads = True
+    cspServer.blueprintContent = benchMakeBlueprintContent(resourceCount)
+    threading.Thread(target=cspServer.serve_forever, name="bench-csp", daemon=True).start()
+
+    return cspServer    # Return server
+    # End Function
+
+
+# ----- Stubbed AWS ----- #
+
+def benchInstallStubs (engineModule):  # Places stubbed SES and Secrets Manager clients in the engine client registry. Returns the stubbers
+    awsSession = boto3.session.Session(aws_access_key_id="bench", aws_secret_access_key="bench", region_name=benchRegion)
+    awsStubbers = {}
+    for awsServiceName in ("ses", "secretsmanager"):
+        awsClient = awsSession.client(awsServiceName, region_name=benchRegion)
+        awsStubbers[awsServiceName] = Stubber(awsClient)
+        awsStubbers[awsServiceName].activate()
+        engineModule.awsClientRegistry[(awsServiceName, benchRegion)] = awsClient
+    # End Loop
+
+    return awsStubbers    # Return stubbers
+    # End Function
+
+
+
+def benchQueueResponses (engineModule, awsStubbers, messageCount, secretUsed):  # Queues the AWS responses the next invocation will ask for, in call order
+    secretCached = any((key[0] == benchSecretId) and (entry['expiresAt'] > time.time()) for key, entry in engineModule.awsSmSecretCache.items())
+    if (secretUsed and (not secretCached)):
+        awsStubbers['secretsmanager'].add_response('get_secret_value', {
+            "ARN": "arn:aws:secretsmanager:"+benchRegion+":000000000000:secret:bench",
+            "Name": benchSecretId,
+            "VersionId": "bench-version-0000000000000000000001",
+            "SecretString": "bench-refresh-token",
+        })
+    # End Loop
+
+    rateBucket = engineModule.awsSesRateBuckets.get(benchRegion)
+    if ((rateBucket is None) or (rateBucket['quotaCheckedAt'] + engineModule.awsSesQuotaTtlSeconds <= time.time())):
+        awsStubbers['ses'].add_response('get_send_quota', {"Max24HourSend": 1000000.0, "MaxSendRate": 100000.0, "SentLast24Hours": 0.0})
+    # End Loop
+    for messageIndex in range(messageCount):
+        awsStubbers['ses'].add_response('send_email', {"MessageId": "bench-message-%d" % messageIndex})
+    # End Loop
+    # End Function
+
+
+
+def benchClearCaches (engineModule):  # Cold scenario. Drops the warm container caches, keeping the clients and the HTTP session
+    for cache in (engineModule.cspTokenCache, engineModule.awsSmSecretCache, engineModule.blueprintOptionsCache, engineModule.runOnRuleCache, engineModule.emailTemplateCache, engineModule.emailOptimizedHtmlCache, engineModule.actionConfigCache):
+        cache.clear()
+    # End Loop
+    # End Function
+
+
+# ----- Benchmark ----- #
+
+def benchRunSize (actionFile, engineModule, awsStubbers, cspServer, resourceCount, iterations, allocationIterations, scenario):  # Benchmarks one action and payload size, or the ABX TEST payload when resourceCount is None. Returns the per stage summary and allocations
+    actionModule = benchCommon.benchLoadAction(actionFile)
+    inputs = benchCommon.benchActionInputs(actionFile,
+        awsSesRegionIn=benchRegion,
+        awsSesSenderIn="no-reply@mydomain.com",
+        awsSesCcRecipientIn="team@mydomain.com",
+        awsSmRegionNameIn=benchRegion,
+        awsSmCspTokenSecretIdIn=benchSecretId,
+        actionOptionUseAwsSecretsManagerIn="True",
+        actionOptionRunOnBlueprintOptionIn="True",
+        actionOptionRunOnPropertyIn="True",
+        runOnPropertyIn="cloudZoneProp: cas.cloud.zone.type:aws",
+        actionLogLevelIn="OFF",
+    )
+    if (resourceCount is None):    # Action inputs only. The runOn conditions have nothing to match in the ABX console test
+        inputs.update(actionOptionRunOnBlueprintOptionIn="False", actionOptionRunOnPropertyIn="False", awsSesToRecipientABXIn="requester@mydomain.com", deploymentIdABXIn="bench-deployment")
+    else:
+        inputs.update(benchCommon.benchMakePayload(resourceCount, blueprintId=benchBlueprintId))
+    # End Loop
+    actionConfig = engineModule.actionConfigGet(inputs, actionModule.actionFeatures)
+    secretUsed = actionConfig.actionOptionRunOnBlueprintOption and actionConfig.actionOptionUseAwsSecretsManager    # Actions without these options never ask for the secret
+    cspServer.blueprintContent = benchMakeBlueprintContent(resourceCount or 1)
+    benchClearCaches(engineModule)    # Each size starts cold. The first invocation is the warm-up
+
+    def invoke ():
+        if (scenario == "cold"):
+            benchClearCaches(engineModule)
+        # End Loop
+        benchQueueResponses(engineModule, awsStubbers, 1, secretUsed)
+        outputs = actionModule.handler(None, dict(inputs))
+        if (outputs['resp_myActionFunction'].get('send_resp') != "ok"):
+            raise RuntimeError("Benchmark invocation did not send: "+json.dumps(outputs, default=str))
+        # End Loop
+        return outputs
+    # End Function
+
+    invoke()    # Warm-up. Not measured
+    stageTimings = {}
+    for iteration in range(iterations):
+        outputs = invoke()
+        for stage, elapsedMs in outputs['timings'].items():
+            stageTimings.setdefault(stage, []).append(elapsedMs)
+        # End Loop
+    # End Loop
+
+    allocationPeaks = []
+    allocationRetained = []
+    for iteration in range(allocationIterations):
+        outputs, peakBytes, retainedBytes = benchCommon.benchMeasureAllocations(invoke)
+        allocationPeaks.append(peakBytes / 1024.0)
+        allocationRetained.append(retainedBytes / 1024.0)
+    # End Loop
+    for awsStubber in awsStubbers.values():
+        awsStubber.assert_no_pending_responses()
+    # End Loop
+
+    results = {
+        "action": os.path.splitext(actionFile)[0],
+        "resources": "test" if (resourceCount is None) else resourceCount,
+        "scenario": scenario,
+        "iterations": iterations,
+        "stages": {stage: benchCommon.benchSummarize(values) for stage, values in stageTimings.items()},
+        "allocationPeakKiB": benchCommon.benchSummarize(allocationPeaks),
+        "allocationRetainedKiB": benchCommon.benchSummarize(allocationRetained),
+    }
+
+    return results    # Return results
+    # End Function
+
+
+
+def main ():  # Runs the benchmark for each size and prints the report
+    argumentParser = argparse.ArgumentParser(description="Offline benchmark of the awsSesSendEmail ABX handler")
+    argumentParser.add_argument("--actions", default=benchDefaultActions, help="Comma separated ABX action files (default: %(default)s)")
+    argumentParser.add_argument("--sizes", default=benchDefaultSizes, help="Comma separated resource counts (default: %(default)s)")
+    argumentParser.add_argument("--iterations", type=int, default=100, help="Measured invocations per size (default: %(default)s)")
+    argumentParser.add_argument("--allocation-iterations", type=int, default=10, help="Invocations per size run under tracemalloc (default: %(default)s)")
+    argumentParser.add_argument("--scenario", choices=["warm", "cold"], default="warm", help="Keep or clear the container caches between invocations (default: %(default)s)")
+    argumentParser.add_argument("--json", default="", help="Also write the results to this JSON file")
+    arguments = argumentParser.parse_args()
+
+    engineModule = benchCommon.benchLoadEngine()
+    awsStubbers = benchInstallStubs(engineModule)
+    cspServer = benchStartCspServer(1)
+    engineModule.cspBaseApiUrl = "http://127.0.0.1:%d" % cspServer.server_address[1]
+    try:
+        allResults = []
+        for actionFile in [actionFile.strip() for actionFile in arguments.actions.split(',') if actionFile.strip()]:
+            for resourceCount in [None] + [int(size) for size in arguments.sizes.split(',') if size.strip()]:    # TEST payload first
+                allResults.append(benchRunSize(actionFile, engineModule, awsStubbers, cspServer, resourceCount, arguments.iterations, arguments.allocation_iterations, arguments.scenario))
+            # End Loop
+        # End Loop
+    finally:
+        cspServer.shutdown()
+    # End Loop
+
+    for percentile in ("p50", "p99"):
+        rows = []
+        for results in allResults:
+            row = {"action": results['action'], "resources": results['resources']}
+            row.update({stage: results['stages'][stage][percentile] for stage in benchStageColumns if stage in results['stages']})
+            rows.append(row)
+        # End Loop
+        benchCommon.benchPrintTable("Stage latency %s (ms), %s scenario" % (percentile, arguments.scenario), ["action", "resources"] + [stage for stage in benchStageColumns if any(stage in row for row in rows)], rows)
+    # End Loop
+    benchCommon.benchPrintTable("Allocations per invocation (KiB)", ["action", "resources", "peak p50", "peak p99", "retained p50"], [{
+        "action": results['action'],
+        "resources": results['resources'],
+        "peak p50": results['allocationPeakKiB']['p50'],
+        "peak p99": results['allocationPeakKiB']['p99'],
+        "retained p50": results['allocationRetainedKiB']['p50'],
+    } for results in allResults])
+    print("")
+    print("CSP requests served: "+json.dumps(BenchCspRequestHandler.requestCounts, sort_keys=True))
+
+    if (arguments.json):
+        benchCommon.benchWriteJson(arguments.json, {"handler": allResults, "cspRequests": BenchCspRequestHandler.requestCounts})
+    # End Loop
+    # End Function
+
+
+
+if __name__ == "__main__":
+    main()
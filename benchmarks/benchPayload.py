@@ -0,0 +1,294 @@
+#--------------------------------------------------------#
+#                     Spas Kaloferov                     #
+#                   www.kaloferov.com                    #
+# bit.ly/The-Twitter      Social     bit.ly/The-LinkedIn #
+# bit.ly/The-Gitlab        Git         bit.ly/The-Github #
+# bit.ly/The-BSD         License          bit.ly/The-GNU #
+#--------------------------------------------------------#
+
+  #
+  #       VMware Cloud Assembly ABX Code Sample - Benchmarks
+  #
+  # [Description]
+  #   - Payload size regression benchmarks for the per invocation hot paths:
+  #      - payloadIndex: payloadBuildIndex and the one pass flatten of the whole payload, as done for key lookups, e.g. an eventTopicId outside __metadata
+  #      - eventTopic: eventTopicResolve dispatch and eventTopicExtract of the topic fields
+  #      - extract: deploymentId and userName lookups, as done by handler()
+  #      - runOn: runOnRuleEvaluate of exact, glob, regex, path, negated and OR rules, on an index that has resolved their keys and paths
+  #      - runOnFirst: the first rule on a new index, as paid by invocations with one runOnPropertyIn rule. Only its keys are collected
+  #      - lookupPath: eventTopic and extract on a new index, as paid by invocations without runOn rules. Only the looked up paths are resolved
+  #      - hotPath: all of the above, as paid by each invocation with runOn rules
+  #      - v1Scan: the str(inputs) / json.dumps(inputs) scans awsSesSendEmail-py-v1 did before it moved to the shared engine, for reference. Not checked
+  #   - Synthetic payloads vary the number of resources, custom properties and nested metadata depth
+  #   - Results are divided by a fixed calibration workload, so the stored baseline holds on other machines. Each timing of an operation is paired with a timing of the calibration and the median of their ratios is kept. A single calibration varies by +-40% run to run on shared hosts, the paired median by a few percent
+  #   - The baseline records the host it ran on. The check prints a note when it runs on another host. Regenerate the baseline on a quiet host
+  #   - The check fails (exit code 1) when a case is slower than its baseline by more than --threshold and by more than --noise-floor-ms
+  # [Usage]
+  #   - python benchmarks/benchPayload.py                      # Check against benchmarks/benchPayloadBaseline.json
+  #   - python benchmarks/benchPayload.py --update-baseline    # Store the current results as the baseline
+  # [Dependency]
+  #   - Requires: nothing outside the standard library. The engine imports boto3, requests and yaml on first use, which these operations never reach
+  # [Thanks]
+
+
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import benchCommon
+
+
+# ----- Global ----- #
+
+benchBaselinePath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchPayloadBaseline.json")    # Stored baseline
+benchDefaultThreshold = 1.0    # Allowed slowdown over the baseline. 1.0 is 2x. Normalized results still vary by up to 30% run to run on shared single vCPU hosts, while the regressions to catch (e.g. a str(inputs) scan per lookup) are 10x and more
+benchDefaultNoiseFloorMs = 0.01    # Slowdowns smaller than this per call are timer noise. An O(n) scan of a 1000 resource payload costs well above it
+benchTargetSeconds = 0.02    # Each timing loops until it takes about this long
+benchRepeats = 9    # Paired timings of an operation and the calibration workload. The median is kept
+benchPayloadCases = [    # (case, resources, custom properties, metadata depth)
+    ("resources-1", 1, 10, 2),
+    ("resources-10", 10, 10, 2),
+    ("resources-100", 100, 10, 2),
+    ("resources-1000", 1000, 10, 2),
+    ("properties-200", 10, 200, 2),
+    ("metadata-depth-12", 10, 10, 12),
+]
+benchRunOnRules = [    # Rules evaluated by the runOn operation
+    "cloudZoneProp: cas.cloud.zone.type:aws",
+    "customProp*: customvalue1",
+    "cloudZoneProp: re:^cas\\.cloud\\.zone\\.type:(aws|azure)$",
+    "__metadata.targetType: deployment",
+    "!missingProp && cloudZoneProp",
+    "missingProp: x || otherMissingProp: y || cloudZoneProp: cas.cloud.zone.type:azure",
+]
+benchUncheckedOperations = ("v1Scan",)    # Reported only. No action runs these scans anymore
+
+
+# ----- Functions  ----- #
+
+def benchMeasure (operation):  # Returns the median milliseconds per call of an operation, of the calibration workload, and of their ratio. The garbage collector is off while measuring, as in timeit
+    gcWasEnabled = gc.isenabled()
+    gc.disable()
+    try:
+        return benchMeasurePaired(operation)
+    finally:
+        if (gcWasEnabled):
+            gc.enable()
+        # End Loop
+    # End Loop
+    # End Function
+
+
+
+def benchMeasurePaired (operation):  # See benchMeasure. Each timing of the operation is followed by a timing of the calibration workload, so host load changes cancel out in their ratio
+    operationLoops = benchMeasureLoops(operation)
+    calibrationLoops = benchMeasureLoops(benchCalibrationWorkload)
+
+    operationRuns = []
+    calibrationRuns = []
+    for repeat in range(benchRepeats):
+        operationRuns.append(benchTimeLoops(operation, operationLoops))
+        calibrationRuns.append(benchTimeLoops(benchCalibrationWorkload, calibrationLoops))
+    # End Loop
+    ratios = [operationMs / calibrationMs for operationMs, calibrationMs in zip(operationRuns, calibrationRuns)]
+
+    return statistics.median(operationRuns), statistics.median(calibrationRuns), statistics.median(ratios)
+    # End Function
+
+
+
+def benchMeasureLoops (operation):  # Returns the number of calls that take about benchTargetSeconds. The first call is a warm up, e.g. it compiles the runOn rules and resolves their keys
+    operation()
+    loops = 1
+    while True:
+        elapsed = benchTimeLoops(operation, loops) * loops / 1000
+        if (elapsed >= benchTargetSeconds / 5):
+            break
+        # End Loop
+        loops *= 2
+    # End Loop
+
+    return max(1, int(loops * benchTargetSeconds / max(elapsed, 1e-9)))    # Return loops
+    # End Function
+
+
+
+def benchTimeLoops (operation, loops):  # Returns the milliseconds per call of the operation, called loops times
+    startTime = time.perf_counter()
+    for loop in range(loops):
+        operation()
+    # End Loop
+
+    return (time.perf_counter() - startTime) * 1000 / loops
+    # End Function
+
+
+
+benchCalibrationData = {"key%d" % index: {"value": index, "items": list(range(10))} for index in range(200)}    # Input of the calibration workload
+
+def benchCalibrationWorkload ():  # Fixed pure Python workload. Results are reported as multiples of it
+    total = 0
+    for key, value in benchCalibrationData.items():
+        total += len(key) + sum(value['items']) + len(str(value['value']).lower())
+    # End Loop
+    return total
+    # End Function
+
+
+
+def benchOperations (engineModule, payload):  # Returns the benchmarked operations for one payload
+    payloadIndex = engineModule.payloadBuildIndex(payload)
+
+    def extract (payloadIndex):
+        deploymentId = payloadIndex['paths'].get('deploymentId', "")
+        userName = payloadIndex['paths'].get('__metadata.userName', "")
+        return deploymentId, userName
+    # End Function
+
+    def runOn (payloadIndex):
+        return [engineModule.runOnRuleEvaluate(runOnRule, payloadIndex) for runOnRule in benchRunOnRules]
+    # End Function
+
+    def eventTopic (payloadIndex):
+        eventTopicId, eventTopic = engineModule.eventTopicResolve(payloadIndex)
+        return eventTopicId, engineModule.eventTopicExtract(eventTopic, payloadIndex)
+    # End Function
+
+    def lookupPath ():
+        lookupPathIndex = engineModule.payloadBuildIndex(payload)
+        return eventTopic(lookupPathIndex), extract(lookupPathIndex)
+    # End Function
+
+    def hotPath ():
+        hotPathIndex = engineModule.payloadBuildIndex(payload)
+        return eventTopic(hotPathIndex), extract(hotPathIndex), runOn(hotPathIndex)
+    # End Function
+
+    def v1Scan ():    # Same expressions as the awsSesSendEmail-py-v1 handler() before the shared engine
+        eventTopicPost = (str(payload).count('deployment.request.post') == 1)
+        eventTopicMissing = (str(payload).count("eventTopicId") == 0)
+        deploymentIdPresent = (str(payload).count("'deploymentId':") != 0)
+        userNamePresent = (str(payload).count("userName") != 0)
+        runOnPorpertyMatch = (json.dumps(payload)).replace('"','').lower()
+        return eventTopicPost, eventTopicMissing, deploymentIdPresent, userNamePresent, [runOnRule in runOnPorpertyMatch for runOnRule in benchRunOnRules]
+    # End Function
+
+    operations = {
+        "payloadIndex": lambda: engineModule.payloadBuildIndex(payload)['keys'],
+        "eventTopic": lambda: eventTopic(payloadIndex),
+        "extract": lambda: extract(payloadIndex),
+        "runOn": lambda: runOn(payloadIndex),
+        "runOnFirst": lambda: engineModule.runOnRuleEvaluate(benchRunOnRules[0], engineModule.payloadBuildIndex(payload)),
+        "lookupPath": lookupPath,
+        "hotPath": hotPath,
+        "v1Scan": v1Scan,
+    }
+
+    return operations    # Return operations
+    # End Function
+
+
+
+def benchRun (engineModule):  # Measures every operation of every case. Returns case -> operation -> milliseconds, case -> operation -> normalized and case -> median calibration milliseconds
+    results = {}
+    normalizedResults = {}
+    calibrations = {}
+    for case, resourceCount, propertyCount, metadataDepth in benchPayloadCases:
+        payload = benchCommon.benchMakePayload(resourceCount, propertyCount=propertyCount, metadataDepth=metadataDepth)
+        engineModule.runOnRuleCache.clear()    # Rules compile on the first call of each case, as in a new container
+        results[case] = {}
+        normalizedResults[case] = {}
+        calibrationRuns = []
+        for operation, function in benchOperations(engineModule, payload).items():
+            results[case][operation], calibrationMs, normalizedResults[case][operation] = benchMeasure(function)
+            calibrationRuns.append(calibrationMs)
+        # End Loop
+        calibrations[case] = statistics.median(calibrationRuns)    # Reported only. The normalized results use the calibration timings next to each operation
+    # End Loop
+
+    return results, normalizedResults, calibrations
+    # End Function
+
+
+
+def benchCheck (results, normalizedResults, calibrations, baseline, threshold, noiseFloorMs):  # Compares normalized results with the baseline. Returns the report rows and the regressions
+    rows = []
+    regressions = []
+    for case, operations in results.items():
+        calibrationMs = calibrations[case]
+        for operation, elapsedMs in operations.items():
+            normalized = normalizedResults[case][operation]
+            baselineNormalized = baseline.get('normalized', {}).get(case, {}).get(operation)
+            row = {"case": case, "operation": operation, "ms": elapsedMs, "normalized": normalized, "baseline": "", "change": ""}
+            if (baselineNormalized):
+                change = normalized / baselineNormalized - 1
+                row['baseline'] = baselineNormalized
+                row['change'] = "%+.0f%%" % (change * 100)
+                if ((change > threshold) and ((normalized - baselineNormalized) * calibrationMs > noiseFloorMs) and (operation not in benchUncheckedOperations)):
+                    row['change'] += " REGRESSION"
+                    regressions.append(row)
+                # End Loop
+            # End Loop
+            rows.append(row)
+        # End Loop
+    # End Loop
+
+    return rows, regressions
+    # End Function
+
+
+
+def main ():  # Runs the benchmarks, prints the report and checks or updates the baseline
+    argumentParser = argparse.ArgumentParser(description="Payload size regression benchmarks for event detection, extraction and runOn evaluation")
+    argumentParser.add_argument("--baseline", default=benchBaselinePath, help="Baseline file (default: %(default)s)")
+    argumentParser.add_argument("--threshold", type=float, default=benchDefaultThreshold, help="Allowed slowdown, 1.0 is 2x (default: %(default)s)")
+    argumentParser.add_argument("--noise-floor-ms", type=float, default=benchDefaultNoiseFloorMs, help="Ignore slowdowns below this many ms per call (default: %(default)s)")
+    argumentParser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline instead of checking")
+    argumentParser.add_argument("--json", default="", help="Also write the results to this JSON file")
+    arguments = argumentParser.parse_args()
+
+    engineModule = benchCommon.benchLoadEngine()    # The v1 and v2 actions share these hot paths
+    engineModule.actionLogConfigure(engineModule.actionConfigGet({"actionLogLevelIn": "OFF"}))
+    results, normalizedResults, calibrations = benchRun(engineModule)
+
+    hostInfo = benchCommon.benchHostInfo()
+
+    if (arguments.update_baseline):
+        benchCommon.benchWriteJson(arguments.baseline, {"host": hostInfo, "calibrationMs": calibrations, "normalized": normalizedResults, "ms": results})
+        baseline = {}
+    elif (os.path.exists(arguments.baseline)):
+        with open(arguments.baseline) as baselineFile:
+            baseline = json.load(baselineFile)
+        # End Loop
+        if (baseline.get('host') != hostInfo):
+            print("Baseline recorded on another host: "+json.dumps(baseline.get('host'), sort_keys=True))
+            print("This host: "+json.dumps(hostInfo, sort_keys=True))
+        # End Loop
+    else:
+        print("No baseline at "+arguments.baseline+". Run with --update-baseline to create it.")
+        baseline = {}
+    # End Loop
+
+    rows, regressions = benchCheck(results, normalizedResults, calibrations, baseline, arguments.threshold, arguments.noise_floor_ms)
+    benchCommon.benchPrintTable("Payload hot paths (ms per call, normalized to the calibration workload)", ["case", "operation", "ms", "normalized", "baseline", "change"], rows)
+    if (arguments.json):
+        benchCommon.benchWriteJson(arguments.json, {"host": hostInfo, "calibrationMs": calibrations, "normalized": normalizedResults, "ms": results})
+    # End Loop
+
+    if (arguments.update_baseline):
+        print("")
+        print("Baseline written to "+arguments.baseline)
+    elif (regressions):
+        print("")
+        print("%d regression(s) above %.0f%%." % (len(regressions), arguments.threshold * 100))
+        sys.exit(1)
+    # End Loop
+    # End Function
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#--------------------------------------------------------#
+#                     Spas Kaloferov                     #
+#                   www.kaloferov.com                    #
+# bit.ly/The-Twitter      Social     bit.ly/The-LinkedIn #
+# bit.ly/The-Gitlab        Git         bit.ly/The-Github #
+# bit.ly/The-BSD         License          bit.ly/The-GNU #
+#--------------------------------------------------------#
+
+  #
+  #       VMware Cloud Assembly ABX Code Sample - Tests
+  #
+  # [Description]
+  #   - Offline tests of the action input parsing of awsSesSendEmailCore. Typed values, bad values, placeholders, action features and the config cache
+  # [Usage]
+  #   - python -m unittest discover -s tests
+  # [Thanks]
+
+
+import unittest
+
+import testCommon
+
+
+# ----- Global ----- #
+
+testRequiredInputs = {"awsSesRegionIn": "us-west-2", "awsSesSenderIn": "no-reply@mydomain.com"}    # Required action inputs
+
+
+# ----- Tests ----- #
+
+class testActionConfig (unittest.TestCase):  # actionConfigGet, actionConfigParse and the actionInputParse functions
+
+    def setUp (self):  # Empty config cache
+        self.engineModule = testCommon.testPatchEngine(self, testCommon.testFakeSes())
+        self.engineModule.actionConfigCache.clear()
+        self.addCleanup(self.engineModule.actionConfigCache.clear)
+    # End Function
+
+    def configTest (self, actionFeatures=None, **inputs):  # actionConfigParse of the required and given inputs
+        return self.engineModule.actionConfigParse(dict(testRequiredInputs, **inputs), actionFeatures)
+    # End Function
+
+    def testValidValues (self):  # Values are unquoted and typed. Bools and choices in any case, timeouts clamped
+        actionConfig = self.configTest(actionOptionOutboxIn=' "True" ', awsSesMaxSendAttemptsIn="'5'", httpMaxRetriesIn="0", awsSmSecretCacheTtlIn="2.5", actionLogLevelIn="debug", actionStageTimeoutIn="999", runOnPropertyIn='"cloudZoneProp: AWS"')
+        self.assertEqual(actionConfig.errors, ())
+        self.assertEqual((actionConfig.actionOptionOutbox, actionConfig.awsSesMaxSendAttempts, actionConfig.httpMaxRetries, actionConfig.awsSmSecretCacheTtl), (True, 5, 0, 2.5))
+        self.assertEqual((actionConfig.actionLogLevel, actionConfig.actionStageTimeout, actionConfig.runOnProperty), ("DEBUG", self.engineModule.actionMaxStageTimeoutSeconds, "cloudzoneprop: aws"))
+    # End Function
+
+    def testBadValues (self):  # Bad values get the default and one entry in errors each. The run goes on
+        badInputs = {"actionOptionOutboxIn": "yes", "awsSesMaxSendAttemptsIn": "0", "httpMaxRetriesIn": "1.5", "awsSmSecretCacheTtlIn": "-1", "digestWindowIn": "nan", "httpPoolSizeIn": "ten", "actionLogLevelIn": "VERBOSE"}
+        actionConfig = self.configTest(**badInputs)
+        defaultConfig = self.configTest()
+        for attribute in ("actionOptionOutbox", "awsSesMaxSendAttempts", "httpMaxRetries", "awsSmSecretCacheTtl", "digestWindow", "httpPoolSize", "actionLogLevel"):
+            self.assertEqual(getattr(actionConfig, attribute), getattr(defaultConfig, attribute), attribute)
+        # End Loop
+        self.assertEqual(sorted(error.split(":")[0] for error in actionConfig.errors), sorted(badInputs))
+        self.assertIn("expected one of DEBUG", [error for error in actionConfig.errors if error.startswith("actionLogLevelIn")][0])
+    # End Function
+
+    def testRequired (self):  # Missing required inputs are reported. A placeholder counts as missing
+        actionConfig = self.engineModule.actionConfigParse({"awsSesRegionIn": "<Required>"})
+        self.assertEqual(actionConfig.errors, ("awsSesRegionIn is required.", "awsSesSenderIn is required."))
+        self.assertEqual(actionConfig.awsSesRegion, "")
+    # End Function
+
+    def testPlaceholders (self):  # Placeholders unset the input only when they are the whole value
+        for placeholder in ("<Optional>", "'empty'", " Optional ", '""', None):
+            self.assertEqual(self.configTest(awsSesCcRecipientIn=placeholder).awsSesCcRecipient, "", placeholder)
+        # End Loop
+        self.assertEqual(self.configTest(awsSesCcRecipientIn="empty-bucket@mydomain.com").awsSesCcRecipient, "empty-bucket@mydomain.com")
+        self.assertEqual(self.configTest(awsSmVersionStageIn="<Optional>").awsSmVersionStage, self.engineModule.awsSmDefaultVersionStage)
+    # End Function
+
+    def testActionFeatures (self):  # Action options not selected by the calling action are off, whatever the input
+        self.assertTrue(self.configTest(actionOptionOutboxIn="True").actionOptionOutbox)
+        self.assertFalse(self.configTest(("actionOptionDigest",), actionOptionOutboxIn="True").actionOptionOutbox)
+        self.assertTrue(self.configTest(("actionOptionOutbox",), actionOptionOutboxIn="True").actionOptionOutbox)
+        self.assertEqual(self.configTest(("actionOptionDigest",), actionOptionOutboxIn="maybe").errors, ())    # Not parsed
+    # End Function
+
+    def testConfigCached (self):  # One parse per action inputs and features. Payload keys are not part of the key
+        inputs = dict(testRequiredInputs, actionLogLevelIn="OFF")
+        actionConfig = self.engineModule.actionConfigGet(inputs)
+        self.assertIs(self.engineModule.actionConfigGet(dict(inputs, deploymentName="d1")), actionConfig)
+        self.assertIsNot(self.engineModule.actionConfigGet(dict(inputs, actionLogLevelIn="ERROR")), actionConfig)
+        self.assertIsNot(self.engineModule.actionConfigGet(inputs, ["actionOptionOutbox"]), actionConfig)
+        self.assertIs(self.engineModule.actionConfigGet(inputs, ["actionOptionOutbox"]), self.engineModule.actionConfigGet(inputs, ("actionOptionOutbox",)))
+        self.assertEqual(len(self.engineModule.actionConfigCache), 3)
+        self.assertEqual(self.engineModule.actionConfigGet(dict(inputs, awsSesCcRecipientIn=["dev1@mydomain.com"])).errors, ())    # Unhashable. Parsed, not cached
+        self.assertEqual(len(self.engineModule.actionConfigCache), 3)
+        self.assertRaises(AttributeError, setattr, actionConfig, "actionLogLevel", "DEBUG")
+    # End Function
+
+    def testConfigCacheEviction (self):  # At most actionConfigCacheMaxSize configs. The least recently used is dropped
+        actionConfigs = [self.engineModule.actionConfigGet(dict(testRequiredInputs, deploymentIdABXIn="d%d" % configNumber)) for configNumber in range(self.engineModule.actionConfigCacheMaxSize + 1)]
+        self.assertEqual(len(self.engineModule.actionConfigCache), self.engineModule.actionConfigCacheMaxSize)
+        self.assertIsNot(self.engineModule.actionConfigGet(dict(testRequiredInputs, deploymentIdABXIn="d0")), actionConfigs[0])
+        self.assertIs(self.engineModule.actionConfigGet(dict(testRequiredInputs, deploymentIdABXIn="d2")), actionConfigs[2])
+    # End Function
+
+# End Class
+
+
+if __name__ == "__main__":
+    unittest.main()
+# End Loop
@@ -0,0 +1,94 @@
+#--------------------------------------------------------#
+#                     Spas Kaloferov                     #
+#                   www.kaloferov.com                    #
+# bit.ly/The-Twitter      Social     bit.ly/The-LinkedIn #
+# bit.ly/The-Gitlab        Git         bit.ly/The-Github #
+# bit.ly/The-BSD         License          bit.ly/The-GNU #
+#--------------------------------------------------------#
+
+  #
+  #       VMware Cloud Assembly ABX Code Sample - Tests
+  #
+  # [Description]
+  #   - Offline tests of the run context of awsSesSendEmailCore. Log level and stage timings per run, also for concurrent runs and pool threads
+  # [Usage]
+  #   - python -m unittest discover -s tests
+  # [Thanks]
+
+
+import io
+import threading
+import contextlib
+import contextvars
+import unittest
+
+import testCommon
+
+
+# ----- Tests ----- #
+
+class testActionRun (unittest.TestCase):  # actionRun, ActionRunContext, actionSubmit, actionLog and the stage timings
+
+    def setUp (self):  # Fake SES
+        self.awsSesClient = testCommon.testFakeSes()
+        self.engineModule = testCommon.testPatchEngine(self, self.awsSesClient)
+    # End Function
+
+    def runInContext (self, actionLogLevel, function, *args):  # Calls the function in a run context of its own, as actionRun does
+        def runContextTest ():
+            self.engineModule.actionRunContext.set(self.engineModule.ActionRunContext(self.engineModule.actionConfigGet({"actionLogLevelIn": actionLogLevel})))
+            return function(*args)
+        # End Function
+        return contextvars.copy_context().run(runContextTest)
+    # End Function
+
+    def testRunContextEndsWithRun (self):  # A run returns its own timings. Its log level and timings do not outlive it
+        actionOutputs = self.engineModule.actionRun(None, testCommon.testActionInputs(self, actionLogLevelIn="ERROR"))
+        self.assertIn("payloadIndex", actionOutputs['timings'])
+        self.assertIsNone(self.engineModule.actionRunContext.get())
+        self.assertEqual(self.engineModule.actionLogLevel, self.engineModule.actionLogLevels['OFF'])    # Set by testPatchEngine
+        self.assertEqual(self.engineModule.actionTimingsSnapshot(), {})
+    # End Function
+
+    def testPoolThreadsRecordToTheirRun (self):  # Stages submitted with actionSubmit record their timings in the run that submitted them
+        def runTest ():
+            self.engineModule.actionSubmit(self.engineModule.actionTimingAdd, "poolStage", 2.0).result()
+            self.engineModule.actionTimingAdd("poolStage", 1.0)
+            return self.engineModule.actionTimingsSnapshot()
+        # End Function
+        self.assertEqual(self.runInContext("OFF", runTest), {"poolStage": 3.0})
+    # End Function
+
+    def testConcurrentRunsKeepTheirOwn (self):  # Two runs at the same time keep their own log level and timings
+        runBarrier = threading.Barrier(2)
+        runTimings = {}
+
+        def runTest (runName):
+            runBarrier.wait()    # Both run contexts are set
+            self.engineModule.actionLog("DEBUG", "runTest -", "Logged by "+runName)
+            self.engineModule.actionTimingAdd(runName, 1.0)
+            runBarrier.wait()    # Both runs recorded
+            runTimings[runName] = self.engineModule.actionTimingsSnapshot()
+        # End Function
+
+        logOutput = io.StringIO()
+        with contextlib.redirect_stdout(logOutput):
+            runThreads = [threading.Thread(target=self.runInContext, args=(actionLogLevel, runTest, runName)) for runName, actionLogLevel in (("debugRun", "DEBUG"), ("quietRun", "OFF"))]
+            for runThread in runThreads:
+                runThread.start()
+            # End Loop
+            for runThread in runThreads:
+                runThread.join()
+            # End Loop
+        # End Loop
+        self.assertIn("Logged by debugRun", logOutput.getvalue())
+        self.assertNotIn("Logged by quietRun", logOutput.getvalue())
+        self.assertEqual(runTimings, {"debugRun": {"debugRun": 1.0}, "quietRun": {"quietRun": 1.0}})
+    # End Function
+
+# End Class
+
+
+if __name__ == "__main__":
+    unittest.main()
+# End Loop
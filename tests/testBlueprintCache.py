@@ -0,0 +1,102 @@
+#--------------------------------------------------------#
+#                     Spas Kaloferov                     #
+#                   www.kaloferov.com                    #
+# bit.ly/The-Twitter      Social     bit.ly/The-LinkedIn #
+# bit.ly/The-Gitlab        Git         bit.ly/The-Github #
+# bit.ly/The-BSD         License          bit.ly/The-GNU #
+#--------------------------------------------------------#
+
+  #
+  #       VMware Cloud Assembly ABX Code Sample - Tests
+  #
+  # [Description]
+  #   - Offline tests of the blueprint options cache of awsSesSendEmailCore. Fake CSP session. Nothing is called
+  # [Usage]
+  #   - python -m unittest discover -s tests
+  # [Thanks]
+
+
+import unittest
+
+import testCommon
+
+
+# ----- Tests ----- #
+
+class testBlueprintCache (unittest.TestCase):  # cspGetBlueprintOptions. Fresh window, ETag and updatedAt revalidation, LRU eviction
+
+    def setUp (self):  # Fake CSP session with one blueprint and an empty options cache
+        self.engineModule = testCommon.testPatchEngine(self, testCommon.testFakeSes())
+        self.cspSession = testCommon.testPatchCsp(self, self.engineModule, testCommon.testFakeCspSession())
+        self.blueprintSet("bp-1", "v1", etag='"etag-1"')
+        self.actionConfig = self.engineModule.actionConfigGet({"actionLogLevelIn": "OFF"})
+    # End Function
+
+    def blueprintSet (self, blueprintId, optionValue, etag="", updatedAt="2026-01-01T00:00:00Z"):  # Serves a blueprint with one option
+        self.cspSession.blueprints[blueprintId] = {"content": "formatVersion: 1\noptions:\n  emailTemplate: "+optionValue+"\nresources: {}\n", "updatedAt": updatedAt, "etag": etag}
+    # End Function
+
+    def blueprintOptionsTest (self, blueprintId="bp-1"):  # cspGetBlueprintOptions with the test headers
+        return self.engineModule.cspGetBlueprintOptions(None, {}, self.actionConfig, {"cspRequestsHeaders": {"Authorization": "Bearer test"}}, blueprintId)
+    # End Function
+
+    def blueprintAge (self, blueprintId="bp-1"):  # Moves the cached options out of the fresh window
+        self.engineModule.blueprintOptionsCache[blueprintId]['checkedAt'] -= self.engineModule.blueprintOptionsCacheFreshSeconds
+    # End Function
+
+    def testFreshHit (self):  # Options are fetched once and reused without a call inside the fresh window
+        self.assertEqual(self.blueprintOptionsTest(), {"blueprintOptions": {"emailTemplate": "v1"}, "cacheStatus": "miss"})
+        self.assertEqual(self.blueprintOptionsTest(), {"blueprintOptions": {"emailTemplate": "v1"}, "cacheStatus": "hit"})
+        self.assertEqual(len(self.cspSession.requests), 1)
+        self.assertIn("$select=content,updatedAt", self.cspSession.requests[0][0])
+    # End Function
+
+    def testEtagRevalidated (self):  # After the fresh window a conditional GET with the cached ETag. 304 keeps the options and restarts the window
+        self.blueprintOptionsTest()
+        self.blueprintAge()
+        self.assertEqual(self.blueprintOptionsTest()['cacheStatus'], "revalidated")
+        self.assertEqual(self.cspSession.requests[-1][1]['If-None-Match'], '"etag-1"')
+        self.assertEqual(self.blueprintOptionsTest()['cacheStatus'], "hit")
+        self.assertEqual(len(self.cspSession.requests), 2)
+    # End Function
+
+    def testEtagChanged (self):  # A changed blueprint answers the conditional GET with its content. No second call is made
+        self.blueprintOptionsTest()
+        self.blueprintSet("bp-1", "v2", etag='"etag-2"')
+        self.blueprintAge()
+        self.assertEqual(self.blueprintOptionsTest(), {"blueprintOptions": {"emailTemplate": "v2"}, "cacheStatus": "miss"})
+        self.assertEqual(len(self.cspSession.requests), 2)
+        self.assertEqual(self.engineModule.blueprintOptionsCache["bp-1"]['etag'], '"etag-2"')
+    # End Function
+
+    def testUpdatedAtRevalidated (self):  # Without an ETag the updatedAt of a minimal select decides. The content is fetched only when it changed
+        self.blueprintSet("bp-1", "v1")
+        self.blueprintOptionsTest()
+        self.blueprintAge()
+        self.assertEqual(self.blueprintOptionsTest()['cacheStatus'], "revalidated")
+        self.assertIn("$select=id,updatedAt", self.cspSession.requests[-1][0])
+        self.blueprintSet("bp-1", "v2", updatedAt="2026-02-01T00:00:00Z")
+        self.blueprintAge()
+        self.assertEqual(self.blueprintOptionsTest(), {"blueprintOptions": {"emailTemplate": "v2"}, "cacheStatus": "miss"})
+        self.assertEqual([url.split("?")[1].split("&")[0] for url, headers in self.cspSession.requests], ["$select=content,updatedAt", "$select=id,updatedAt", "$select=id,updatedAt", "$select=content,updatedAt"])
+    # End Function
+
+    def testLruEviction (self):  # The least recently used blueprint is evicted past blueprintOptionsCacheMaxSize
+        self.addCleanup(setattr, self.engineModule, "blueprintOptionsCacheMaxSize", self.engineModule.blueprintOptionsCacheMaxSize)
+        self.engineModule.blueprintOptionsCacheMaxSize = 2
+        for blueprintId in ("bp-2", "bp-3"):
+            self.blueprintSet(blueprintId, blueprintId)
+        # End Loop
+        self.blueprintOptionsTest("bp-1")
+        self.blueprintOptionsTest("bp-2")
+        self.blueprintOptionsTest("bp-1")    # bp-2 is now the least recently used
+        self.blueprintOptionsTest("bp-3")
+        self.assertEqual(list(self.engineModule.blueprintOptionsCache), ["bp-1", "bp-3"])
+    # End Function
+
+# End Class
+
+
+if __name__ == "__main__":
+    unittest.main()
+# End Loop
@@ -0,0 +1,62 @@
+#--------------------------------------------------------#
+#                     Spas Kaloferov                     #
+#                   www.kaloferov.com                    #
+# bit.ly/The-Twitter      Social     bit.ly/The-LinkedIn #
+# bit.ly/The-Gitlab        Git         bit.ly/The-Github #
+# bit.ly/The-BSD         License          bit.ly/The-GNU #
+#--------------------------------------------------------#
+
+  #
+  #       VMware Cloud Assembly ABX Code Sample - Tests
+  #
+  # [Description]
+  #   - Offline tests of the streaming extraction of the blueprint options of awsSesSendEmailCore
+  # [Usage]
+  #   - python -m unittest discover -s tests
+  # [Thanks]
+
+
+import unittest
+
+import testCommon
+
+
+# ----- Tests ----- #
+
+class testBlueprintYaml (unittest.TestCase):  # blueprintYamlGetOptions
+
+    def setUp (self):  # Engine with logging off
+        self.engineModule = testCommon.testPatchEngine(self, testCommon.testFakeSes())
+        self.yaml = self.engineModule.actionImport("yaml")
+    # End Function
+
+    def testOptionsExtracted (self):  # The options block is returned as parsed by a full load. Keys around it are skipped
+        blueprintContent = "formatVersion: 1\ninputs:\n  count: {type: integer, default: 1}\noptions:\n  emailTemplate: custom\n  recipients: [dev1@mydomain.com, dev2@mydomain.com]\n  limits: {retries: 3, enabled: true}\nresources:\n  vm: {type: Cloud.Machine}\n"
+        self.assertEqual(self.engineModule.blueprintYamlGetOptions(blueprintContent), self.yaml.safe_load(blueprintContent)['options'])
+    # End Function
+
+    def testStopsAfterOptions (self):  # The content after the options block is not parsed
+        self.assertEqual(self.engineModule.blueprintYamlGetOptions("options:\n  emailTemplate: custom\nresources: [not closed\n"), {"emailTemplate": "custom"})
+    # End Function
+
+    def testNoOptions (self):  # Empty content, a blueprint without options, empty options and a top level list have no options
+        for blueprintContent in ("", "formatVersion: 1\nresources: {}\n", "options:\nresources: {}\n", "- options\n"):
+            self.assertEqual(self.engineModule.blueprintYamlGetOptions(blueprintContent), {}, blueprintContent)
+        # End Loop
+    # End Function
+
+    def testAliasFallback (self):  # Options using an anchor defined outside of the block fall back to a full parse
+        blueprintContent = "inputs:\n  shared: &shared {emailTemplate: custom}\noptions:\n  defaults: *shared\n"
+        self.assertEqual(self.engineModule.blueprintYamlGetOptions(blueprintContent), {"defaults": {"emailTemplate": "custom"}})
+    # End Function
+
+    def testUnsafeTagsRejected (self):  # Blueprints are loaded with the safe loader
+        self.assertRaises(self.yaml.YAMLError, self.engineModule.blueprintYamlGetOptions, "options:\n  emailTemplate: !!python/object/apply:os.getcwd []\n")
+    # End Function
+
+# End Class
+
+
+if __name__ == "__main__":
+    unittest.main()
+# End Loop
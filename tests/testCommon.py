@@ -0,0 +1,232 @@
+#--------------------------------------------------------#
+#                     Spas Kaloferov                     #
+#                   www.kaloferov.com                    #
+# bit.ly/The-Twitter      Social     bit.ly/The-LinkedIn #
+# bit.ly/The-Gitlab        Git         bit.ly/The-Github #
+# bit.ly/The-BSD         License          bit.ly/The-GNU #
+#--------------------------------------------------------#
+
+  #
+  #       VMware Cloud Assembly ABX Code Sample - Tests
+  #
+  # [Description]
+  #   - Helpers shared by the offline tests in this folder:
+  #      - Loads awsSesSendEmailCore, the engine shared by the actions
+  #      - Fake SES client and ClientError patched into the engine. Nothing is sent
+  #      - Fake CSP session and Secrets Manager client patched into the engine, with the warm container caches cleared. Nothing is called
+  #      - Action inputs of a run with a temporary outbox spool and digest store
+  # [Thanks]
+
+
+import os
+import sys
+import json
+import time
+import base64
+import shutil
+import tempfile
+import importlib
+
+
+# ----- Global ----- #
+
+testRepoDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))    # Folder of the ABX action files
+
+
+# ----- Functions  ----- #
+
+def testLoadEngine ():  # Returns the awsSesSendEmailCore engine module. Imported from the repository folder, once per process
+    if (testRepoDir not in sys.path):
+        sys.path.insert(0, testRepoDir)
+    # End Loop
+
+    return importlib.import_module("awsSesSendEmailCore")    # Return module
+    # End Function
+
+
+
+def testPatchEngine (testCase, awsSesClient):  # Returns the engine with awsGetClient returning the fake client for every service. Restored when the test ends
+    engineModule = testLoadEngine()
+    engineModule.actionLogConfigure(engineModule.actionConfigGet({"actionLogLevelIn": "OFF"}))
+    for attribute, value in (("awsGetClient", lambda context, inputs, actionConfig, awsServiceName, awsRegionName: awsSesClient), ("ClientError", testFakeClientError), ("BotoCoreError", testFakeBotoCoreError)):
+        testCase.addCleanup(setattr, engineModule, attribute, getattr(engineModule, attribute))
+        setattr(engineModule, attribute, value)
+    # End Loop
+    engineModule.awsSesRateBuckets.clear()
+
+    return engineModule    # Return module
+    # End Function
+
+
+
+def testPatchCsp (testCase, engineModule, cspSession):  # Patches cspGetHttpSession to return the fake session and clears the CSP token and blueprint options caches. Restored when the test ends
+    testCase.addCleanup(setattr, engineModule, "cspGetHttpSession", engineModule.cspGetHttpSession)
+    engineModule.cspGetHttpSession = lambda context, inputs, actionConfig: cspSession
+    for cspCache in (engineModule.cspTokenCache, engineModule.blueprintOptionsCache):
+        cspCache.clear()
+        testCase.addCleanup(cspCache.clear)
+    # End Loop
+
+    return cspSession    # Return session
+    # End Function
+
+
+
+def testPatchSecrets (testCase, engineModule):  # Clears the Secrets Manager cache and its counters. Restored when the test ends
+    engineModule.awsSmSecretCache.clear()
+    testCase.addCleanup(engineModule.awsSmSecretCache.clear)
+    testCase.addCleanup(engineModule.awsSmSecretCacheStats.update, dict(engineModule.awsSmSecretCacheStats))
+    engineModule.awsSmSecretCacheStats.update({"hits": 0, "misses": 0, "invalidations": 0})
+
+    return engineModule.awsSmSecretCacheStats    # Return counters
+    # End Function
+
+
+
+def testMakeBearerToken (expiresAt):  # Returns an unsigned JWT with an exp claim. The action only reads exp
+    def encode (value):
+        return base64.urlsafe_b64encode(json.dumps(value).encode('utf-8')).decode('ascii').rstrip('=')
+    # End Function
+
+    return encode({"alg": "none"})+"."+encode({"exp": int(expiresAt)})+".signature"    # Return token
+    # End Function
+
+
+
+def testActionInputs (testCase, **overrides):  # Returns the action inputs of an ABX console TEST run, with the outbox spool and digest store in a temporary folder
+    storeDir = tempfile.mkdtemp(prefix="abxTest")
+    testCase.addCleanup(shutil.rmtree, storeDir, True)
+    inputs = {
+        "awsSesRegionIn": "us-west-2",
+        "awsSesSenderIn": "no-reply@mydomain.com",
+        "awsSesToRecipientABXIn": "requester@mydomain.com",
+        "deploymentIdABXIn": "test-deployment",
+        "actionOptionRunOnPropertyIn": "False",
+        "actionOptionRunOnBlueprintOptionIn": "False",
+        "actionLogLevelIn": "OFF",
+        "outboxSpoolPathIn": os.path.join(storeDir, "outbox.sqlite3"),
+        "digestStorePathIn": os.path.join(storeDir, "digest.sqlite3"),
+    }
+    inputs.update(overrides)
+
+    return inputs    # Return inputs
+    # End Function
+
+
+# ----- Fakes ----- #
+
+class testFakeClientError (Exception):  # Shaped like botocore ClientError
+    def __init__ (self, code, httpStatusCode=400):
+        Exception.__init__(self, code)
+        self.response = {"Error": {"Code": code, "Message": code}, "ResponseMetadata": {"HTTPStatusCode": httpStatusCode}}
+    # End Function
+# End Class
+
+
+
+class testFakeBotoCoreError (Exception):  # Shaped like botocore BotoCoreError, e.g. EndpointConnectionError
+    pass
+# End Class
+
+
+
+class testFakeHttpResponse (object):  # Shaped like a requests response
+    def __init__ (self, statusCode, body, headers=None):
+        self.status_code = statusCode
+        self.text = "" if (body is None) else json.dumps(body)
+        self.headers = headers or {}
+    # End Function
+# End Class
+
+
+
+class testFakeCspSession (object):  # requests session for the CSP calls. Logins get a token valid for tokenLifetime seconds, or a 401 while loginFailures is set. Blueprints are served from blueprints
+    def __init__ (self, tokenLifetime=1800, loginDelay=0):
+        self.tokenLifetime = tokenLifetime
+        self.loginDelay = loginDelay
+        self.loginFailures = 0
+        self.logins = []
+        self.blueprints = {}    # Blueprint id -> content, updatedAt and etag. An empty etag sends no ETag header
+        self.requests = []    # (url, headers) of each GET
+    # End Function
+
+    def get (self, url, data=None, verify=True, headers=None):
+        self.requests.append((url, dict(headers or {})))
+        blueprint = self.blueprints.get(url.split("/blueprints/")[-1].split("?")[0])
+        if (blueprint is None):
+            return testFakeHttpResponse(404, {"message": "Blueprint not found"})
+        elif ((blueprint['etag'] != "") and ((headers or {}).get('If-None-Match') == blueprint['etag'])):
+            return testFakeHttpResponse(304, None)
+        elif ("$select=id,updatedAt" in url):
+            return testFakeHttpResponse(200, {"id": url, "updatedAt": blueprint['updatedAt']})
+        # End Loop
+        return testFakeHttpResponse(200, {"content": blueprint['content'], "updatedAt": blueprint['updatedAt']}, {"ETag": blueprint['etag']} if (blueprint['etag'] != "") else {})
+    # End Function
+
+    def post (self, url, data=None, **kwargs):
+        self.logins.append(json.loads(data)['refreshToken'])
+        time.sleep(self.loginDelay)
+        if (self.loginFailures):
+            self.loginFailures -= 1
+            return testFakeHttpResponse(401, {"message": "Invalid refresh token"})
+        # End Loop
+        return testFakeHttpResponse(200, {"token": testMakeBearerToken(time.time() + self.tokenLifetime)})
+    # End Function
+# End Class
+
+
+
+class testFakeSecretsManager (object):  # secretsmanager client. secrets holds the secret string of each version stage. Records the lookups
+    def __init__ (self, secrets=None):
+        self.secrets = dict(secrets or {})
+        self.lookups = []
+    # End Function
+
+    def get_secret_value (self, SecretId, VersionStage):
+        self.lookups.append((SecretId, VersionStage))
+        return {"SecretString": json.dumps({SecretId: self.secrets[VersionStage]}, separators=(",", ":")), "VersionId": "version-%d" % len(self.lookups)}    # Compact, as returned by AWS
+    # End Function
+# End Class
+
+
+
+class testFakeSes (object):  # ses and sesv2 client. Records the sends. Sends fail while failures holds error codes or exceptions
+    def __init__ (self, suppressed=()):
+        self.sent = []
+        self.bulkSends = []
+        self.failures = []
+        self.suppressed = set(suppressed)
+        self.maxSendRate = 1000.0
+        self.templates = {}
+    # End Function
+
+    def send_email (self, **kwargs):
+        if (self.failures):
+            failure = self.failures.pop(0)
+            raise failure if isinstance(failure, Exception) else testFakeClientError(failure)
+        # End Loop
+        self.sent.append(kwargs)
+        return {"MessageId": "test-%d" % len(self.sent)}
+    # End Function
+
+    def send_bulk_templated_email (self, **kwargs):
+        self.bulkSends.append(kwargs)
+        return {"Status": [{"Status": "Success"} for destination in kwargs['Destinations']]}
+    # End Function
+
+    def get_send_quota (self):
+        return {"MaxSendRate": self.maxSendRate}
+    # End Function
+
+    def create_template (self, Template):
+        if (Template['TemplateName'] in self.templates):
+            raise testFakeClientError("AlreadyExists")
+        # End Loop
+        self.templates[Template['TemplateName']] = Template
+        return {}
+    # End Function
+
+    def list_suppressed_destinations (self, **kwargs):
+        return {"SuppressedDestinationSummaries": [{"EmailAddress": recipient} for recipient in self.suppressed]}
+    # End Function
+# End Class
@@ -0,0 +1,93 @@
+#--------------------------------------------------------#
+#                     Spas Kaloferov                     #
+#                   www.kaloferov.com                    #
+# bit.ly/The-Twitter      Social     bit.ly/The-LinkedIn #
+# bit.ly/The-Gitlab        Git         bit.ly/The-Github #
+# bit.ly/The-BSD         License          bit.ly/The-GNU #
+#--------------------------------------------------------#
+
+  #
+  #       VMware Cloud Assembly ABX Code Sample - Tests
+  #
+  # [Description]
+  #   - Offline tests of the CSP bearer token cache of awsSesSendEmailCore. Fake CSP session. Nothing is called
+  # [Usage]
+  #   - python -m unittest discover -s tests
+  # [Thanks]
+
+
+import time
+import threading
+import unittest
+
+import testCommon
+
+
+# ----- Tests ----- #
+
+class testCspToken (unittest.TestCase):  # cspGetBearerToken and cspGetTokenExpiry
+
+    def setUp (self):  # Fake CSP session and an empty token cache
+        self.engineModule = testCommon.testPatchEngine(self, testCommon.testFakeSes())
+        self.cspSession = testCommon.testPatchCsp(self, self.engineModule, testCommon.testFakeCspSession())
+        self.actionConfig = self.engineModule.actionConfigGet({"actionLogLevelIn": "OFF"})
+    # End Function
+
+    def bearerTokenTest (self, cspRefreshToken="refresh-1"):  # cspGetBearerToken with the test config
+        return self.engineModule.cspGetBearerToken(None, {}, self.actionConfig, cspRefreshToken)
+    # End Function
+
+    def testTokenCached (self):  # One login per refresh token. The cache is keyed by its hash, never by the token itself
+        cspToken = self.bearerTokenTest()
+        self.assertEqual(cspToken['cacheStatus'], "miss")
+        self.assertEqual(self.bearerTokenTest(), {"cspBearerToken": cspToken['cspBearerToken'], "cacheStatus": "hit"})
+        self.assertEqual(self.bearerTokenTest("refresh-2")['cacheStatus'], "miss")
+        self.assertEqual(self.cspSession.logins, ["refresh-1", "refresh-2"])
+        self.assertNotIn("refresh-1", self.engineModule.cspTokenCache)
+    # End Function
+
+    def testRefreshBeforeExpiry (self):  # A token that expires within cspTokenRefreshSkewSeconds is replaced by a new login
+        self.cspSession.tokenLifetime = self.engineModule.cspTokenRefreshSkewSeconds - 60
+        self.bearerTokenTest()
+        self.assertEqual(self.bearerTokenTest()['cacheStatus'], "miss")
+        self.cspSession.tokenLifetime = 1800
+        self.bearerTokenTest()
+        self.assertEqual(self.bearerTokenTest()['cacheStatus'], "hit")
+        self.assertEqual(len(self.cspSession.logins), 3)
+    # End Function
+
+    def testTokenExpiry (self):  # Expiry from the exp claim. Tokens without a readable exp get cspTokenDefaultTtlSeconds
+        self.assertEqual(self.engineModule.cspGetTokenExpiry(testCommon.testMakeBearerToken(2000000000)), 2000000000.0)
+        for bearerToken in ("not-a-jwt", "header.bm90IGpzb24.signature", "header.eyJpYXQiOiAxfQ.signature"):    # No payload, not JSON, no exp claim
+            self.assertAlmostEqual(self.engineModule.cspGetTokenExpiry(bearerToken), time.time() + self.engineModule.cspTokenDefaultTtlSeconds, delta=5)
+        # End Loop
+    # End Function
+
+    def testFailedLoginNotCached (self):  # A failed login returns an empty token and is retried by the next call
+        self.cspSession.loginFailures = 1
+        self.assertEqual(self.bearerTokenTest(), {"cspBearerToken": "", "cacheStatus": "error"})
+        self.assertEqual(self.bearerTokenTest()['cacheStatus'], "miss")
+        self.assertEqual(self.bearerTokenTest()['cacheStatus'], "hit")
+    # End Function
+
+    def testSingleFlight (self):  # Concurrent warm invocations wait for one login and share its token
+        self.cspSession.loginDelay = 0.1
+        cspTokens = []
+        tokenThreads = [threading.Thread(target=lambda: cspTokens.append(self.bearerTokenTest())) for thread in range(5)]
+        for tokenThread in tokenThreads:
+            tokenThread.start()
+        # End Loop
+        for tokenThread in tokenThreads:
+            tokenThread.join()
+        # End Loop
+        self.assertEqual(len(self.cspSession.logins), 1)
+        self.assertEqual(len(set(cspToken['cspBearerToken'] for cspToken in cspTokens)), 1)
+        self.assertEqual(sorted(cspToken['cacheStatus'] for cspToken in cspTokens), ["hit", "hit", "hit", "hit", "miss"])
+    # End Function
+
+# End Class
+
+
+if __name__ == "__main__":
+    unittest.main()
+# End Loop
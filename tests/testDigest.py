@@ -0,0 +1,136 @@
+#--------------------------------------------------------#
+#                     Spas Kaloferov                     #
+#                   www.kaloferov.com                    #
+# bit.ly/The-Twitter      Social     bit.ly/The-LinkedIn #
+# bit.ly/The-Gitlab        Git         bit.ly/The-Github #
+# bit.ly/The-BSD         License          bit.ly/The-GNU #
+#--------------------------------------------------------#
+
+  #
+  #       VMware Cloud Assembly ABX Code Sample - Tests
+  #
+  # [Description]
+  #   - Offline tests of the digests of awsSesSendEmailCore. sqlite store in a temporary folder and a fake SES client
+  # [Usage]
+  #   - python -m unittest discover -s tests
+  # [Thanks]
+
+
+import time
+import unittest
+
+import testCommon
+
+
+# ----- Tests ----- #
+
+class testDigest (unittest.TestCase):  # digestSqlite store, digestFlush and the flush at the end of actionRun
+
+    def setUp (self):  # Fake SES. Each test has its own store
+        self.awsSesClient = testCommon.testFakeSes()
+        self.engineModule = testCommon.testPatchEngine(self, self.awsSesClient)
+        self.inputs = testCommon.testActionInputs(self, actionOptionDigestIn="True", digestWindowIn="60", digestMaxItemsIn="3")
+        self.actionConfig = self.engineModule.actionConfigGet(self.inputs)
+    # End Function
+
+    def digestAddTest (self, recipients, deploymentId):  # Adds a notification to the digests of the recipients
+        self.engineModule.digestSqliteAdd(None, self.inputs, self.actionConfig, recipients, {"subject": deploymentId, "headline": deploymentId, "deploymentUrl": "", "deploymentId": deploymentId, "deploymentName": deploymentId, "projectName": "", "eventTopicId": "TEST"})
+    # End Function
+
+    def digestAge (self, seconds):  # Moves the notifications back in time
+        connection = self.engineModule.digestSqliteConnect(self.actionConfig)
+        connection.execute("UPDATE digest SET createdAt = createdAt - ?", (seconds,))
+        connection.close()
+    # End Function
+
+    def digestFlushTest (self, **kwargs):  # digestFlush with the test inputs
+        return self.engineModule.digestFlush(None, self.inputs, self.actionConfig, **kwargs)
+    # End Function
+
+    def testTakeDue (self):  # Digests are due after digestWindowIn seconds or at digestMaxItemsIn notifications. Recipients are matched lowercase
+        self.digestAddTest(["Dev1@mydomain.com"], "d1")
+        self.digestAddTest(["dev1@mydomain.com", "dev2@mydomain.com"], "d2")
+        self.assertEqual(self.engineModule.digestSqliteTake(None, self.inputs, self.actionConfig, 60, 3), {})
+        self.digestAddTest(["dev1@mydomain.com"], "d3")
+        digests = self.engineModule.digestSqliteTake(None, self.inputs, self.actionConfig, 60, 3)
+        self.assertEqual(list(digests), ["dev1@mydomain.com"])
+        self.assertEqual([digestRecord['notification']['deploymentId'] for digestRecord in digests["dev1@mydomain.com"]], ["d1", "d2", "d3"])
+        self.assertEqual(self.engineModule.digestSqliteTake(None, self.inputs, self.actionConfig, 60, 3), {})    # Leased
+        self.digestAge(61)
+        self.assertEqual(list(self.engineModule.digestSqliteTake(None, self.inputs, self.actionConfig, 60, 3)), ["dev2@mydomain.com"])
+    # End Function
+
+    def testNackRetryAndDrop (self):  # A failed digest is retried after a backoff, then dropped after digestMaxAttempts attempts
+        self.digestAddTest(["dev1@mydomain.com"], "d1")
+        digestRecords = self.engineModule.digestSqliteTake(None, self.inputs, self.actionConfig, 60, 1)["dev1@mydomain.com"]
+        self.assertEqual(self.engineModule.digestSqliteNack(None, self.inputs, self.actionConfig, digestRecords), "retry")
+        self.assertEqual(self.engineModule.digestSqliteTake(None, self.inputs, self.actionConfig, 60, 1), {})    # Not due before the backoff
+        digestRecords[0]['attempts'] = self.engineModule.digestMaxAttempts - 1
+        self.assertEqual(self.engineModule.digestSqliteNack(None, self.inputs, self.actionConfig, digestRecords), "dropped")
+        self.assertEqual(self.engineModule.digestSqliteTake(None, self.inputs, self.actionConfig, 60, 1, force=True), {})
+    # End Function
+
+    def testFlushSends (self):  # One summary email per due recipient. Sent digests are removed from the store
+        self.digestAddTest(["dev1@mydomain.com"], "d1")
+        self.digestAddTest(["dev1@mydomain.com"], "d2")
+        self.assertEqual(self.digestFlushTest(), {"sent": 0, "queued": 0, "retry": 0, "dropped": 0})
+        self.digestAge(61)
+        self.assertEqual(self.digestFlushTest(), {"sent": 1, "queued": 0, "retry": 0, "dropped": 0})
+        self.assertEqual(self.awsSesClient.sent[0]['Destination'], {"ToAddresses": ["dev1@mydomain.com"]})
+        self.assertEqual(self.digestFlushTest(force=True), {"sent": 0, "queued": 0, "retry": 0, "dropped": 0})
+    # End Function
+
+    def testFlushRetry (self):  # A failed send keeps the notifications for a later flush
+        self.digestAddTest(["dev1@mydomain.com"], "d1")
+        self.awsSesClient.failures = ["MessageRejected"]
+        self.assertEqual(self.digestFlushTest(force=True), {"sent": 0, "queued": 0, "retry": 1, "dropped": 0})
+        connection = self.engineModule.digestSqliteConnect(self.actionConfig)
+        connection.execute("UPDATE digest SET leaseUntil = 0")
+        connection.close()
+        self.assertEqual(self.digestFlushTest(force=True)['sent'], 1)
+    # End Function
+
+    def testFlushConnectionError (self):  # A failure that is not a ClientError is retried like one. The other digests are still sent
+        self.digestAddTest(["dev1@mydomain.com"], "d1")
+        self.digestAddTest(["dev2@mydomain.com"], "d2")
+        self.awsSesClient.failures = [testCommon.testFakeBotoCoreError("Could not connect to the endpoint URL")]
+        self.assertEqual(self.digestFlushTest(force=True), {"sent": 1, "queued": 0, "retry": 1, "dropped": 0})
+        connection = self.engineModule.digestSqliteConnect(self.actionConfig)
+        digestRows = connection.execute("SELECT recipient, attempts, leaseUntil > ? FROM digest", (time.time(),)).fetchall()
+        connection.close()
+        self.assertEqual(digestRows, [("dev1@mydomain.com", 1, 1)])
+    # End Function
+
+    def testFlushDeadline (self):  # Nothing is sent past the deadline. The digests stay in the store for a later run
+        self.digestAddTest(["dev1@mydomain.com"], "d1")
+        self.assertEqual(self.digestFlushTest(force=True, deadline=time.time() - 1), {"sent": 0, "queued": 0, "retry": 0, "dropped": 0})
+        self.assertEqual(self.digestFlushTest(force=True)['sent'], 1)
+    # End Function
+
+    def testRunFlushesDueDigests (self):  # A run adds its notification and sends the digests that are due before it returns, also when its runOn conditions do not match
+        self.engineModule.actionRun(None, self.inputs)
+        self.assertEqual(self.awsSesClient.sent, [])
+        self.digestAge(61)
+        self.inputs['actionOptionRunOnPropertyIn'] = "True"
+        self.inputs['runOnPropertyIn'] = "cloudZoneProp: azure"
+        self.inputs['runOnPorpertyMatchABXIn'] = "cloudZoneProp: aws"
+        actionOutputs = self.engineModule.actionRun(None, self.inputs)
+        self.assertEqual(actionOutputs['resp_digest'], {"sent": 1, "queued": 0, "retry": 0, "dropped": 0})
+        self.assertEqual(self.awsSesClient.sent[0]['Destination'], {"ToAddresses": ["requester@mydomain.com"]})
+    # End Function
+
+    def testRunQueuesDigestsToOutbox (self):  # With the outbox the due digests are queued and sent by the outbox drain of the same run
+        self.inputs['actionOptionOutboxIn'] = "True"
+        self.inputs['digestMaxItemsIn'] = "1"
+        actionOutputs = self.engineModule.actionRun(None, self.inputs)
+        self.assertEqual(actionOutputs['resp_digest'], {"sent": 0, "queued": 1, "retry": 0, "dropped": 0})
+        self.assertEqual(actionOutputs['resp_outbox'], {"sent": 1, "retry": 0, "dead": 0})
+        self.assertEqual(len(self.awsSesClient.sent), 1)
+    # End Function
+
+# End Class
+
+
+if __name__ == "__main__":
+    unittest.main()
+# End Loop
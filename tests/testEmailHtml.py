@@ -0,0 +1,71 @@
+#--------------------------------------------------------#
+#                     Spas Kaloferov                     #
+#                   www.kaloferov.com                    #
+# bit.ly/The-Twitter      Social     bit.ly/The-LinkedIn #
+# bit.ly/The-Gitlab        Git         bit.ly/The-Github #
+# bit.ly/The-BSD         License          bit.ly/The-GNU #
+#--------------------------------------------------------#
+
+  #
+  #       VMware Cloud Assembly ABX Code Sample - Tests
+  #
+  # [Description]
+  #   - Offline tests of the HTML optimizer of awsSesSendEmailCore. CSS inlining and whitespace minification
+  # [Usage]
+  #   - python -m unittest discover -s tests
+  # [Thanks]
+
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))    # Folder of the ABX action files
+import awsSesSendEmailCore as engineModule
+
+
+# ----- Tests ----- #
+
+class testEmailHtml (unittest.TestCase):  # emailOptimizeHtml
+
+    def setUp (self):  # Quiet logs. Each test optimizes its templates from scratch
+        engineModule.actionLogConfigure(engineModule.actionConfigGet({"actionLogLevelIn": "OFF"}))
+        engineModule.emailOptimizedHtmlCache.clear()
+    # End Function
+
+    def testWhitespaceCollapsed (self):  # Runs of HTML whitespace become one space. Whitespace between block tags is dropped
+        optimizedHtml = engineModule.emailOptimizeHtml("<html><body>\n  <p>Deployment\n\t  completed.</p>\n</body></html>")
+        self.assertEqual(optimizedHtml, "<html><body><p>Deployment completed.</p></body></html>")
+    # End Function
+
+    def testNbspKept (self):  # &nbsp; is text, not whitespace
+        optimizedHtml = engineModule.emailOptimizeHtml("<p>Cloud&nbsp;&nbsp;Assembly &nbsp;</p>")
+        self.assertEqual(optimizedHtml, "<p>Cloud&nbsp;&nbsp;Assembly &nbsp;</p>")
+    # End Function
+
+    def testPreformattedKept (self):  # Whitespace inside pre and textarea is rendered as is. textarea is inline, so the newline before it is one space
+        optimizedHtml = engineModule.emailOptimizeHtml("<div>\n<pre>line 1\n    line  2</pre>\n<textarea>a\n\n b</textarea> <p>x   y</p></div>")
+        self.assertEqual(optimizedHtml, "<div><pre>line 1\n    line  2</pre> <textarea>a\n\n b</textarea><p>x y</p></div>")
+    # End Function
+
+    def testCssInlined (self):  # Tag and class rules are inlined. The style block is dropped
+        optimizedHtml = engineModule.emailOptimizeHtml("<html><head><style>p.note {color: red}</style></head><body><p class=\"note\">x</p></body></html>")
+        self.assertEqual(optimizedHtml, "<html><head></head><body><p style=\"color:red\">x</p></body></html>")
+    # End Function
+
+    def testMediaRulesKept (self):  # Rules inside @media apply only to some clients. They are kept in the style block, never inlined
+        optimizedHtml = engineModule.emailOptimizeHtml("<html><head><style>p{color:red} @media (max-width:600px){p{color:green} .wide{display:none}} @page{size:A4}</style></head><body><p>x</p><div class=\"wide\">y</div></body></html>")
+        self.assertEqual(optimizedHtml, "<html><head><style>@media (max-width:600px){p{color:green} .wide{display:none}}</style></head><body><p style=\"color:red\">x</p><div class=\"wide\">y</div></body></html>")
+    # End Function
+
+    def testAtRulesWithoutHead (self):  # @font-face and @supports are kept. A template without a head gets the style block first
+        optimizedHtml = engineModule.emailOptimizeHtml("<style>@import url(a.css); @font-face{font-family:X;src:url(x.woff)} @supports (display:grid){.g{display:grid}} b{font-weight:bold}</style><b>x</b>")
+        self.assertEqual(optimizedHtml, "<style>@import url(a.css);@font-face{font-family:X;src:url(x.woff)}@supports (display:grid){.g{display:grid}}</style><b style=\"font-weight:bold\">x</b>")
+    # End Function
+
+# End Class
+
+
+if __name__ == "__main__":
+    unittest.main()
+# End Loop
@@ -0,0 +1,106 @@
+#--------------------------------------------------------#
+#                     Spas Kaloferov                     #
+#                   www.kaloferov.com                    #
+# bit.ly/The-Twitter      Social     bit.ly/The-LinkedIn #
+# bit.ly/The-Gitlab        Git         bit.ly/The-Github #
+# bit.ly/The-BSD         License          bit.ly/The-GNU #
+#--------------------------------------------------------#
+
+  #
+  #       VMware Cloud Assembly ABX Code Sample - Tests
+  #
+  # [Description]
+  #   - Offline tests of the email templates of awsSesSendEmailCore. Project overrides, rendering, escaping and the compiled template cache
+  # [Usage]
+  #   - python -m unittest discover -s tests
+  # [Thanks]
+
+
+import hashlib
+import unittest
+
+import testCommon
+
+
+# ----- Global ----- #
+
+testTemplateOverrides = """
+project-1:
+  subject: "Project {{deploymentName}}"
+  html: ""
+  deploymentFailed:
+    subject: "Project failed {{deploymentName}}"
+Project One:
+  subject: "Named project {{deploymentName}}"
+Project Two:
+  text: "Named project text"
+"""    # Project id, its topic and project name overrides. Empty overrides keep the topic template
+
+
+# ----- Tests ----- #
+
+class testEmailTemplate (unittest.TestCase):  # emailGetTemplates, emailTemplateCompile and emailTemplateRender
+
+    def setUp (self):  # Empty template caches
+        self.engineModule = testCommon.testPatchEngine(self, testCommon.testFakeSes())
+        for templateCache in (self.engineModule.emailTemplateCache, self.engineModule.emailTemplateOverridesCache):
+            templateCache.clear()
+            self.addCleanup(templateCache.clear)
+        # End Loop
+    # End Function
+
+    def templatesTest (self, emailTemplateOverrides, topicName, **actionInputs):  # emailGetTemplates of the topic with the overrides
+        actionConfig = self.engineModule.actionConfigGet({"actionLogLevelIn": "OFF", "emailTemplateOverridesIn": emailTemplateOverrides})
+        actionInputs['eventTopic'] = [eventTopic for eventTopic in self.engineModule.eventTopics if (eventTopic['name'] == topicName)][0]
+        return self.engineModule.emailGetTemplates(None, {}, actionConfig, actionInputs)
+    # End Function
+
+    def renderTest (self, templateSource, templateData, escapeHtml=True):  # Compiles and renders a template
+        return self.engineModule.emailTemplateRender(self.engineModule.emailTemplateCompile(templateSource), templateData, escapeHtml)
+    # End Function
+
+    def testOverridePrecedence (self):  # Topic overrides of the project win over the project overrides, which win over the topic templates. Project id before name
+        topicTemplates = self.templatesTest("", "deploymentFailed")
+        self.assertEqual(self.templatesTest(testTemplateOverrides, "deploymentFailed", projectId="project-1", projectName="Project One"), dict(topicTemplates, subject="Project failed {{deploymentName}}"))
+        self.assertEqual(self.templatesTest(testTemplateOverrides, "deploymentCompleted", projectId="project-1", projectName="Project One")['subject'], "Project {{deploymentName}}")
+        self.assertEqual(self.templatesTest(testTemplateOverrides, "deploymentFailed", projectId="project-9", projectName="Project One")['subject'], "Named project {{deploymentName}}")
+        self.assertEqual(self.templatesTest(testTemplateOverrides, "deploymentFailed", projectName="Project Two"), dict(topicTemplates, text="Named project text"))
+        self.assertEqual(self.templatesTest(testTemplateOverrides, "deploymentFailed", projectId="project-9"), topicTemplates)
+    # End Function
+
+    def testInvalidOverrides (self):  # Overrides that are not valid YAML or not a mapping keep the topic templates
+        topicTemplates = self.templatesTest("", "deploymentCompleted", projectId="project-1")
+        for emailTemplateOverrides in ("project-1: [not closed", "- project-1", "project-1: just a string"):
+            self.assertEqual(self.templatesTest(emailTemplateOverrides, "deploymentCompleted", projectId="project-1"), topicTemplates, emailTemplateOverrides)
+        # End Loop
+    # End Function
+
+    def testEscaping (self):  # {{name}} is HTML escaped in the HTML body only. {{{name}}} is never escaped
+        templateData = {"deploymentName": "<b>R&D</b> \"vm\"", "blueprintUrl": "<a href='#'>bp</a>"}
+        self.assertEqual(self.renderTest("{{deploymentName}} {{{blueprintUrl}}}", templateData), "&lt;b&gt;R&amp;D&lt;/b&gt; &quot;vm&quot; <a href='#'>bp</a>")
+        self.assertEqual(self.renderTest("{{deploymentName}}", templateData, escapeHtml=False), "<b>R&D</b> \"vm\"")
+    # End Function
+
+    def testRender (self):  # Dotted names, missing names and loops with the outer scope and plain items
+        templateData = {"deployment": {"name": "d1"}, "resources": [{"name": "<vm1>"}, {"name": "vm2"}], "tags": ["a", "b"]}
+        self.assertEqual(self.renderTest("{{ deployment.name }}|{{missing}}|{{#each resources}}{{name}}@{{deployment.name}};{{/each}}|{{#each tags}}{{this}}{{/each}}", templateData), "d1||&lt;vm1&gt;@d1;vm2@d1;|ab")
+    # End Function
+
+    def testCompileCache (self):  # Templates are compiled once per content hash. The cache is reset past emailTemplateCacheMaxSize
+        compiledTemplate = self.engineModule.emailTemplateCompile("Hello {{userName}}")
+        self.assertIs(self.engineModule.emailTemplateCompile("Hello {{userName}}"), compiledTemplate)
+        self.assertIs(self.engineModule.emailTemplateCache[hashlib.sha256(b"Hello {{userName}}").hexdigest()], compiledTemplate)
+        for templateNumber in range(self.engineModule.emailTemplateCacheMaxSize):
+            self.engineModule.emailTemplateCompile("Template %d" % templateNumber)
+        # End Loop
+        self.assertLessEqual(len(self.engineModule.emailTemplateCache), self.engineModule.emailTemplateCacheMaxSize)
+        self.assertIsNot(self.engineModule.emailTemplateCompile("Hello {{userName}}"), compiledTemplate)
+        self.assertEqual(self.engineModule.emailTemplateCompile("Hello {{userName}}"), compiledTemplate)
+    # End Function
+
+# End Class
+
+
+if __name__ == "__main__":
+    unittest.main()
+# End Loop
@@ -0,0 +1,129 @@
+#--------------------------------------------------------#
+#                     Spas Kaloferov                     #
+#                   www.kaloferov.com                    #
+# bit.ly/The-Twitter      Social     bit.ly/The-LinkedIn #
+# bit.ly/The-Gitlab        Git         bit.ly/The-Github #
+# bit.ly/The-BSD         License          bit.ly/The-GNU #
+#--------------------------------------------------------#
+
+  #
+  #       VMware Cloud Assembly ABX Code Sample - Tests
+  #
+  # [Description]
+  #   - Offline tests of the outbox of awsSesSendEmailCore. sqlite spool in a temporary folder and a fake SES client
+  # [Usage]
+  #   - python -m unittest discover -s tests
+  # [Thanks]
+
+
+import time
+import unittest
+
+import testCommon
+
+
+# ----- Tests ----- #
+
+class testOutbox (unittest.TestCase):  # outboxEnqueue, outboxDrain and the drain at the end of actionRun
+
+    def setUp (self):  # Fake SES. Each test has its own spool
+        self.awsSesClient = testCommon.testFakeSes()
+        self.engineModule = testCommon.testPatchEngine(self, self.awsSesClient)
+        self.inputs = testCommon.testActionInputs(self, actionOptionOutboxIn="True", outboxMaxAttemptsIn="2")
+        self.actionConfig = self.engineModule.actionConfigGet(self.inputs)
+    # End Function
+
+    def outboxEnqueueTest (self, subject):  # Queues a rendered email
+        awsSesMessage = {"Source": "no-reply@mydomain.com", "Destination": {"ToAddresses": ["requester@mydomain.com"]}, "Message": {"Subject": {"Data": subject}}}
+        return self.engineModule.outboxEnqueue(None, self.inputs, self.actionConfig, "us-west-2", 1, awsSesMessage)
+    # End Function
+
+    def testDrainSends (self):  # Queued emails are sent in order and removed from the spool
+        self.assertEqual(self.outboxEnqueueTest("first"), "queued")
+        self.outboxEnqueueTest("second")
+        self.assertEqual(self.engineModule.outboxDrain(None, self.inputs, self.actionConfig), {"sent": 2, "retry": 0, "dead": 0})
+        self.assertEqual([awsSesMessage['Message']['Subject']['Data'] for awsSesMessage in self.awsSesClient.sent], ["first", "second"])
+        self.assertEqual(self.engineModule.outboxDrain(None, self.inputs, self.actionConfig), {"sent": 0, "retry": 0, "dead": 0})
+    # End Function
+
+    def testDrainRetryAndDead (self):  # A failed send is retried after a backoff, then dead-lettered after outboxMaxAttemptsIn attempts
+        self.outboxEnqueueTest("failing")
+        self.awsSesClient.failures = ["MessageRejected", "MessageRejected"]
+        self.assertEqual(self.engineModule.outboxDrain(None, self.inputs, self.actionConfig), {"sent": 0, "retry": 1, "dead": 0})
+        self.assertEqual(self.engineModule.outboxDrain(None, self.inputs, self.actionConfig), {"sent": 0, "retry": 0, "dead": 0})    # Not due before the backoff
+        outboxRecords = self.engineModule.outboxSqliteFetch(None, self.inputs, self.actionConfig, 10)
+        self.assertEqual(outboxRecords, [])
+        connection = self.engineModule.outboxSqliteConnect(self.actionConfig)
+        connection.execute("UPDATE outbox SET nextAttemptAt = 0")
+        connection.close()
+        self.assertEqual(self.engineModule.outboxDrain(None, self.inputs, self.actionConfig), {"sent": 0, "retry": 0, "dead": 1})
+        self.assertEqual(self.awsSesClient.sent, [])
+    # End Function
+
+    def testDrainConnectionError (self):  # A failure that is not a ClientError is retried like one. The other messages are still sent
+        self.outboxEnqueueTest("unreachable")
+        self.outboxEnqueueTest("second")
+        self.awsSesClient.failures = [testCommon.testFakeBotoCoreError("Could not connect to the endpoint URL")]
+        self.assertEqual(self.engineModule.outboxDrain(None, self.inputs, self.actionConfig), {"sent": 1, "retry": 1, "dead": 0})
+        connection = self.engineModule.outboxSqliteConnect(self.actionConfig)
+        outboxRows = connection.execute("SELECT id, status, attempts FROM outbox").fetchall()
+        connection.close()
+        self.assertEqual(outboxRows, [(1, "pending", 1)])
+    # End Function
+
+    def testExpiredLeaseCounted (self):  # A message taken by a run that ended without a result is retaken after its lease and counted as an attempt
+        self.outboxEnqueueTest("stranded")
+        self.assertEqual(self.engineModule.outboxSqliteFetch(None, self.inputs, self.actionConfig, 10)[0]['attempts'], 0)
+        self.assertEqual(self.engineModule.outboxSqliteFetch(None, self.inputs, self.actionConfig, 10), [])    # Leased
+        for leaseExpiry in range(2):    # Loop. Two runs end without a result
+            connection = self.engineModule.outboxSqliteConnect(self.actionConfig)
+            connection.execute("UPDATE outbox SET nextAttemptAt = 0")
+            connection.close()
+            outboxRecords = self.engineModule.outboxSqliteFetch(None, self.inputs, self.actionConfig, 10)
+        # End Loop
+        self.assertEqual(outboxRecords, [])    # Dead-lettered at outboxMaxAttemptsIn
+        connection = self.engineModule.outboxSqliteConnect(self.actionConfig)
+        self.assertEqual(connection.execute("SELECT status, attempts FROM outbox").fetchall(), [("dead", 2)])
+        connection.close()
+    # End Function
+
+    def testDrainDeadline (self):  # Nothing is sent past the deadline. The emails stay queued for a later run
+        self.outboxEnqueueTest("late")
+        self.assertEqual(self.engineModule.outboxDrain(None, self.inputs, self.actionConfig, deadline=time.time() - 1), {"sent": 0, "retry": 0, "dead": 0})
+        self.assertEqual(self.awsSesClient.sent, [])
+        self.assertEqual(self.engineModule.outboxDrain(None, self.inputs, self.actionConfig)['sent'], 1)
+    # End Function
+
+    def testRunDrainsBeforeReturn (self):  # A run sends its own email before it returns
+        actionOutputs = self.engineModule.actionRun(None, self.inputs)
+        self.assertEqual(actionOutputs['resp_outbox'], {"sent": 1, "retry": 0, "dead": 0})
+        self.assertEqual(len(self.awsSesClient.sent), 1)
+    # End Function
+
+    def testRunDrainsEarlierEmails (self):  # A run that queues nothing still sends the emails left by earlier runs
+        self.outboxEnqueueTest("earlier")
+        self.inputs['actionOptionRunOnPropertyIn'] = "True"
+        self.inputs['runOnPropertyIn'] = "cloudZoneProp: azure"
+        self.inputs['runOnPorpertyMatchABXIn'] = "cloudZoneProp: aws"
+        actionOutputs = self.engineModule.actionRun(None, self.inputs)
+        self.assertEqual(actionOutputs['resp_outbox'], {"sent": 1, "retry": 0, "dead": 0})
+        self.assertEqual([awsSesMessage['Message']['Subject']['Data'] for awsSesMessage in self.awsSesClient.sent], ["earlier"])
+    # End Function
+
+    def testDeadlineFromContext (self):  # The run deadline follows the remaining time of the context, less the margin
+        class testContext (object):
+            def get_remaining_time_in_millis (self):
+                return 60000
+            # End Function
+        # End Class
+        actionDeadline = self.engineModule.actionGetDeadline(testContext(), time.time())
+        self.assertAlmostEqual(actionDeadline, time.time() + 60 - self.engineModule.actionDeadlineMarginSeconds, delta=1)
+        self.assertEqual(self.engineModule.actionGetDeadline(None, 1000.0), 1000.0 + self.engineModule.actionTimeoutSeconds - self.engineModule.actionDeadlineMarginSeconds)
+    # End Function
+
+# End Class
+
+
+if __name__ == "__main__":
+    unittest.main()
+# End Loop
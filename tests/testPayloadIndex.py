@@ -0,0 +1,95 @@
+#--------------------------------------------------------#
+#                     Spas Kaloferov                     #
+#                   www.kaloferov.com                    #
+# bit.ly/The-Twitter      Social     bit.ly/The-LinkedIn #
+# bit.ly/The-Gitlab        Git         bit.ly/The-Github #
+# bit.ly/The-BSD         License          bit.ly/The-GNU #
+#--------------------------------------------------------#
+
+  #
+  #       VMware Cloud Assembly ABX Code Sample - Tests
+  #
+  # [Description]
+  #   - Offline tests of the payload index of awsSesSendEmailCore. Direct path lookups must match the flattened index
+  # [Usage]
+  #   - python -m unittest discover -s tests
+  # [Thanks]
+
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))    # Folder of the ABX action files
+import awsSesSendEmailCore as engineModule
+
+
+# ----- Global ----- #
+
+testPayload = {    # Shaped like a deployment.request.post payload, plus keys with dots and non string leaves
+    "__metadata": {"eventTopicId": "deployment.request.post", "userName": "requester@mydomain.com"},
+    "deploymentId": 12345,
+    "eventType": "CREATE_DEPLOYMENT",
+    "customProperties": {"cas.cloud.zone": "aws", "enabled": True, "empty": None},
+    "resources": [{"name": "vm-1", "tags": ["a", "b"]}, {"name": "vm-2"}],
+}
+
+
+# ----- Tests ----- #
+
+class testPayloadIndex (unittest.TestCase):  # payloadBuildIndex
+
+    def testPathsMatchFlatten (self):  # Every flattened leaf path is found by the direct lookup, with the same value
+        payloadPaths = engineModule.payloadBuildIndex(testPayload)['paths']
+        for path, value in engineModule.payloadFlatten(testPayload)['paths'].items():
+            self.assertIn(path, payloadPaths)
+            self.assertEqual(payloadPaths[path], value)
+        # End Loop
+    # End Function
+
+    def testMissingPaths (self):  # Containers, unknown keys and out of range indexes are not leaves
+        payloadPaths = engineModule.payloadBuildIndex(testPayload)['paths']
+        for path in ("__metadata", "resources.0", "resources.2.name", "resources.x", "blueprintId", "deploymentId.x"):
+            self.assertNotIn(path, payloadPaths)
+            self.assertEqual(payloadPaths.get(path, "default"), "default")
+        # End Loop
+        self.assertIsNone(payloadPaths.get("customProperties.empty", "default"))
+        self.assertRaises(KeyError, lambda: payloadPaths["blueprintId"])
+    # End Function
+
+    def testFlattenedOnDemand (self):  # Only key lookups flatten the payload. runOn rules resolve the keys and paths they reference
+        payloadIndex = engineModule.payloadBuildIndex(testPayload)
+        self.assertEqual(engineModule.eventTopicResolve(payloadIndex)[0], "deployment.request.post")
+        self.assertEqual(sorted(payloadIndex), ["paths"])
+        self.assertTrue(engineModule.runOnRuleEvaluate("cas.cloud.zone: aws && name: vm-2", payloadIndex))
+        self.assertEqual(sorted(payloadIndex), ["match", "paths"])
+        self.assertEqual(sorted(payloadIndex['match'].keyValues), ["cas.cloud.zone", "name"])
+    # End Function
+
+    def testRunOnMatchesLeaves (self):  # Keys anywhere, dotted paths and globs match case insensitive, as on the flattened payload. Several rules share one index
+        payloadIndex = engineModule.payloadBuildIndex(testPayload)
+        for runOnRule, expected in (
+            ("CAS.CLOUD.ZONE: AWS", True),
+            ("name: vm-1 && name: vm-2", True),
+            ("customproperties.enabled: true && empty: null", True),
+            ("resources.1.name: vm-2 && resources.0.tags.1: b", True),
+            ("resources.1.name: vm-1", False),
+            ("__metadata.userName: requester@*", True),
+            ("!blueprintId && deploymentId: 12345", True),
+            ("*name: vm-2", True),
+            ("customProperties.cas*: aws", True),
+            ("resources.*.tags.*: b", True),
+            ("resources.*.tags.*: c", False),
+            ("custom*: aws", True),
+        ):
+            self.assertEqual(engineModule.runOnRuleEvaluate(runOnRule, payloadIndex), expected, runOnRule)
+        # End Loop
+        self.assertTrue(payloadIndex['match'].keyValuesComplete)
+    # End Function
+
+# End Class
+
+
+if __name__ == "__main__":
+    unittest.main()
+# End Loop
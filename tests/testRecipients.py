@@ -0,0 +1,103 @@
+#--------------------------------------------------------#
+#                     Spas Kaloferov                     #
+#                   www.kaloferov.com                    #
+# bit.ly/The-Twitter      Social     bit.ly/The-LinkedIn #
+# bit.ly/The-Gitlab        Git         bit.ly/The-Github #
+# bit.ly/The-BSD         License          bit.ly/The-GNU #
+#--------------------------------------------------------#
+
+  #
+  #       VMware Cloud Assembly ABX Code Sample - Tests
+  #
+  # [Description]
+  #   - Offline tests of the recipient handling of awsSesSendEmailCore. TO, CC, BCC and bulk lists and the suppression filter
+  #   - The SES clients are fakes. Nothing is sent
+  # [Usage]
+  #   - python -m unittest discover -s tests
+  # [Thanks]
+
+
+import unittest
+
+import testCommon
+
+
+# ----- Global ----- #
+
+testSuppressedRecipients = {"bounced@mydomain.com"}    # On the fake SES suppression list
+
+
+# ----- Tests ----- #
+
+class testRecipients (unittest.TestCase):  # awsSesResolveRecipients, awsSesFilterSuppressed and awsSesSendBulk
+
+    def setUp (self):  # Quiet logs, fake SES clients and empty caches
+        self.awsSesClient = testCommon.testFakeSes(suppressed=testSuppressedRecipients)
+        self.engineModule = testCommon.testPatchEngine(self, self.awsSesClient)
+        self.actionConfig = self.engineModule.actionConfigGet({"actionLogLevelIn": "OFF", "awsSesSuppressionPreloadIn": "True"})
+        for engineCache in (self.engineModule.awsSesSuppressionLists, self.engineModule.awsSesSuppressionCache, self.engineModule.awsSesTemplateHashes):
+            engineCache.clear()
+        # End Loop
+    # End Function
+
+    def actionInputs (self, **overrides):  # actionInputs as built by actionRun
+        actionInputs = {
+            "actionOptionSesBulkSend": False,
+            "awsSesRegion": "us-west-2",
+            "awsSesSender": "no-reply@mydomain.com",
+            "awsSesTemplateName": "abxDeploymentNotification",
+            "awsSesToRecipient": "requester@mydomain.com",
+            "awsSesCcRecipient": "",
+            "awsSesBccRecipient": "",
+            "awsSesBulkRecipients": "",
+            "awsSesSubjectTemplate": "{{deploymentId}}",
+            "awsSesBodyHtmlTemplate": "<p>{{deploymentId}}</p>",
+            "awsSesBodyTextTemplate": "{{deploymentId}}",
+            "emailTemplateData": {"deploymentId": "d1"},
+        }
+        actionInputs.update(overrides)
+        awsSesRecipients = self.engineModule.awsSesResolveRecipients(None, {}, self.actionConfig, actionInputs)
+        actionInputs['awsSesRecipientFields'] = awsSesRecipients['recipientFields']
+        actionInputs['awsSesRecipients'] = awsSesRecipients['recipients']
+        actionInputs['awsSesDestinations'] = awsSesRecipients['destinations']
+        return actionInputs
+    # End Function
+
+    def testRecipientsNormalized (self):  # Domains lowercase, duplicates kept in the first of TO, CC, BCC
+        actionInputs = self.actionInputs(awsSesToRecipient="<Dev1@MyDomain.com>; not-an-address", awsSesCcRecipient="dev1@mydomain.com, dev2@mydomain.com")
+        self.assertEqual(actionInputs['awsSesRecipientFields'], [("ToAddresses", "Dev1@mydomain.com"), ("CcAddresses", "dev2@mydomain.com")])
+    # End Function
+
+    def testBulkRecipientsOnlyInBulkMode (self):  # awsSesBulkRecipientsIn is ignored by the send_email mode
+        actionInputs = self.actionInputs(awsSesBulkRecipients="dev3@mydomain.com")
+        self.assertEqual(actionInputs['awsSesRecipients'], ["requester@mydomain.com"])
+    # End Function
+
+    def testBulkRecipientsResolved (self):  # Bulk recipients are normalized, de-duplicated and suppression filtered before batching
+        actionInputs = self.actionInputs(actionOptionSesBulkSend=True, awsSesBulkRecipients="Requester@MYDOMAIN.com; <dev3@MyDomain.com>, bounced@mydomain.com, dev3@mydomain.com")
+        self.assertEqual(actionInputs['awsSesRecipients'], ["requester@mydomain.com", "dev3@mydomain.com", "bounced@mydomain.com"])
+        self.engineModule.awsSesFilterSuppressed(None, {}, self.actionConfig, actionInputs)
+        self.assertEqual(actionInputs['awsSesSuppressedRecipients'], ["bounced@mydomain.com"])
+        self.assertEqual(self.engineModule.awsSesSendBulk(None, {}, self.actionConfig, actionInputs, self.awsSesClient), "ok")
+        self.assertEqual([destination['Destination']['ToAddresses'] for destination in self.awsSesClient.bulkSends[0]['Destinations']], [["requester@mydomain.com"], ["dev3@mydomain.com"]])
+    # End Function
+
+    def testBulkTemplatePerContent (self):  # Each template content has its own SES template. A stale container cache finds the existing template
+        self.engineModule.awsSesSendBulk(None, {}, self.actionConfig, self.actionInputs(actionOptionSesBulkSend=True, awsSesBodyHtmlTemplate="<p>A {{deploymentId}}</p>"), self.awsSesClient)
+        self.engineModule.awsSesSendBulk(None, {}, self.actionConfig, self.actionInputs(actionOptionSesBulkSend=True, awsSesBodyHtmlTemplate="<p>B {{deploymentId}}</p>"), self.awsSesClient)
+        self.engineModule.awsSesTemplateHashes.clear()
+        self.engineModule.awsSesSendBulk(None, {}, self.actionConfig, self.actionInputs(actionOptionSesBulkSend=True, awsSesBodyHtmlTemplate="<p>A {{deploymentId}}</p>"), self.awsSesClient)
+        awsSesTemplateNames = [bulkSend['Template'] for bulkSend in self.awsSesClient.bulkSends]
+        self.assertEqual(awsSesTemplateNames[0], awsSesTemplateNames[2])
+        self.assertNotEqual(awsSesTemplateNames[0], awsSesTemplateNames[1])
+        self.assertTrue(awsSesTemplateNames[0].startswith("abxDeploymentNotification-"))
+        self.assertEqual(self.awsSesClient.templates[awsSesTemplateNames[1]]['HtmlPart'], "<p>B {{deploymentId}}</p>")
+        self.assertEqual(len(self.awsSesClient.templates), 2)
+    # End Function
+
+# End Class
+
+
+if __name__ == "__main__":
+    unittest.main()
+# End Loop
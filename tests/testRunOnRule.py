@@ -0,0 +1,68 @@
+#--------------------------------------------------------#
+#                     Spas Kaloferov                     #
+#                   www.kaloferov.com                    #
+# bit.ly/The-Twitter      Social     bit.ly/The-LinkedIn #
+# bit.ly/The-Gitlab        Git         bit.ly/The-Github #
+# bit.ly/The-BSD         License          bit.ly/The-GNU #
+#--------------------------------------------------------#
+
+  #
+  #       VMware Cloud Assembly ABX Code Sample - Tests
+  #
+  # [Description]
+  #   - Offline tests of the runOn rules of awsSesSendEmailCore. Rules are evaluated against a payload index
+  # [Usage]
+  #   - python -m unittest discover -s tests
+  # [Thanks]
+
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))    # Folder of the ABX action files
+import awsSesSendEmailCore as engineModule
+
+
+# ----- Tests ----- #
+
+class testRunOnRule (unittest.TestCase):  # runOnRuleEvaluate against a payload index
+
+    def setUp (self):  # Quiet logs. Each test compiles its rules from scratch
+        engineModule.actionLogConfigure(engineModule.actionConfigGet({"actionLogLevelIn": "OFF"}))
+        engineModule.runOnRuleCache.clear()
+        self.payloadIndex = engineModule.payloadBuildIndex({"customProperties": {"cloudZoneProp": "cas.cloud.zone.type:aws"}, "blueprintId": "bp-1"})
+    # End Function
+
+    def testRegexTerm (self):  # re: terms match case insensitive
+        self.assertTrue(engineModule.runOnRuleEvaluate("cloudZoneProp: re:type:AWS$", self.payloadIndex))
+        self.assertFalse(engineModule.runOnRuleEvaluate("cloudZoneProp: re:type:azure$", self.payloadIndex))
+    # End Function
+
+    def testInvalidRegexTerm (self):  # An invalid regex does not raise. The term is not matched, also when negated
+        self.assertFalse(engineModule.runOnRuleEvaluate("cloudZoneProp: re:(aws", self.payloadIndex))
+        self.assertFalse(engineModule.runOnRuleEvaluate("!cloudZoneProp: re:(aws", self.payloadIndex))
+        self.assertTrue(engineModule.runOnRuleEvaluate("cloudZoneProp: re:(aws || blueprintId: bp-1", self.payloadIndex))
+    # End Function
+
+    def testMatchInputWithoutYaml (self):  # The runOnPorpertyMatchABXIn test input is read without pyyaml, as for awsSesSendEmail-py-v1
+        actionImport = engineModule.actionImport
+        def actionImportWithoutYaml (moduleName):
+            if (moduleName == "yaml"):
+                raise ImportError("No module named 'yaml'")
+            # End Loop
+            return actionImport(moduleName)
+        # End Function
+        self.addCleanup(setattr, engineModule, "actionImport", actionImport)
+        engineModule.actionImport = actionImportWithoutYaml
+        self.assertTrue(engineModule.runOnRuleEvaluate("cloudZoneProp: cas.cloud.zone.type:aws", "cloudZoneProp: cas.cloud.zone.type:aws\nowner: 'dev1'"))
+        self.assertTrue(engineModule.runOnRuleEvaluate("owner: dev1", "cloudZoneProp: cas.cloud.zone.type:aws\nowner: 'dev1'"))
+        self.assertFalse(engineModule.runOnRuleEvaluate("cloudZoneProp: cas.cloud.zone.type:azure", "cloudZoneProp: cas.cloud.zone.type:aws"))
+    # End Function
+
+# End Class
+
+
+if __name__ == "__main__":
+    unittest.main()
+# End Loop
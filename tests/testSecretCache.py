@@ -0,0 +1,91 @@
+#--------------------------------------------------------#
+#                     Spas Kaloferov                     #
+#                   www.kaloferov.com                    #
+# bit.ly/The-Twitter      Social     bit.ly/The-LinkedIn #
+# bit.ly/The-Gitlab        Git         bit.ly/The-Github #
+# bit.ly/The-BSD         License          bit.ly/The-GNU #
+#--------------------------------------------------------#
+
+  #
+  #       VMware Cloud Assembly ABX Code Sample - Tests
+  #
+  # [Description]
+  #   - Offline tests of the Secrets Manager cache of awsSesSendEmailCore. Fake Secrets Manager client and CSP session. Nothing is called
+  # [Usage]
+  #   - python -m unittest discover -s tests
+  # [Thanks]
+
+
+import unittest
+
+import testCommon
+
+
+# ----- Tests ----- #
+
+class testSecretCache (unittest.TestCase):  # awsSessionManagerGetSecret, awsSessionManagerInvalidateSecret and the retry in cspGetRequestsHeaders
+
+    def setUp (self):  # Fake Secrets Manager, empty secret and token caches
+        self.awsSmClient = testCommon.testFakeSecretsManager({"AWSCURRENT": "refresh-1", "AWSPENDING": "refresh-2"})
+        self.engineModule = testCommon.testPatchEngine(self, self.awsSmClient)
+        self.cacheStats = testCommon.testPatchSecrets(self, self.engineModule)
+        self.cspSession = testCommon.testPatchCsp(self, self.engineModule, testCommon.testFakeCspSession())
+    # End Function
+
+    def secretTest (self, **inputs):  # awsSessionManagerGetSecret with the test secret and the config of the inputs
+        return self.engineModule.awsSessionManagerGetSecret(None, {}, self.engineModule.actionConfigGet(dict(inputs, actionLogLevelIn="OFF")), "csp-token", "us-west-2")
+    # End Function
+
+    def testSecretCached (self):  # One lookup per secret. The secret is taken out of its JSON secret string
+        self.assertEqual(self.secretTest(), {"awsSecret_csp": "refresh-1", "cacheStatus": "miss"})
+        self.assertEqual(self.secretTest(), {"awsSecret_csp": "refresh-1", "cacheStatus": "hit"})
+        self.assertEqual(self.awsSmClient.lookups, [("csp-token", "AWSCURRENT")])
+        self.assertEqual(self.cacheStats, {"hits": 1, "misses": 1, "invalidations": 0})
+    # End Function
+
+    def testVersionStageKeyed (self):  # Each version stage is cached on its own
+        self.secretTest()
+        self.assertEqual(self.secretTest(awsSmVersionStageIn="AWSPENDING"), {"awsSecret_csp": "refresh-2", "cacheStatus": "miss"})
+        self.assertEqual(self.secretTest(awsSmVersionStageIn="AWSPENDING")['cacheStatus'], "hit")
+        self.assertEqual(self.secretTest()['cacheStatus'], "hit")
+    # End Function
+
+    def testSecretExpiry (self):  # Cached secrets expire after awsSmSecretCacheTtlIn seconds. 0 disables the cache
+        self.secretTest()
+        self.engineModule.awsSmSecretCache[("csp-token", "us-west-2", "AWSCURRENT")]['expiresAt'] -= self.engineModule.awsSmSecretCacheDefaultTtlSeconds
+        self.assertEqual(self.secretTest()['cacheStatus'], "miss")
+        self.engineModule.awsSmSecretCache.clear()
+        self.secretTest(awsSmSecretCacheTtlIn="0")
+        self.assertEqual(self.secretTest(awsSmSecretCacheTtlIn="0")['cacheStatus'], "miss")
+        self.assertEqual(self.engineModule.awsSmSecretCache, {})
+    # End Function
+
+    def testInvalidate (self):  # Invalidation drops every version stage of the secret and nothing else
+        self.secretTest()
+        self.secretTest(awsSmVersionStageIn="AWSPENDING")
+        self.engineModule.awsSmSecretCache[("other-token", "us-west-2", "AWSCURRENT")] = {"secret": "other", "versionId": "", "expiresAt": float("inf")}
+        self.engineModule.awsSessionManagerInvalidateSecret(None, {}, "csp-token", "us-west-2")
+        self.assertEqual(list(self.engineModule.awsSmSecretCache), [("other-token", "us-west-2", "AWSCURRENT")])
+        self.assertEqual(self.cacheStats['invalidations'], 2)
+        self.assertEqual(self.secretTest()['cacheStatus'], "miss")
+    # End Function
+
+    def testRotatedSecretRetried (self):  # A CSP login failure with a cached secret invalidates it and logs in again with the rotated secret
+        self.secretTest()
+        self.awsSmClient.secrets['AWSCURRENT'] = "refresh-rotated"
+        self.cspSession.loginFailures = 1
+        actionInputs = {"actionOptionUseAwsSecretsManager": True, "awsSmRegionName": "us-west-2", "awsSmCspTokenSecretId": "csp-token"}
+        requestsHeaders = self.engineModule.cspGetRequestsHeaders(None, {}, self.engineModule.actionConfigGet({"actionLogLevelIn": "OFF"}), actionInputs)
+        self.assertEqual(self.cspSession.logins, ["refresh-1", "refresh-rotated"])
+        self.assertEqual(actionInputs['cspRefreshToken'], "refresh-rotated")
+        self.assertEqual(requestsHeaders['Authorization'], "Bearer "+actionInputs['cspBearerToken'])
+        self.assertNotEqual(actionInputs['cspBearerToken'], "")
+        self.assertEqual(self.cacheStats, {"hits": 1, "misses": 2, "invalidations": 1})
+    # End Function
+
+# End Class
+
+
+if __name__ == "__main__":
+    unittest.main()
+# End Loop
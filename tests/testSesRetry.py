@@ -0,0 +1,98 @@
+#--------------------------------------------------------#
+#                     Spas Kaloferov                     #
+#                   www.kaloferov.com                    #
+# bit.ly/The-Twitter      Social     bit.ly/The-LinkedIn #
+# bit.ly/The-Gitlab        Git         bit.ly/The-Github #
+# bit.ly/The-BSD         License          bit.ly/The-GNU #
+#--------------------------------------------------------#
+
+  #
+  #       VMware Cloud Assembly ABX Code Sample - Tests
+  #
+  # [Description]
+  #   - Offline tests of the SES send pacing and retries of awsSesSendEmailCore. Token bucket, retry classification and backoff
+  #   - The SES client is a fake. Nothing is sent
+  # [Usage]
+  #   - python -m unittest discover -s tests
+  # [Thanks]
+
+
+import unittest
+
+import testCommon
+
+
+# ----- Global ----- #
+
+testFakeConnectionError = type("ConnectionError", (testCommon.testFakeBotoCoreError,), {})    # Named like the botocore connection errors
+testFakeEndpointConnectionError = type("EndpointConnectionError", (testFakeConnectionError,), {})    # Subclasses match by their bases
+
+
+# ----- Tests ----- #
+
+class testSesRetry (unittest.TestCase):  # awsSesCallWithRetry, awsSesGetRetryReason, awsSesAcquireSendTokens and awsSesAdjustSendRate
+
+    def setUp (self):  # Fake SES, empty token buckets and no backoff waits
+        self.awsSesClient = testCommon.testFakeSes()
+        self.engineModule = testCommon.testPatchEngine(self, self.awsSesClient)
+        self.actionConfig = self.engineModule.actionConfigGet({"actionLogLevelIn": "OFF", "awsSesMaxSendAttemptsIn": "3"})
+        self.addCleanup(setattr, self.engineModule, "awsSesBackoffBaseSeconds", self.engineModule.awsSesBackoffBaseSeconds)
+        self.engineModule.awsSesBackoffBaseSeconds = 0
+    # End Function
+
+    def sendTest (self):  # One send_email through awsSesCallWithRetry
+        return self.engineModule.awsSesCallWithRetry(None, {}, self.actionConfig, self.awsSesClient, "us-west-2", 'send_email', 1, Destination={"ToAddresses": ["requester@mydomain.com"]})
+    # End Function
+
+    def testRetryReason (self):  # Throttling slows the pacing. Server and connection failures are retried. Request errors are not
+        self.assertEqual(self.engineModule.awsSesGetRetryReason(testCommon.testFakeClientError("Throttling")), "throttled")
+        self.assertEqual(self.engineModule.awsSesGetRetryReason(testCommon.testFakeClientError("ServiceUnavailable", 503)), "transient")
+        self.assertEqual(self.engineModule.awsSesGetRetryReason(testCommon.testFakeClientError("SomethingNew", 502)), "transient")
+        self.assertEqual(self.engineModule.awsSesGetRetryReason(testFakeEndpointConnectionError("Could not connect to the endpoint URL")), "transient")
+        self.assertIsNone(self.engineModule.awsSesGetRetryReason(testCommon.testFakeClientError("MessageRejected")))
+        self.assertIsNone(self.engineModule.awsSesGetRetryReason(testCommon.testFakeBotoCoreError("Unable to locate credentials")))
+    # End Function
+
+    def testTransientRetried (self):  # A server error and a connection failure are retried until the send goes through
+        self.awsSesClient.failures = [testCommon.testFakeClientError("InternalFailure", 500), testFakeEndpointConnectionError("Could not connect to the endpoint URL")]
+        self.assertEqual(self.sendTest(), {"MessageId": "test-1"})
+        self.assertEqual(self.engineModule.awsSesRateBuckets["us-west-2"]['rate'], 1000.0)    # Not slowed down
+    # End Function
+
+    def testNotRetried (self):  # A rejected email fails on the first attempt. Retries stop at awsSesMaxSendAttemptsIn
+        self.awsSesClient.failures = ["MessageRejected", "Throttling"]
+        self.assertRaises(testCommon.testFakeClientError, self.sendTest)
+        self.assertEqual(self.awsSesClient.failures, ["Throttling"])
+        self.awsSesClient.failures = ["Throttling", "Throttling", "Throttling", "Throttling"]
+        self.assertRaises(testCommon.testFakeClientError, self.sendTest)
+        self.assertEqual(self.awsSesClient.failures, ["Throttling"])
+    # End Function
+
+    def testThrottlingSlowsPacing (self):  # Throttling halves the bucket rate down to 10% of the quota. Sends recover it by 10% of the quota
+        self.awsSesClient.failures = ["Throttling"]
+        self.sendTest()
+        self.assertEqual(self.engineModule.awsSesRateBuckets["us-west-2"]['rate'], 600.0)    # 500 after the throttling, then +100 for the send
+        for throttled in range(10):
+            self.engineModule.awsSesAdjustSendRate("us-west-2", throttled=True)
+        # End Loop
+        self.assertEqual(self.engineModule.awsSesRateBuckets["us-west-2"]['rate'], 100.0)
+    # End Function
+
+    def testTokenBucketPacing (self):  # One second of burst at the quota rate. The next send waits for its tokens
+        self.awsSesClient.maxSendRate = 100.0
+        self.assertEqual(self.engineModule.awsSesAcquireSendTokens(None, {}, self.actionConfig, self.awsSesClient, "us-west-2", 100), 0.0)
+        self.assertAlmostEqual(self.engineModule.awsSesAcquireSendTokens(None, {}, self.actionConfig, self.awsSesClient, "us-west-2", 10), 0.1, delta=0.05)
+    # End Function
+
+    def testZeroSendRate (self):  # A paused account reports MaxSendRate 0. Pacing uses the sandbox rate instead of dividing by zero
+        self.awsSesClient.maxSendRate = 0.0
+        self.assertEqual(self.engineModule.awsSesAcquireSendTokens(None, {}, self.actionConfig, self.awsSesClient, "us-west-2", 1), 0.0)
+        self.assertEqual(self.engineModule.awsSesRateBuckets["us-west-2"]['maxRate'], self.engineModule.awsSesDefaultMaxSendRate)
+    # End Function
+
+# End Class
+
+
+if __name__ == "__main__":
+    unittest.main()
+# End Loop